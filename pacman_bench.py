@@ -0,0 +1,275 @@
+# pacman_bench.py
+# Headless benchmark suite for pacman_traps.py
+# Runs against SDL's dummy video driver, writes JSON results and compares them
+# against a stored baseline, flagging regressions above a threshold.
+# Run: python pacman_bench.py [--quick] [--save-baseline] [--threshold 0.10]
+
+import os
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import sys, json, time, random, argparse, tempfile, platform, statistics
+import pygame
+import pacman_traps as pt
+import pacman_mazegen as mg
+
+BASE_MAP = list(pt.ORIGINAL_MAP)
+BASE_ROWS, BASE_COLS = pt.MAZE_ROWS, pt.MAZE_COLS
+
+MAZE_SCALES = (1, 2, 3)
+GHOST_COUNTS = (4, 16)
+TRAP_COUNTS = (0, 6, 24)
+DEFAULT_OUT = "bench_results.json"
+DEFAULT_BASELINE = "bench_baseline.json"
+DEFAULT_THRESHOLD = 0.10
+
+# ---------- Maze setup ----------
+def scaled_map(scale):
+    # tile the stock maze scale x scale times and carve the seams open so the copies form one maze
+    rows = [row * scale for _ in range(scale) for row in BASE_MAP]
+    grid = [list(r) for r in rows]
+    h = len(grid); w = len(grid[0])
+    for k in range(1, scale):
+        c0 = k * BASE_COLS
+        for y in range(h):
+            if grid[y][c0-2] != '#' and grid[y][c0+1] != '#':
+                grid[y][c0-1] = '.'; grid[y][c0] = '.'
+        r0 = k * BASE_ROWS
+        for x in range(w):
+            if grid[r0-2][x] != '#' and grid[r0+1][x] != '#':
+                grid[r0-1][x] = '.'; grid[r0][x] = '.'
+    return ["".join(r) for r in grid]
+
+def use_maze(scale):
+    m = scaled_map(scale)
+    pt.MAZE_ROWS = len(m); pt.MAZE_COLS = len(m[0]); pt.ORIGINAL_MAP = m
+
+def open_tiles(game):
+    # tiles reachable from the ghost house, so sealed-off pockets never host ghosts or traps
+    start = game.ghosts[0].start_tile if game.ghosts else game.player.tile
+    return sorted(pt.bfs(start, set(), game.is_wall_tile, game.in_bounds))
+
+def make_game(scale=1, ghosts=4, traps=0, seed=1234):
+    use_maze(scale)
+    random.seed(seed)
+    g = pt.Game(pt.SCREEN_W, pt.SCREEN_H)
+    g.difficulty = "Hard"; g.init_game(hard_reset=True)
+    names = {name for name,_ in pt.ACHIEVEMENTS}
+    g.achievements_unlocked = set(names); g.earned_current_run = set(names)
+    # well past the last trap tier so handle_traps runs its full logic
+    g.player.score = 5000
+    tiles = open_tiles(g)
+    rng = random.Random(seed)
+    while len(g.ghosts) < ghosts:
+        gh = pt.Ghost(rng.choice(tiles), pt.GHOST_COLORS[len(g.ghosts) % len(pt.GHOST_COLORS)], g)
+        gh.base_speed = gh.speed = g.speed_units(max(2.2, g.TILE * 0.078))
+        g.ghosts.append(gh)
+    for i,gh in enumerate(g.ghosts):
+        gh.state = "chase" if i % 2 == 0 else "scatter"
+    for t in rng.sample(tiles, min(traps, len(tiles))):
+        g.traps.append({'tile': t, 'expires': 1e9, 'visible': rng.random() < 0.5, 'triggered': False, 'blocked': False})
+        g.shadow_ghosts.append({'tile': rng.choice(tiles), 'expires': 1e9})
+    return g
+
+# ---------- Timing ----------
+def measure(fn, min_time=0.25, repeat=5):
+    # calibrate the inner loop so one round takes roughly min_time/repeat
+    number = 1; budget = min_time / repeat
+    while True:
+        t0 = time.perf_counter()
+        for _ in range(number): fn()
+        el = time.perf_counter() - t0
+        if el >= budget or number >= 1 << 20: break
+        number *= 2 if el <= 0 else max(2, min(10, int(budget / el) + 1))
+    rounds = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for _ in range(number): fn()
+        rounds.append((time.perf_counter() - t0) / number * 1e6)
+    return {'median_us': statistics.median(rounds), 'min_us': min(rounds), 'mean_us': statistics.fmean(rounds),
+            'number': number, 'repeat': repeat}
+
+# ---------- Cases ----------
+def case_id(name, **params):
+    if not params: return name
+    return name + "[" + ",".join(f"{k}={v}" for k,v in params.items()) + "]"
+
+def far_target(g, start):
+    dist = pt.bfs(start, set(), g.is_wall_tile, g.in_bounds)
+    return max(dist, key=dist.get)
+
+def build_cases(scales):
+    # yields (case id, params, factory); the factory builds the game and returns the timed callable
+    for s in scales:
+        size = f"{BASE_COLS*s}x{BASE_ROWS*s}"
+        def bfs_case(s=s):
+            g = make_game(s); start = open_tiles(g)[0]; target = far_target(g, start)
+            return lambda: pt.bfs(start, {target}, g.is_wall_tile, g.in_bounds)
+        yield case_id("bfs", maze=size), {'maze': size}, bfs_case
+
+        def choose_case(s=s):
+            g = make_game(s); start = open_tiles(g)[0]; target = far_target(g, start)
+            return lambda: pt.choose_bfs_direction(start, target, g.is_wall_tile, g.in_bounds)
+        yield case_id("choose_bfs_direction", maze=size), {'maze': size}, choose_case
+
+        def choose_graph_case(s=s):
+            g = make_game(s); start = open_tiles(g)[0]; target = far_target(g, start)
+            return lambda: pt.choose_bfs_direction(start, target, g.is_wall_tile, g.in_bounds, graph=g.decisions.graph)
+        yield case_id("choose_bfs_direction_graph", maze=size), {'maze': size}, choose_graph_case
+
+        for n in GHOST_COUNTS:
+            def ghost_case(s=s, n=n):
+                g = make_game(s, ghosts=n)
+                def step():
+                    for gh in g.ghosts: gh.move_step(g.player.tile, g.player.direction, g.level)
+                return step
+            yield case_id("ghost_move_step", maze=size, ghosts=n), {'maze': size, 'ghosts': n}, ghost_case
+
+        def spawn_case(s=s):
+            g = make_game(s)
+            def step():
+                g.traps.clear(); g.trap_spawn_cooldown = 0.0
+                g.handle_traps(1.0 / pt.FPS)
+            return step
+        yield case_id("handle_traps_spawn", maze=size), {'maze': size}, spawn_case
+
+        for n in TRAP_COUNTS:
+            def steady_case(s=s, n=n):
+                g = make_game(s, traps=n); g.trap_spawn_cooldown = 1e9
+                return lambda: g.handle_traps(1.0 / pt.FPS)
+            yield case_id("handle_traps_steady", maze=size, traps=n), {'maze': size, 'traps': n}, steady_case
+
+            def maze_case(s=s, n=n):
+                g = make_game(s, traps=n)
+                return g.draw_maze
+            yield case_id("draw_maze", maze=size, traps=n), {'maze': size, 'traps': n}, maze_case
+
+        for n in GHOST_COUNTS:
+            for t in TRAP_COUNTS[1:]:
+                def tick_case(s=s, n=n, t=t):
+                    g = make_game(s, ghosts=n, traps=t)
+                    def step():
+                        g.player.lives = 3
+                        g.update(1.0 / pt.FPS); g.render_frame()
+                    return step
+                yield case_id("tick", maze=size, ghosts=n, traps=t), {'maze': size, 'ghosts': n, 'traps': t}, tick_case
+
+    def ui_case():
+        g = make_game(1)
+        def step():
+            for name,_ in pt.ACHIEVEMENTS: g.badge_pulse[name] = {'t': 0.0, 'spark_emit': False}
+            g.player.speed_boost_timer = 3.0; g.player.invincible_timer = 3.0
+            g.draw_ui_top()
+        return step
+    yield case_id("draw_ui_top"), {}, ui_case
+
+    for scale in pt.RENDER_SCALES:
+        def render_case(scale=scale):
+            g = make_game(1, traps=6); g.set_render_scale(scale)
+            return g.render_frame
+        yield case_id("render_frame", scale=scale), {'scale': scale}, render_case
+
+    for tier in pt.QUALITY_TIERS:
+        def quality_case(tier=tier):
+            g = make_game(1, traps=6); g.set_quality(tier['name'])
+            def step():
+                for name,_ in pt.ACHIEVEMENTS: g.badge_pulse[name] = {'t': 0.0, 'spark_emit': True}
+                g.render_frame()
+            return step
+        yield case_id("render_frame", quality=tier['name']), {'quality': tier['name']}, quality_case
+
+    def mazegen_case():
+        seeds = iter(range(1 << 30))
+        return lambda: mg.generate(next(seeds), BASE_COLS, BASE_ROWS)
+    yield case_id("generate_maze"), {}, mazegen_case
+
+    def validate_case():
+        rows = mg.generate(0, BASE_COLS, BASE_ROWS)
+        return lambda: mg.validate(rows)
+    yield case_id("validate_maze"), {}, validate_case
+
+    def medallion_case():
+        g = make_game(1)
+        return lambda: g.draw_gem_medallion(g.screen, (200, 200), 36, "Conqueror", pulse_t=0.5)
+    yield case_id("draw_gem_medallion"), {}, medallion_case
+
+def run_suite(scales, min_time, repeat, pattern=None, log=print):
+    results = {}
+    for cid, params, factory in build_cases(scales):
+        if pattern and pattern not in cid: continue
+        fn = factory()
+        r = measure(fn, min_time=min_time, repeat=repeat)
+        r['params'] = params
+        results[cid] = r
+        log(f"  {cid:<58} {r['median_us']:>12.1f} us")
+    use_maze(1)
+    return results
+
+# ---------- Baseline comparison ----------
+def compare(results, baseline, threshold):
+    # returns (case id, baseline us, current us, ratio) for every case slower than baseline*(1+threshold)
+    regressions = []
+    for cid, r in results.items():
+        b = baseline.get(cid)
+        if not b or b.get('median_us', 0) <= 0: continue
+        ratio = r['median_us'] / b['median_us']
+        if ratio > 1.0 + threshold:
+            regressions.append((cid, b['median_us'], r['median_us'], ratio))
+    return regressions
+
+def load_results(path):
+    with open(path, 'r') as f:
+        data = json.load(f)
+    return data.get('results', {})
+
+def write_results(path, results):
+    data = {
+        'meta': {'time': time.strftime("%Y-%m-%dT%H:%M:%S"), 'python': platform.python_version(),
+                 'pygame': pygame.version.ver, 'platform': platform.platform(),
+                 'screen': [pt.SCREEN_W, pt.SCREEN_H]},
+        'results': results,
+    }
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Headless benchmarks for Pac-Man Remix")
+    ap.add_argument("--out", default=DEFAULT_OUT, help="where to write this run's JSON results")
+    ap.add_argument("--baseline", default=DEFAULT_BASELINE, help="stored baseline to compare against")
+    ap.add_argument("--save-baseline", action="store_true", help="store this run as the new baseline")
+    ap.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="flag cases slower than baseline by more than this fraction")
+    ap.add_argument("--quick", action="store_true", help="only the stock 21x21 maze, shorter rounds")
+    ap.add_argument("--filter", default=None, help="only run cases whose id contains this text")
+    args = ap.parse_args(argv)
+
+    # keep badge unlocks and the font cache away from the player's real files
+    scratch = tempfile.mkdtemp(prefix="pacman_bench_")
+    pt.BADGE_SAVE_FILE = os.path.join(scratch, "badges.json")
+    pt.FONT_CACHE_FILE = os.path.join(scratch, "fontcache.json")
+    scales = (1,) if args.quick else MAZE_SCALES
+    print(f"Running benchmarks ({'quick' if args.quick else 'full'}) ...")
+    results = run_suite(scales, min_time=0.1 if args.quick else 0.25, repeat=5, pattern=args.filter)
+    pygame.quit()
+    write_results(args.out, results)
+    print(f"Results written to {args.out}")
+
+    status = 0
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        regressions = compare(results, load_results(args.baseline), args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s) above {args.threshold:.0%}:")
+            for cid, b, c, ratio in regressions:
+                print(f"  {cid:<58} {b:>10.1f} -> {c:>10.1f} us  (x{ratio:.2f})")
+            status = 1
+        else:
+            print(f"No regressions above {args.threshold:.0%} against {args.baseline}")
+    elif not args.save_baseline:
+        print(f"No baseline at {args.baseline}; run with --save-baseline to store one")
+    if args.save_baseline:
+        write_results(args.baseline, results)
+        print(f"Baseline saved to {args.baseline}")
+    return status
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,143 @@
+# pacman_env.py
+# Gym-style environment around the pacman_traps game core
+# Requirements: pygame, numpy
+#
+#   env = PacmanEnv(difficulty="Hard")
+#   obs, info = env.reset(seed=0)
+#   obs, reward, done, info = env.step(RIGHT)
+#
+# Observations are uint8 arrays of shape (len(CHANNELS), MAZE_ROWS, MAZE_COLS), one 0/1 plane
+# per channel. They are kept up to date incrementally: the bus events clear eaten pellets and
+# power-ups, and only the handful of cells under moving entities are rewritten each step.
+# reset() and step() return a copy of that array (about 5 KB), so stored transitions stay intact.
+# PacmanEnv(copy_obs=False) returns the live array instead: it is overwritten by the next step,
+# so copy anything you keep.
+
+import os, random
+import numpy as np
+import pacman_traps as pt
+
+CHANNELS = ["walls", "pellets", "energizers", "powerups", "traps",
+            "ghosts_chase", "ghosts_scatter", "ghosts_frightened", "ghosts_frozen", "ghosts_eaten",
+            "shadow_ghosts", "player"]
+CH = {name: i for i,name in enumerate(CHANNELS)}
+GHOST_CHANNEL = {"chase": CH["ghosts_chase"], "scatter": CH["ghosts_scatter"], "frightened": CH["ghosts_frightened"],
+                 "frozen": CH["ghosts_frozen"], "eaten": CH["ghosts_eaten"]}
+
+NOOP, UP, DOWN, LEFT, RIGHT = range(5)
+ACTIONS = [(0,0), (0,-1), (0,1), (-1,0), (1,0)]
+
+class PacmanEnv:
+    def __init__(self, difficulty="Moderate", max_steps=20000, life_penalty=0, headless=True, copy_obs=True):
+        if headless:
+            os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+            os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+        self.game = pt.Game(pt.SCREEN_W, pt.SCREEN_H)
+        self.game.difficulty = difficulty
+        # training runs must neither block in the game-over menu nor touch the player's badge file
+        self.game.game_over_screen = self._on_game_over
+        self.game.save_badges = lambda: None
+        self.max_steps = max_steps; self.life_penalty = life_penalty; self.copy_obs = copy_obs
+        self.n_actions = len(ACTIONS)
+        self.dt = 1.0 / pt.FPS
+        self.obs = None
+        self.steps = 0; self.done = False
+        self._game_over = False; self._rebuild = True
+        self._entity_cells = []   # (channel, y, x) set by the last entity pass
+        ev = self.game.events
+        ev.subscribe(pt.PelletEaten, self._on_pellet)
+        ev.subscribe(pt.PowerupTaken, self._on_powerup)
+        ev.subscribe(pt.LevelCleared, self._on_level_cleared)
+
+    # ---------- bus listeners ----------
+    def _on_game_over(self):
+        self._game_over = True
+
+    def _on_pellet(self, ev):
+        x,y = ev.tile
+        self.obs[CH["pellets"] if ev.kind == "pellet" else CH["energizers"], y, x] = 0
+
+    def _on_powerup(self, ev):
+        x,y = ev.tile
+        self.obs[CH["powerups"], y, x] = 0
+
+    def _on_level_cleared(self, ev):
+        # init_game refills the maze right after this event; rebuild once the step is over
+        self._rebuild = True
+
+    # ---------- observation ----------
+    def _build_static(self):
+        g = self.game
+        shape = (len(CHANNELS), pt.MAZE_ROWS, pt.MAZE_COLS)
+        if self.obs is None or self.obs.shape != shape:
+            self.obs = np.zeros(shape, dtype=np.uint8)
+        else:
+            self.obs.fill(0)
+        walls = self.obs[CH["walls"]]
+        for y,row in enumerate(g.map):
+            for x,c in enumerate(row):
+                if c == '#': walls[y, x] = 1
+        for layer, tiles in (("pellets", g.pellets), ("energizers", g.energizers), ("powerups", g.powerups_on_map)):
+            plane = self.obs[CH[layer]]
+            for x,y in tiles: plane[y, x] = 1
+        self._entity_cells = []
+        self._rebuild = False
+
+    def _update_entities(self):
+        g = self.game; obs = self.obs
+        for c,y,x in self._entity_cells: obs[c, y, x] = 0
+        cells = []
+        for t in g.traps:
+            if t['visible']: cells.append((CH["traps"], t['tile'][1], t['tile'][0]))
+        for gh in g.ghosts:
+            cells.append((GHOST_CHANNEL.get(gh.state, CH["ghosts_eaten"]), gh.tile[1], gh.tile[0]))
+        for sg in g.shadow_ghosts:
+            cells.append((CH["shadow_ghosts"], sg['tile'][1], sg['tile'][0]))
+        cells.append((CH["player"], g.player.tile[1], g.player.tile[0]))
+        rows = pt.MAZE_ROWS; cols = pt.MAZE_COLS
+        for c,y,x in cells:
+            if 0 <= y < rows and 0 <= x < cols: obs[c, y, x] = 1
+        self._entity_cells = cells
+
+    def observation(self):
+        if self._rebuild: self._build_static()
+        self._update_entities()
+        return self.obs.copy() if self.copy_obs else self.obs
+
+    # ---------- gym API ----------
+    def reset(self, seed=None):
+        if seed is not None: random.seed(seed)
+        g = self.game
+        g.level = 1; g.game_time = 0.0
+        g.init_game(hard_reset=True)
+        self.steps = 0; self.done = False; self._game_over = False
+        self._rebuild = True
+        return self.observation(), self.info()
+
+    def step(self, action):
+        if self.done: raise RuntimeError("step() called on a finished episode; call reset()")
+        g = self.game
+        dx,dy = ACTIONS[action]
+        if (dx,dy) != (0,0): g.player.set_desired_direction(dx, dy)
+        score = g.player.score; lives = g.player.lives
+        g.update(self.dt)
+        self.steps += 1
+        reward = g.player.score - score
+        if g.player.lives < lives: reward -= self.life_penalty * (lives - g.player.lives)
+        self.done = self._game_over or self.steps >= self.max_steps
+        return self.observation(), reward, self.done, self.info()
+
+    def info(self):
+        g = self.game
+        return {'score': g.player.score, 'level': g.level, 'lives': g.player.lives, 'steps': self.steps,
+                'game_over': self._game_over}
+
+    def render(self):
+        # RGB frame as an (H, W, 3) array
+        import pygame
+        self.game.render_frame()
+        return np.transpose(pygame.surfarray.array3d(self.game.screen), (1, 0, 2))
+
+    def close(self):
+        import pygame
+        pygame.quit()
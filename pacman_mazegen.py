@@ -0,0 +1,200 @@
+# pacman_mazegen.py
+# Seeded generator for symmetric Pac-Man-style mazes, plus a layout validator
+# generate() builds the left half as a braided spanning tree (no dead ends), mirrors it, and
+# stamps the ghost house in the middle inside a corridor ring so it never cuts the maze apart.
+# validate() checks row widths, the spawn, and that every pellet and ghost tile can be reached.
+#
+#   rows = generate(seed=7)              # list of strings, same alphabet as MAP_STR
+#   assert not validate(rows)            # [] when the layout is playable
+#   use_maze(rows); game.init_game()     # same size as the running maze: swap it in between levels
+#
+# Run: python pacman_mazegen.py show --seed 7
+#      python pacman_mazegen.py check              (the stock MAP_STR, and junction graph vs BFS)
+#      python pacman_mazegen.py bench --count 5000
+
+import sys, time, random, argparse
+import pacman_traps as pt
+
+OPEN = set(". oPG")
+EXTRA_LOOPS = 0.08   # chance per remaining inner wall of being knocked out after braiding
+# small layouts for the junction-graph check: a ring with no junction at all, a ring with a
+# spur (one dead end, one junction), and two separate rings
+GRAPH_EDGE_CASES = {
+    "ring": ["#####", "#...#", "#.#.#", "#...#", "#####"],
+    "ring+spur": ["#######", "#...#.#", "#.#.#.#", "#.....#", "#######"],
+    "two rings": ["#########", "#...#...#", "#.#.#.#.#", "#...#...#", "#########"],
+}
+
+# ---------- Validation ----------
+def spawn_tile(rows):
+    # where init_game puts the player: the P marker, else its fallback tile
+    for y,row in enumerate(rows):
+        x = row.find('P')
+        if x >= 0: return (x, y)
+    return (len(rows[0]) // 2 if rows else 0, len(rows) - 3)
+
+def validate(rows, cols=None, height=None):
+    """Problems with a layout as a list of strings; empty when it is playable.
+
+    cols/height default to the first row's width and the row count; pass pt.MAZE_COLS /
+    pt.MAZE_ROWS to check a layout against the running game's maze size.
+    """
+    if not rows: return ["no rows"]
+    cols = len(rows[0]) if cols is None else cols
+    height = len(rows) if height is None else height
+    problems = []
+    if len(rows) != height: problems.append(f"{len(rows)} rows, expected {height}")
+    bad = [y for y,row in enumerate(rows) if len(row) != cols]
+    if bad: problems.append(f"rows {bad} are not {cols} wide")
+    if problems: return problems
+    flat = "".join(rows)
+    odd = set(flat) - OPEN - {'#'}
+    if odd: problems.append(f"unknown tiles {sorted(odd)}")
+    if flat.count('P') > 1: problems.append("more than one player spawn")
+    sx, sy = spawn_tile(rows)
+    if not (0 <= sx < cols and 0 <= sy < height) or flat[sy*cols + sx] == '#':
+        return problems + [f"player spawn {(sx, sy)} is not an open tile"]
+    # flood fill from the spawn over the flat layout
+    n = len(flat); seen = bytearray(n)
+    start = sy*cols + sx; seen[start] = 1; q = [start]
+    for i in q:
+        x = i % cols
+        for j in (i-1 if x > 0 else -1, i+1 if x < cols-1 else -1, i-cols, i+cols):
+            if 0 <= j < n and not seen[j] and flat[j] != '#':
+                seen[j] = 1; q.append(j)
+    food = [i for i,c in enumerate(flat) if c == '.' or c == 'o']
+    if not food: problems.append("no pellets")
+    lost = sum(1 for i in food if not seen[i])
+    if lost: problems.append(f"{lost} pellet(s) unreachable from the spawn")
+    house = [i for i,c in enumerate(flat) if c == 'G']
+    if not house: problems.append("no ghost house")
+    elif not all(seen[i] for i in house): problems.append("ghost house is not connected")
+    return problems
+
+def graph_mismatches(rows):
+    # targets where the junction graph's distances differ from a grid BFS over the same layout
+    table = pt.DecisionTable(rows); cols = table.cols; bad = []
+    for t in range(len(table.open)):
+        if not table.open[t]: continue
+        target = (t % cols, t // cols)
+        want = table.distances(target); dist = table.graph.query(target)
+        if any(dist(i) != want[i] for i in range(len(want)) if table.open[i]): bad.append(target)
+    return bad
+
+# ---------- Generation ----------
+def house_row(height):
+    # the ghost house sits on the middle cell row (odd y)
+    h = height // 2
+    return h if h % 2 else h - 1
+
+def generate(seed=None, cols=None, height=None, loops=EXTRA_LOOPS):
+    """A symmetric maze of cols x height tiles (both odd, at least 11 x 11) as a list of strings."""
+    cols = pt.MAZE_COLS if cols is None else cols
+    height = pt.MAZE_ROWS if height is None else height
+    if cols % 2 == 0 or height % 2 == 0 or cols < 11 or height < 11:
+        raise ValueError(f"maze size must be odd and at least 11x11, got {cols}x{height}")
+    rng = random.Random(seed)
+    mid = cols // 2; hy = house_row(height)
+    g = [['#'] * cols for _ in range(height)]
+    # the house box (walls + interior) is reserved; the ring of corridor around it is pre-opened
+    box = lambda x, y: mid-3 <= x <= mid+3 and hy-1 <= y <= hy+1
+    for x in range(mid-4, mid+1):
+        g[hy-2][x] = g[hy+2][x] = '.'
+    for y in range(hy-2, hy+3):
+        g[y][mid-4] = '.'
+    cells = [(x, y) for y in range(1, height-1, 2) for x in range(1, mid+1, 2) if not box(x, y)]
+    for x, y in cells: g[y][x] = '.'
+    # Kruskal over the half: join the cells into one tree, respecting what the ring already joins
+    parent = {c: c for c in cells}
+    def find(c):
+        while parent[c] != c:
+            parent[c] = parent[parent[c]]; c = parent[c]
+        return c
+    walls = [(x+1, y, (x, y), (x+2, y)) for x, y in cells if (x+2, y) in parent]
+    walls += [(x, y+1, (x, y), (x, y+2)) for x, y in cells if (x, y+2) in parent]
+    for wx, wy, a, b in walls:
+        if g[wy][wx] != '#': parent[find(a)] = find(b)
+    rng.shuffle(walls)
+    closed = []
+    for wx, wy, a, b in walls:
+        ra, rb = find(a), find(b)
+        if ra != rb and g[wy][wx] == '#':
+            parent[ra] = rb; g[wy][wx] = '.'
+        elif g[wy][wx] == '#':
+            closed.append((wx, wy))
+    # braid: every dead end gets a second way out (across the axis counts, it mirrors back)
+    def exits(x, y):
+        return [(x+dx, y+dy) for dx, dy in ((1,0), (-1,0), (0,1), (0,-1)) if g[y+dy][x+dx] != '#']
+    for x, y in cells:
+        if len(exits(x, y)) > 1: continue
+        options = [(x+dx, y+dy) for dx, dy in ((1,0), (-1,0), (0,1), (0,-1))
+                   if 1 <= x+2*dx <= mid+1 and 1 <= y+2*dy <= height-2 and not box(x+2*dx, y+2*dy)
+                   and g[y+dy][x+dx] == '#' and (x+2*dx <= mid or x+dx == mid)]
+        if options:
+            wx, wy = rng.choice(options); g[wy][wx] = '.'
+    for wx, wy in closed:
+        if g[wy][wx] == '#' and rng.random() < loops: g[wy][wx] = '.'
+    # mirror the left half onto the right
+    for row in g:
+        for x in range(mid+1, cols):
+            row[x] = row[cols-1-x]
+    # ghost house: four spawn tiles behind a door that opens onto the ring
+    for x in range(mid-2, mid+3): g[hy][x] = ' '
+    for x in (mid-2, mid-1, mid+1, mid+2): g[hy][x] = 'G'
+    g[hy-1][mid] = ' '
+    # player spawn on the bottom corridor, centred; energizers in the four corners
+    g[height-2][mid-1] = g[height-2][mid+1] = '.'
+    g[height-2][mid] = 'P'
+    for x, y in ((1, 3), (cols-2, 3), (1, height-4), (cols-2, height-4)):
+        if g[y][x] == '.': g[y][x] = 'o'
+    return ["".join(row) for row in g]
+
+def use_maze(rows):
+    # install a layout as the game's maze; Games sized for another maze must be rebuilt
+    problems = validate(rows)
+    if problems: raise ValueError("invalid maze: " + "; ".join(problems))
+    pt.MAZE_ROWS = len(rows); pt.MAZE_COLS = len(rows[0]); pt.ORIGINAL_MAP = list(rows)
+
+# ---------- CLI ----------
+def bench(count, cols, height):
+    t0 = time.perf_counter()
+    mazes = [generate(seed, cols, height) for seed in range(count)]
+    t1 = time.perf_counter()
+    bad = sum(1 for m in mazes if validate(m))
+    t2 = time.perf_counter()
+    print(f"  {count} mazes {cols}x{height}: generate {count/(t1-t0):8.0f}/s   validate {count/(t2-t1):8.0f}/s   "
+          f"invalid {bad}   distinct {len(set(map(tuple, mazes)))}")
+    return bad
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Pac-Man Remix maze generator")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sp = sub.add_parser("show"); sp.add_argument("--seed", type=int, default=None)
+    sub.add_parser("check")
+    bp = sub.add_parser("bench"); bp.add_argument("--count", type=int, default=5000)
+    for p in (sp, bp):
+        p.add_argument("--cols", type=int, default=pt.MAZE_COLS); p.add_argument("--rows", type=int, default=pt.MAZE_ROWS)
+    args = ap.parse_args(argv)
+    if args.cmd == "bench":
+        return 1 if bench(args.count, args.cols, args.rows) else 0
+    if args.cmd == "check":
+        status = 0
+        for name, rows in (("MAP_STR", pt.MAP_STR), ("ORIGINAL_MAP", pt.ORIGINAL_MAP)):
+            problems = validate(rows, pt.MAZE_COLS, pt.MAZE_ROWS)
+            print(f"{name}: " + ("ok" if not problems else "; ".join(problems)))
+            status |= bool(problems)
+        # junction-graph distances against a grid BFS, on the game's maze, a few generated ones and the edge cases
+        layouts = [("ORIGINAL_MAP", pt.ORIGINAL_MAP)] + [(f"seed {s}", generate(s)) for s in range(3)]
+        for name, rows in layouts + list(GRAPH_EDGE_CASES.items()):
+            bad = graph_mismatches(rows)
+            print(f"graph {name}: " + ("ok" if not bad else f"{len(bad)} target(s) differ from BFS, e.g. {bad[0]}"))
+            status |= bool(bad)
+        return status
+    rows = generate(args.seed, args.cols, args.rows)
+    print("\n".join(rows))
+    problems = validate(rows)
+    print("ok" if not problems else "; ".join(problems))
+    return 1 if problems else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
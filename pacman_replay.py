@@ -0,0 +1,286 @@
+# pacman_replay.py
+# Append-only corpus of recorded sessions: one memory-mapped data file plus a fixed-record index
+# A session is the seed it started from, every tick's frame time and input, and a state checkpoint
+# every few seconds; pacman_traps.replay_ticks() runs it again tick for tick. The index holds one
+# small record of metadata per session, so queries never touch the data file, and opening a replay
+# reads just that session's bytes through the mmap.
+#
+#   corpus = Corpus("replays")                              # replays.dat + replays.idx
+#   hits = corpus.query(level=3, trap_death=True)            # runs a trap ended on level 3
+#   rep = corpus.replay(hits[0]); rep.dts, rep.inputs, rep.checkpoints
+#
+# Run: python pacman_replay.py list [--corpus replays] [--difficulty Hard] [--level 3] [--trap-death]
+#      python pacman_replay.py show N
+#      python pacman_replay.py verify N              (re-simulate session N against its checkpoints)
+#      python pacman_replay.py bench --sessions 5000  (synthetic corpus + query / access timings, in a scratch corpus)
+
+import os, sys, time, json, mmap, zlib, struct, random, argparse, tempfile
+from array import array
+from collections import namedtuple
+
+CORPUS = "replays"
+INDEX_MAGIC = b"PMRI"
+DATA_MAGIC = b"PMRD"
+CORPUS_VERSION = 1
+DIFFICULTIES = (None, "Easy", "Moderate", "Hard")
+# one fixed-size little-endian index record per session; 'badges' is a bit mask over the
+# badge names stored in the index header
+INDEX_FIELDS = [
+    ('offset','Q'), ('length','I'), ('seed','Q'), ('started','d'), ('duration','f'), ('ticks','I'),
+    ('difficulty','B'), ('level','H'), ('score','i'), ('lives_lost','B'), ('traps','H'),
+    ('trap_deaths','B'), ('badges','H'), ('flags','B'),
+]
+INDEX_STRUCT = struct.Struct("<" + "".join(f for _,f in INDEX_FIELDS))
+# bits of the 'flags' field
+GAME_OVER, TRAP_DEATH, LOW_LATENCY = 1, 2, 4
+# each session in the data file: this header, then zlib-compressed frame times (float64 per tick),
+# input codes (one byte per tick) and JSON checkpoints
+RECORD_HEAD = struct.Struct("<4sHHdIIII")   # magic, start level, tile size, start game time, ticks, 3 blob lengths
+
+Session = namedtuple('Session', 'index offset length seed started duration ticks difficulty level score lives_lost '
+                                'traps trap_deaths badges game_over trap_death low_latency')
+Replay = namedtuple('Replay', 'session start_level tile t0 dts inputs checkpoints')
+
+# ---------- Input codes ----------
+# low 3 bits: the player's desired direction; next 3 bits: the turn queued in low-latency mode
+INPUT_DIRS = [(0,0), (1,0), (-1,0), (0,1), (0,-1)]
+_INPUT_CODE = {d: i for i,d in enumerate(INPUT_DIRS)}
+
+def input_code(desired, pending=None):
+    return _INPUT_CODE.get(desired, 0) | (0 if pending is None else _INPUT_CODE.get(pending, 0) << 3)
+
+def decode_input(code):
+    # (desired direction, queued turn or None)
+    p = code >> 3
+    return INPUT_DIRS[code & 7], (INPUT_DIRS[p] if p else None)
+
+# ---------- Corpus ----------
+class Corpus:
+    """Sessions appended to `<path>.dat`, indexed by `<path>.idx`.
+
+    Both files only grow. A session's data is written before its index record, so a crash
+    part-way through an append leaves at most some unreferenced bytes at the end of the data
+    file. A data file that holds sessions is never recreated: without its index the corpus
+    refuses to open. The decoded index is cached and refresh() only reads records added since.
+    """
+    def __init__(self, path=CORPUS, badges=()):
+        self.path = path
+        self.data_path = path + ".dat"; self.index_path = path + ".idx"
+        self.sessions = []; self._index_pos = 0
+        self._map = None; self._mapped = 0; self._data = None
+        data_header = len(DATA_MAGIC) + 2
+        if not os.path.exists(self.index_path) or os.path.getsize(self.index_path) == 0:
+            if os.path.exists(self.data_path) and os.path.getsize(self.data_path) > data_header:
+                # the index holds the metadata, which the data file can't rebuild; don't wipe the sessions
+                raise ValueError(f"{self.data_path} holds recorded sessions but {self.index_path} is missing or empty; "
+                                 "restore the index or move the data file away")
+            self.badges = tuple(badges)
+            names = ",".join(n for n,_ in INDEX_FIELDS).encode(); fmt = INDEX_STRUCT.format.encode()
+            marks = ",".join(self.badges).encode()
+            with open(self.index_path, 'wb') as f:
+                f.write(INDEX_MAGIC + struct.pack("<HHHH", CORPUS_VERSION, len(fmt), len(names), len(marks)) + fmt + names + marks)
+            if not os.path.exists(self.data_path):
+                with open(self.data_path, 'xb') as f:
+                    f.write(DATA_MAGIC + struct.pack("<H", CORPUS_VERSION))
+        else:
+            if not os.path.exists(self.data_path): raise ValueError(f"{self.index_path} has no data file {self.data_path}")
+            with open(self.index_path, 'rb') as f:
+                if f.read(4) != INDEX_MAGIC: raise ValueError(f"{self.index_path} is not a replay index")
+                version, flen, nlen, blen = struct.unpack("<HHHH", f.read(8))
+                fmt = f.read(flen).decode(); f.read(nlen)
+                if version != CORPUS_VERSION or fmt != INDEX_STRUCT.format:
+                    raise ValueError(f"{self.index_path}: unsupported replay index version {version}")
+                self.badges = tuple(b for b in f.read(blen).decode().split(",") if b)
+                self._index_pos = f.tell()
+            for b in badges:
+                if b not in self.badges: raise ValueError(f"{self.index_path} has no badge slot for {b!r}")
+        if not self._index_pos:
+            self._index_pos = os.path.getsize(self.index_path)
+        self._header = self._index_pos
+        self.refresh()
+
+    def __len__(self):
+        return len(self.sessions)
+
+    def refresh(self):
+        # pick up sessions appended (by this or another process) since the last call
+        with open(self.index_path, 'rb') as f:
+            f.seek(self._index_pos); data = f.read()
+        data = data[:len(data) - len(data) % INDEX_STRUCT.size]
+        badges = self.badges; i = len(self.sessions)
+        for (offset, length, seed, started, duration, ticks, diff, level, score, lost,
+             traps, trap_deaths, mask, flags) in INDEX_STRUCT.iter_unpack(data):
+            self.sessions.append(Session(i, offset, length, seed, started, duration, ticks,
+                                         DIFFICULTIES[diff] if diff < len(DIFFICULTIES) else None, level, score, lost,
+                                         traps, trap_deaths, tuple(b for k,b in enumerate(badges) if mask >> k & 1),
+                                         bool(flags & GAME_OVER), bool(flags & TRAP_DEATH), bool(flags & LOW_LATENCY)))
+            i += 1
+        self._index_pos += len(data)
+        return self
+
+    # ---------- Writes ----------
+    def append(self, seed, difficulty, started, duration, level, score, lives_lost=0, traps=0, trap_deaths=0,
+               badges=(), game_over=False, trap_death=False, low_latency=False,
+               start_level=1, tile=0, t0=0.0, dts=(), inputs=b"", checkpoints=()):
+        """Add one session; returns its Session entry."""
+        dts = array('d', dts); inputs = bytes(inputs)
+        if len(dts) != len(inputs): raise ValueError(f"{len(dts)} frame times but {len(inputs)} inputs")
+        blobs = [zlib.compress(dts.tobytes(), 6), zlib.compress(inputs, 6),
+                 zlib.compress(json.dumps(list(checkpoints), separators=(",", ":")).encode(), 6)]
+        record = RECORD_HEAD.pack(DATA_MAGIC, start_level, tile, t0, len(dts), *map(len, blobs)) + b"".join(blobs)
+        with open(self.data_path, 'ab') as f:
+            offset = os.fstat(f.fileno()).st_size
+            f.write(record)
+        mask = 0
+        for b in badges:
+            if b in self.badges: mask |= 1 << self.badges.index(b)
+        flags = (GAME_OVER if game_over else 0) | (TRAP_DEATH if trap_death else 0) | (LOW_LATENCY if low_latency else 0)
+        with open(self.index_path, 'ab') as f:
+            f.write(INDEX_STRUCT.pack(offset, len(record), seed, started, duration, len(dts),
+                                      DIFFICULTIES.index(difficulty) if difficulty in DIFFICULTIES else 0,
+                                      level, score, min(255, lives_lost), min(65535, traps), min(255, trap_deaths),
+                                      mask, flags))
+        self.refresh()
+        return self.sessions[-1]
+
+    # ---------- Reads ----------
+    def query(self, difficulty=None, level=None, min_level=None, min_score=None, game_over=None,
+              trap_death=None, badge=None, low_latency=None, where=None):
+        """Index entries matching every given filter; `where` is any extra predicate on a Session."""
+        self.refresh()
+        out = []
+        for s in self.sessions:
+            if difficulty is not None and s.difficulty != difficulty: continue
+            if level is not None and s.level != level: continue
+            if min_level is not None and s.level < min_level: continue
+            if min_score is not None and s.score < min_score: continue
+            if game_over is not None and s.game_over != game_over: continue
+            if trap_death is not None and s.trap_death != trap_death: continue
+            if badge is not None and badge not in s.badges: continue
+            if low_latency is not None and s.low_latency != low_latency: continue
+            if where is not None and not where(s): continue
+            out.append(s)
+        return out
+
+    def _view(self, end):
+        # the data file mapped at least up to `end`; remapped only when it has grown past the last map
+        if self._map is None or end > self._mapped:
+            if self._map is not None: self._map.close()
+            if self._data is None: self._data = open(self.data_path, 'rb')
+            self._map = mmap.mmap(self._data.fileno(), 0, access=mmap.ACCESS_READ)
+            self._mapped = len(self._map)
+            if end > self._mapped: raise ValueError(f"{self.data_path} is shorter than its index")
+        return self._map
+
+    def replay(self, session):
+        """The recorded session (a Session or its index number), decoded from its slice of the data file."""
+        if not isinstance(session, Session): session = self.sessions[session]
+        buf = self._view(session.offset + session.length)
+        magic, start_level, tile, t0, ticks, n_dt, n_in, n_cp = RECORD_HEAD.unpack_from(buf, session.offset)
+        if magic != DATA_MAGIC: raise ValueError(f"{self.data_path}: no session record at offset {session.offset}")
+        pos = session.offset + RECORD_HEAD.size
+        dts = array('d'); dts.frombytes(zlib.decompress(buf[pos:pos + n_dt])); pos += n_dt
+        inputs = zlib.decompress(buf[pos:pos + n_in]); pos += n_in
+        checkpoints = json.loads(zlib.decompress(buf[pos:pos + n_cp]))
+        return Replay(session, start_level, tile, t0, dts, inputs, checkpoints)
+
+    def close(self):
+        if self._map is not None: self._map.close(); self._map = None
+        if self._data is not None: self._data.close(); self._data = None
+
+# ---------- CLI ----------
+def describe(s):
+    when = time.strftime('%Y-%m-%d %H:%M', time.localtime(s.started))
+    end = "trap" if s.trap_death else "over" if s.game_over else "quit"
+    return (f"{s.index:>6}  {when}  {s.difficulty or '-':<9} level {s.level:<3} score {s.score:>7}  "
+            f"{s.duration:7.1f}s  traps {s.traps:<3} {end:<4}  {','.join(s.badges)}")
+
+def bench(path, sessions, seed=0):
+    # writes a new corpus at `path`; never touches an existing one
+    rng = random.Random(seed)
+    for p in (path + ".dat", path + ".idx"):
+        if os.path.exists(p): raise ValueError(f"{p} already exists; bench needs a new corpus path")
+    corpus = Corpus(path, badges=("Rookie", "Diamond", "Master", "Conqueror"))
+    t0 = time.perf_counter(); now = time.time(); ticks = 0
+    for i in range(sessions):
+        n = rng.randint(600, 7200); ticks += n
+        dts = [1/60 + rng.uniform(-0.0015, 0.0015) for _ in range(n)]
+        moves = bytearray(n); d = 0
+        for k in range(n):
+            if rng.random() < 0.02: d = rng.randint(1, 4)
+            moves[k] = d
+        level = rng.randint(1, 6)
+        corpus.append(rng.getrandbits(63), rng.choice(DIFFICULTIES[1:]), now - 600, n / 60, level, rng.randint(0, 800) * level * 10,
+                      lives_lost=3, traps=rng.randint(0, 12), trap_deaths=rng.randint(0, 2), badges=("Rookie",),
+                      game_over=True, trap_death=rng.random() < 0.2, dts=dts, inputs=moves,
+                      checkpoints=[{'tick': k} for k in range(0, n, 600)])
+    t1 = time.perf_counter()
+    size = os.path.getsize(path + ".dat")
+    print(f"  appended {sessions} sessions ({ticks} ticks, {size / 1e6:.1f} MB) in {t1 - t0:.2f}s")
+    fresh = Corpus(path)
+    print(f"  open corpus (index load)       {(time.perf_counter() - t1) * 1e3:8.2f} ms")
+    for label, fn in (("query level 3 + trap death", lambda: fresh.query(level=3, trap_death=True)),
+                      ("query Hard, score >= 20000", lambda: fresh.query(difficulty="Hard", min_score=20000)),
+                      ("open a random replay", lambda: fresh.replay(rng.randrange(sessions)))):
+        t = time.perf_counter()
+        for _ in range(20): fn()
+        print(f"  {label:<30} {(time.perf_counter() - t) / 20 * 1e3:8.2f} ms")
+    fresh.close(); corpus.close()
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Pac-Man Remix replay corpus")
+    ap.add_argument("--corpus", default=None,
+                    help=f"corpus path, without the .dat / .idx suffix (default {CORPUS}; bench uses a temporary one)")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    lp = sub.add_parser("list")
+    lp.add_argument("--difficulty", default=None); lp.add_argument("--level", type=int, default=None)
+    lp.add_argument("--min-score", type=int, default=None); lp.add_argument("--badge", default=None)
+    lp.add_argument("--trap-death", action="store_true", help="only runs whose last life was lost to a trap")
+    lp.add_argument("--limit", type=int, default=50)
+    sp = sub.add_parser("show"); sp.add_argument("n", type=int)
+    vp = sub.add_parser("verify"); vp.add_argument("n", type=int)
+    bp = sub.add_parser("bench"); bp.add_argument("--sessions", type=int, default=5000)
+    args = ap.parse_args(argv)
+    if args.cmd == "bench":
+        try:
+            if args.corpus is not None: bench(args.corpus, args.sessions)
+            else:
+                with tempfile.TemporaryDirectory() as tmp: bench(os.path.join(tmp, "bench"), args.sessions)
+        except ValueError as e:
+            print(e, file=sys.stderr); return 1
+        return 0
+    args.corpus = args.corpus or CORPUS
+    if not os.path.exists(args.corpus + ".idx"):
+        print(f"no replay corpus at {args.corpus}.idx", file=sys.stderr); return 1
+    corpus = Corpus(args.corpus)
+    if args.cmd == "list":
+        hits = corpus.query(difficulty=args.difficulty, level=args.level, min_score=args.min_score, badge=args.badge,
+                            trap_death=True if args.trap_death else None)
+        for s in hits[-args.limit:]: print(describe(s))
+        print(f"{len(hits)} of {len(corpus)} sessions")
+        return 0
+    if not 0 <= args.n < len(corpus):
+        print(f"no session {args.n} ({len(corpus)} in the corpus)", file=sys.stderr); return 1
+    rep = corpus.replay(args.n)
+    if args.cmd == "show":
+        s = rep.session
+        print(describe(s))
+        print(f"  seed {s.seed}  start level {rep.start_level}  {len(rep.dts)} ticks  "
+              f"lives lost {s.lives_lost}  trap deaths {s.trap_deaths}" + ("  low-latency input" if s.low_latency else ""))
+        for cp in rep.checkpoints:
+            print(f"  tick {cp['tick']:>7}  t {cp['time']:8.2f}  level {cp['level']:<3} score {cp['score']:>7}  "
+                  f"lives {cp['lives']}  pellets {cp['pellets']}")
+        return 0
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy"); os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    import pacman_traps as pt
+    game = pt.Game(pt.SCREEN_W, pt.SCREEN_H)
+    bad = pt.verify_replay(game, rep)
+    if bad is None:
+        print(f"session {args.n}: {len(rep.checkpoints)} checkpoints match over {len(rep.dts)} ticks")
+        return 0
+    tick, want, got = bad
+    print(f"session {args.n}: diverges by tick {tick}\n  recorded  {want}\n  replayed  {got}")
+    return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,414 @@
+# pacman_server.py
+# Authoritative multi-session server for pacman_traps
+# Every session is a headless Game core, ticked at a fixed rate by one cooperative scheduler.
+# Clients send directions and receive the game state, either over plain TCP (one JSON object
+# per line) or over WebSocket (one JSON object per text frame); the protocol is picked from the
+# first line the client sends.
+# Run: python pacman_server.py serve [--port 8765]
+#      python pacman_server.py load --sessions 50 --duration 10 [--local]
+#
+# The client's first message picks the role:
+#   {"t":"join"}                  play a new session
+#   {"t":"watch","session":ID}    spectate a running session
+#   {"t":"stats"}                 get server stats and disconnect
+# Then client -> server:  {"t":"dir","d":"U"|"D"|"L"|"R"}   {"t":"key"}   {"t":"stats"}   {"t":"bye"}
+#      server -> client:  {"t":"hello",...} once, then the pacman_stream keyframe/delta stream
+#                         (one message per tick), {"t":"over",...} at the end; spectators get
+#                         {"t":"over","reason":"left",...} and are disconnected if the player leaves first
+
+import os
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import sys, json, time, random, asyncio, argparse, base64, hashlib, struct
+import pacman_traps as pt
+from pacman_stream import StateEncoder, StateDecoder
+
+TICK_RATE = pt.FPS
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+MAX_SEND_BUFFER = 256 * 1024   # a client with this much unsent data skips state updates until it catches up
+WS_GUID = b"258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+DIRECTIONS = {"U": (0,-1), "D": (0,1), "L": (-1,0), "R": (1,0)}
+
+def dumps(obj):
+    return json.dumps(obj, separators=(',', ':'))
+
+async def read_line(reader):
+    # next line, b"" at EOF, None when it runs past the reader's buffer limit (64 KiB by default)
+    try: return await reader.readline()
+    except (ValueError, asyncio.LimitOverrunError): return None
+
+# ---------- Transports ----------
+class LineConn:
+    """Newline-delimited JSON over a raw TCP stream."""
+    def __init__(self, reader, writer, first=None):
+        self.reader = reader; self.writer = writer; self._first = first
+        self.stale = False   # missed a delta (or asked for a keyframe): gets a keyframe next tick
+
+    async def recv(self):
+        # next message as a dict, None once the peer has gone
+        while True:
+            line = self._first if self._first is not None else await read_line(self.reader)
+            self._first = None
+            if line is None:
+                self.send({'t': "error", 'error': "line too long"}); return None
+            if not line: return None
+            line = line.strip()
+            if not line: continue
+            try: return json.loads(line)
+            except ValueError: continue
+
+    def send(self, obj):
+        return self.send_text(dumps(obj))
+
+    def send_text(self, text):
+        # False when the update was skipped because the client isn't keeping up
+        if self.writer.transport.get_write_buffer_size() > MAX_SEND_BUFFER: return False
+        self.writer.write(text.encode() + b"\n")
+        return True
+
+    def close(self):
+        self.writer.close()
+
+class WsConn(LineConn):
+    """Minimal RFC 6455 WebSocket: text frames, ping/pong and close; no extensions."""
+    async def handshake(self, request_line):
+        headers = {}
+        while True:
+            line = await read_line(self.reader)
+            if line is None: headers = {}; break   # header over the limit: refuse the upgrade
+            if not line or line in (b"\r\n", b"\n"): break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        key = headers.get("sec-websocket-key")
+        if not key or "websocket" not in headers.get("upgrade", "").lower():
+            self.writer.write(b"HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\n\r\n")
+            return False
+        accept = base64.b64encode(hashlib.sha1(key.encode() + WS_GUID).digest()).decode()
+        self.writer.write(("HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                           f"Sec-WebSocket-Accept: {accept}\r\n\r\n").encode())
+        return True
+
+    async def _frame(self):
+        head = await self.reader.readexactly(2)
+        fin = head[0] & 0x80; opcode = head[0] & 0x0f
+        n = head[1] & 0x7f
+        if n == 126: n = struct.unpack("!H", await self.reader.readexactly(2))[0]
+        elif n == 127: n = struct.unpack("!Q", await self.reader.readexactly(8))[0]
+        mask = await self.reader.readexactly(4) if head[1] & 0x80 else None
+        data = await self.reader.readexactly(n)
+        if mask: data = bytes(b ^ mask[i & 3] for i,b in enumerate(data))
+        return fin, opcode, data
+
+    async def recv(self):
+        parts = []
+        try:
+            while True:
+                fin, opcode, data = await self._frame()
+                if opcode == 0x8:
+                    self._write_frame(0x8, data[:2]); return None
+                if opcode == 0x9:
+                    self._write_frame(0xA, data); continue
+                if opcode in (0x1, 0x2, 0x0): parts.append(data)
+                if fin and parts:
+                    msg = b"".join(parts); parts = []
+                    try: return json.loads(msg)
+                    except ValueError: continue
+        except (asyncio.IncompleteReadError, ConnectionError):
+            return None
+
+    def _write_frame(self, opcode, payload):
+        n = len(payload)
+        if n < 126: head = struct.pack("!BB", 0x80 | opcode, n)
+        elif n < 1 << 16: head = struct.pack("!BBH", 0x80 | opcode, 126, n)
+        else: head = struct.pack("!BBQ", 0x80 | opcode, 127, n)
+        self.writer.write(head + payload)
+
+    def send_text(self, text):
+        if self.writer.transport.get_write_buffer_size() > MAX_SEND_BUFFER: return False
+        self._write_frame(0x1, text.encode())
+        return True
+
+    def close(self):
+        # close frame (1000, normal closure) before dropping the stream
+        if not self.writer.is_closing(): self._write_frame(0x8, struct.pack("!H", 1000))
+        self.writer.close()
+
+# ---------- Sessions ----------
+def make_core(difficulty):
+    # a headless Game: no menus, no badge file, game over just ends the session
+    g = pt.Game(pt.SCREEN_W, pt.SCREEN_H)
+    g.difficulty = difficulty
+    g.save_badges = lambda: None
+    g.init_game(hard_reset=True)
+    return g
+
+class Session:
+    def __init__(self, sid, conn, difficulty):
+        self.sid = sid; self.conn = conn
+        self.game = make_core(difficulty)
+        self.game.game_over_screen = self._on_game_over
+        self.encoder = StateEncoder()
+        self.watchers = set()
+        self.ticks = 0; self.cpu = 0.0; self.skipped = 0; self.bytes_sent = 0
+        self.started = time.perf_counter()
+        self.over = False
+
+    def _on_game_over(self):
+        self.over = True
+
+    def hello(self):
+        return {'t': "hello", 'session': self.sid, 'tick_rate': TICK_RATE, 'subtile': pt.SUBTILE,
+                'rows': pt.MAZE_ROWS, 'cols': pt.MAZE_COLS, 'map': ["".join(r) for r in self.game.map]}
+
+    def on_message(self, msg):
+        kind = msg.get('t') if isinstance(msg, dict) else None
+        if kind == "dir" and msg.get('d') in DIRECTIONS:
+            self.game.player.set_desired_direction(*DIRECTIONS[msg['d']])
+
+    def step(self, dt):
+        # one tick plus its stream message; CPU time is charged to this session only
+        t0 = time.thread_time()
+        self.game.update(dt)
+        self.ticks += 1
+        self.broadcast(dumps(self.encoder.encode(self.game, self.ticks)))
+        if self.over:
+            over = dumps({'t': "over", 'score': self.game.player.score, 'level': self.game.level})
+            for conn in (self.conn, *self.watchers): conn.send_text(over)
+        self.cpu += time.thread_time() - t0
+
+    def end(self):
+        # the session is being removed: tell the spectators why (unless game over already did) and
+        # close them, which also ends their spectate() loops
+        if not self.over:
+            left = dumps({'t': "over", 'reason': "left", 'score': self.game.player.score, 'level': self.game.level})
+            for conn in self.watchers: conn.send_text(left)
+        for conn in list(self.watchers): conn.close()
+        self.watchers.clear()
+
+    def broadcast(self, text):
+        # the message is serialised once for the player and every spectator; a connection that
+        # missed a delta gets a keyframe instead (built at most once per tick)
+        key = None
+        for conn in (self.conn, *self.watchers):
+            if conn.stale:
+                if key is None: key = dumps(self.encoder.keyframe(self.game, self.ticks))
+                if conn.send_text(key): conn.stale = False; self.bytes_sent += len(key)
+            elif conn.send_text(text):
+                self.bytes_sent += len(text)
+            else:
+                conn.stale = True; self.skipped += 1
+
+    def cpu_share(self):
+        # fraction of one core this session has used since it started
+        return self.cpu / max(1e-9, time.perf_counter() - self.started)
+
+    def bytes_per_s(self):
+        return self.bytes_sent / max(1e-9, time.perf_counter() - self.started)
+
+# ---------- Server ----------
+class Server:
+    """Accepts clients and ticks every live session from a single scheduler task.
+
+    The scheduler yields to the event loop between sessions so socket I/O interleaves with
+    simulation, and it never tries to catch up on missed ticks: when one round of ticks takes
+    longer than the tick interval it counts an overrun and re-anchors the schedule.
+    """
+    def __init__(self, tick_rate=TICK_RATE, difficulty="Moderate", max_sessions=None):
+        self.dt = 1.0 / tick_rate; self.difficulty = difficulty; self.max_sessions = max_sessions
+        self.sessions = {}
+        self._next_id = 1
+        self.rounds = 0; self.overruns = 0; self.busy = 0.0
+        self.started = time.perf_counter()
+
+    async def handle(self, reader, writer):
+        first = await read_line(reader)
+        if first is None: LineConn(reader, writer).send({'t': "error", 'error': "line too long"})
+        if not first: writer.close(); return
+        if first.startswith(b"GET "):
+            conn = WsConn(reader, writer)
+            if not await conn.handshake(first):
+                writer.close(); return
+        else:
+            conn = LineConn(reader, writer, first)
+        try:
+            msg = await conn.recv()
+            kind = msg.get('t') if isinstance(msg, dict) else None
+            if kind == "stats":
+                conn.send(self.stats())
+            elif kind == "watch":
+                await self.spectate(conn, msg.get('session'))
+            elif kind == "join":
+                await self.play(conn)
+            elif msg is not None:
+                conn.send({'t': "error", 'error': "first message must be join, watch or stats"})
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            conn.close()
+
+    async def play(self, conn):
+        if self.max_sessions is not None and len(self.sessions) >= self.max_sessions:
+            conn.send({'t': "error", 'error': "server full"}); return
+        sid = self._next_id; self._next_id += 1
+        session = self.sessions[sid] = Session(sid, conn, self.difficulty)
+        conn.send(session.hello())
+        try:
+            while not session.over:
+                msg = await conn.recv()
+                if msg is None: break
+                if not isinstance(msg, dict): continue
+                kind = msg.get('t')
+                if kind == "bye": break
+                if kind == "stats": conn.send(self.stats())
+                elif kind == "key": conn.stale = True
+                else: session.on_message(msg)
+        finally:
+            self.sessions.pop(sid, None)
+            session.end()
+
+    async def spectate(self, conn, sid):
+        session = self.sessions.get(sid)
+        if session is None:
+            conn.send({'t': "error", 'error': f"no session {sid}"}); return
+        conn.send(session.hello())
+        conn.stale = True   # the first thing a spectator gets is a keyframe
+        session.watchers.add(conn)
+        try:
+            while sid in self.sessions:
+                msg = await conn.recv()
+                if msg is None or not isinstance(msg, dict) or msg.get('t') == "bye": break
+                if msg.get('t') == "key": conn.stale = True
+        finally:
+            session.watchers.discard(conn)
+
+    async def run_ticks(self):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time()
+        while True:
+            deadline += self.dt
+            t0 = time.perf_counter()
+            for session in list(self.sessions.values()):
+                if session.over: continue
+                session.step(self.dt)
+                await asyncio.sleep(0)
+            self.busy += time.perf_counter() - t0
+            self.rounds += 1
+            delay = deadline - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            else:
+                self.overruns += 1; deadline = loop.time()
+                await asyncio.sleep(0)
+
+    def stats(self):
+        live = list(self.sessions.values())
+        shares = [s.cpu_share() for s in live]
+        mean_share = sum(shares) / len(shares) if shares else 0.0
+        elapsed = max(1e-9, time.perf_counter() - self.started)
+        return {
+            't': "stats", 'sessions': len(live), 'tick_rate': round(1.0 / self.dt, 2),
+            'rounds': self.rounds, 'overruns': self.overruns,
+            'scheduler_load': round(self.busy / elapsed, 4),
+            'cpu_per_session': round(mean_share, 5),
+            'tick_cpu_ms': round(1000 * sum(s.cpu for s in live) / max(1, sum(s.ticks for s in live)), 4),
+            'skipped_updates': sum(s.skipped for s in live),
+            'spectators': sum(len(s.watchers) for s in live),
+            'bytes_per_session_per_s': round(sum(s.bytes_per_s() for s in live) / max(1, len(live)), 1),
+            'sessions_per_core': round(1.0 / mean_share, 1) if mean_share > 0 else None,
+        }
+
+    async def serve(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        srv = await asyncio.start_server(self.handle, host, port)
+        ticker = asyncio.create_task(self.run_ticks())
+        return srv, ticker
+
+# ---------- Load generator ----------
+async def load_client(host, port, until, rng, seen):
+    reader, writer = await asyncio.open_connection(host, port, limit=1 << 20)
+    conn = LineConn(reader, writer)
+    conn.send({'t': "join"})
+    decoder = StateDecoder()
+    try:
+        while time.perf_counter() < until:
+            try: msg = await asyncio.wait_for(conn.recv(), timeout=max(0.01, until - time.perf_counter()))
+            except asyncio.TimeoutError: break
+            if msg is None or msg.get('t') == "over": break
+            if msg.get('t') in ("key", "d"):
+                seen['states'] += 1
+                if not decoder.apply(msg): conn.send({'t': "key"})
+                if rng.random() < 0.1: conn.send({'t': "dir", 'd': rng.choice("UDLR")})
+    finally:
+        conn.send({'t': "bye"}); conn.close()
+
+async def fetch_stats(host, port):
+    reader, writer = await asyncio.open_connection(host, port, limit=1 << 20)
+    conn = LineConn(reader, writer)
+    conn.send({'t': "stats"})
+    try:
+        while True:
+            msg = await conn.recv()
+            if msg is None or msg.get('t') == "stats": return msg
+    finally:
+        conn.send({'t': "bye"}); conn.close()
+
+async def run_load(host, port, sessions, duration, seed=0, local=False, difficulty="Moderate"):
+    server = srv = ticker = None
+    if local:
+        server = Server(difficulty=difficulty)
+        srv, ticker = await server.serve(host, port)
+        port = srv.sockets[0].getsockname()[1]
+    rng = random.Random(seed); seen = {'states': 0}
+    until = time.perf_counter() + duration
+    clients = [asyncio.create_task(load_client(host, port, until, random.Random(rng.random()), seen))
+               for _ in range(sessions)]
+    await asyncio.sleep(max(0.0, until - time.perf_counter() - 0.2))
+    stats = await fetch_stats(host, port)
+    await asyncio.gather(*clients, return_exceptions=True)
+    if local:
+        ticker.cancel(); srv.close(); await srv.wait_closed()
+    stats = stats or {}
+    stats['client_states_per_session_per_s'] = round(seen['states'] / max(1, sessions) / duration, 1)
+    return stats
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Pac-Man Remix game server")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sp = sub.add_parser("serve", help="run the server")
+    sp.add_argument("--host", default=DEFAULT_HOST); sp.add_argument("--port", type=int, default=DEFAULT_PORT)
+    sp.add_argument("--difficulty", default="Moderate", choices=["Easy", "Moderate", "Hard"])
+    sp.add_argument("--max-sessions", type=int, default=None)
+    sp.add_argument("--stats-every", type=float, default=10.0, help="print server stats every N seconds (0 = never)")
+    lp = sub.add_parser("load", help="open many sessions against a server and report sessions per core")
+    lp.add_argument("--host", default=DEFAULT_HOST); lp.add_argument("--port", type=int, default=DEFAULT_PORT)
+    lp.add_argument("--sessions", type=int, default=20); lp.add_argument("--duration", type=float, default=10.0)
+    lp.add_argument("--seed", type=int, default=0)
+    lp.add_argument("--local", action="store_true", help="start the server in this process on a free port")
+    lp.add_argument("--difficulty", default="Moderate", choices=["Easy", "Moderate", "Hard"])
+    args = ap.parse_args(argv)
+
+    if args.cmd == "load":
+        port = 0 if args.local else args.port
+        stats = asyncio.run(run_load(args.host, port, args.sessions, args.duration, args.seed, args.local, args.difficulty))
+        for k,v in stats.items():
+            if k != 't': print(f"  {k:<34} {v}")
+        return 0
+
+    async def serve():
+        server = Server(difficulty=args.difficulty, max_sessions=args.max_sessions)
+        srv, ticker = await server.serve(args.host, args.port)
+        print(f"Serving on {args.host}:{args.port} at {TICK_RATE} ticks/s")
+        async with srv:
+            while True:
+                await asyncio.sleep(args.stats_every or 3600)
+                if args.stats_every: print(dumps(server.stats()))
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
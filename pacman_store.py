@@ -0,0 +1,259 @@
+# pacman_store.py
+# Embedded SQLite store for profiles, runs, per-level stats and badge unlocks
+# Writes are queued and committed by a background thread in batched transactions; reads run on
+# the caller's own connection. The database runs in WAL mode, so readers never wait on the writer.
+# Run: python pacman_store.py leaderboard [--db pacman.db] [--difficulty Hard]
+#      python pacman_store.py profile NAME
+#      python pacman_store.py bench --runs 200000     (synthetic data + query timings, in a scratch database)
+
+import os, sys, time, sqlite3, threading, atexit, argparse, random, tempfile
+from collections import deque
+
+DB_FILE = "pacman.db"
+BATCH_INTERVAL = 0.5   # seconds queued writes may wait before they are committed together
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS profiles (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    profile_id INTEGER NOT NULL REFERENCES profiles(id),
+    difficulty TEXT NOT NULL,
+    started_at REAL NOT NULL,
+    ended_at REAL NOT NULL,
+    duration REAL NOT NULL,
+    score INTEGER NOT NULL,
+    level INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_by_score ON runs(score DESC);
+CREATE INDEX IF NOT EXISTS runs_by_difficulty ON runs(difficulty, score DESC);
+CREATE INDEX IF NOT EXISTS runs_by_profile ON runs(profile_id, score DESC);
+CREATE TABLE IF NOT EXISTS level_stats (
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    level INTEGER NOT NULL,
+    score INTEGER NOT NULL,
+    duration REAL NOT NULL,
+    lives_lost INTEGER NOT NULL,
+    ghosts_eaten INTEGER NOT NULL,
+    traps_triggered INTEGER NOT NULL,
+    PRIMARY KEY (run_id, level)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS badges (
+    profile_id INTEGER NOT NULL REFERENCES profiles(id),
+    name TEXT NOT NULL,
+    unlocked_at REAL NOT NULL,
+    PRIMARY KEY (profile_id, name)
+) WITHOUT ROWID;
+"""
+
+def connect(path):
+    conn = sqlite3.connect(path, timeout=10.0, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")   # WAL + NORMAL: durable across app crashes, cheap commits
+    conn.execute("PRAGMA foreign_keys=ON")
+    return conn
+
+class Store:
+    """Profiles, runs, level stats and badges in one SQLite file.
+
+    record_run() and unlock_badge() only queue work; a daemon thread commits everything
+    queued within BATCH_INTERVAL in a single transaction, so the game loop never waits on
+    the disk. Queries go straight to the database.
+    """
+    def __init__(self, path=DB_FILE, batch_interval=BATCH_INTERVAL):
+        self.path = path; self.batch_interval = batch_interval
+        self.last_error = None
+        self.db = connect(path)
+        self.db.executescript(SCHEMA)
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._busy = False; self._closed = False
+        self._flushing = False   # set by flush(): commit what's queued now instead of waiting out the batch
+        self._thread = threading.Thread(target=self._run, name="store-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    # ---------- Writes (queued) ----------
+    def record_run(self, profile_id, difficulty, started_at, ended_at, duration, score, level, levels=()):
+        # levels: (level, score, duration, lives_lost, ghosts_eaten, traps_triggered) per level played;
+        # the one equal to `level` is where the run ended
+        self._submit(("run", (profile_id, difficulty, started_at, ended_at, duration, score, level), tuple(levels)))
+
+    def unlock_badge(self, profile_id, name, unlocked_at=None):
+        self._submit(("badge", (profile_id, name, unlocked_at or time.time())))
+
+    def _submit(self, op):
+        with self._cond:
+            if self._closed: raise RuntimeError("store is closed")
+            self._queue.append(op)
+            self._cond.notify_all()
+
+    def _run(self):
+        db = connect(self.path)
+        while True:
+            with self._cond:
+                while not self._queue and not self._closed:
+                    self._cond.wait()
+                if not self._queue: break
+                deadline = time.monotonic() + self.batch_interval
+                while not self._closed and not self._flushing:
+                    left = deadline - time.monotonic()
+                    if left <= 0: break
+                    self._cond.wait(left)
+                batch = list(self._queue); self._queue.clear(); self._busy = True; self._flushing = False
+            try:
+                self._write(db, batch)
+            except sqlite3.Error as e:
+                self.last_error = e
+                print(f"pacman_store: could not write {len(batch)} record(s): {e}", file=sys.stderr)
+            finally:
+                with self._cond:
+                    self._busy = False; self._cond.notify_all()
+        db.close()
+
+    def _write(self, db, batch):
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            for op in batch:
+                if op[0] == "run":
+                    cur = db.execute("INSERT INTO runs(profile_id, difficulty, started_at, ended_at, duration, score, level)"
+                                     " VALUES (?,?,?,?,?,?,?)", op[1])
+                    run_id = cur.lastrowid
+                    if op[2]:
+                        db.executemany("INSERT OR REPLACE INTO level_stats VALUES (?,?,?,?,?,?,?)",
+                                       [(run_id, *lv) for lv in op[2]])
+                else:
+                    db.execute("INSERT OR IGNORE INTO badges(profile_id, name, unlocked_at) VALUES (?,?,?)", op[1])
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    def flush(self, timeout=5.0):
+        # wait until everything queued so far is committed; False on timeout
+        end = time.monotonic() + timeout
+        with self._cond:
+            if self._queue: self._flushing = True
+            self._cond.notify_all()
+            while self._queue or self._busy:
+                left = end - time.monotonic()
+                if left <= 0: return False
+                self._cond.wait(min(left, 0.05))
+        return True
+
+    def close(self):
+        with self._cond:
+            if self._closed: return
+            self._closed = True; self._cond.notify_all()
+        self._thread.join(timeout=5.0)
+        self.db.close()
+
+    # ---------- Reads ----------
+    def profile(self, name):
+        # id of the named profile, created on first use
+        row = self.db.execute("SELECT id FROM profiles WHERE name = ?", (name,)).fetchone()
+        if row: return row[0]
+        return self.db.execute("INSERT INTO profiles(name, created_at) VALUES (?,?)", (name, time.time())).lastrowid
+
+    def badges(self, profile_id):
+        return {name for name, in self.db.execute("SELECT name FROM badges WHERE profile_id = ?", (profile_id,))}
+
+    def badge_history(self, profile_id):
+        return self.db.execute("SELECT name, unlocked_at FROM badges WHERE profile_id = ? ORDER BY unlocked_at",
+                               (profile_id,)).fetchall()
+
+    def leaderboard(self, limit=10, difficulty=None):
+        # (name, score, level, difficulty, ended_at), best first; walks the score index and stops at `limit`
+        sql = ("SELECT p.name, r.score, r.level, r.difficulty, r.ended_at FROM runs r"
+               " JOIN profiles p ON p.id = r.profile_id")
+        if difficulty is None:
+            return self.db.execute(sql + " ORDER BY r.score DESC LIMIT ?", (limit,)).fetchall()
+        return self.db.execute(sql + " WHERE r.difficulty = ? ORDER BY r.score DESC LIMIT ?", (difficulty, limit)).fetchall()
+
+    def rank(self, score, difficulty=None):
+        # (1-based rank this score would take, runs on the board)
+        if difficulty is None:
+            better = self.db.execute("SELECT COUNT(*) FROM runs WHERE score > ?", (score,)).fetchone()[0]
+            total = self.db.execute("SELECT COUNT(*) FROM runs").fetchone()[0]
+        else:
+            better = self.db.execute("SELECT COUNT(*) FROM runs WHERE difficulty = ? AND score > ?", (difficulty, score)).fetchone()[0]
+            total = self.db.execute("SELECT COUNT(*) FROM runs WHERE difficulty = ?", (difficulty,)).fetchone()[0]
+        return better + 1, total
+
+    def best_score(self, profile_id):
+        return self.db.execute("SELECT MAX(score) FROM runs WHERE profile_id = ?", (profile_id,)).fetchone()[0] or 0
+
+    def profile_stats(self, profile_id):
+        runs, best, avg, played, top_level = self.db.execute(
+            "SELECT COUNT(*), MAX(score), AVG(score), SUM(duration), MAX(level) FROM runs WHERE profile_id = ?",
+            (profile_id,)).fetchone()
+        per_level = self.db.execute(
+            "SELECT l.level, COUNT(*), AVG(l.duration), AVG(l.lives_lost), SUM(l.ghosts_eaten), SUM(l.traps_triggered)"
+            " FROM runs r JOIN level_stats l ON l.run_id = r.id WHERE r.profile_id = ? GROUP BY l.level ORDER BY l.level",
+            (profile_id,)).fetchall()
+        return {'runs': runs, 'best': best or 0, 'average': avg or 0.0, 'time_played': played or 0.0,
+                'top_level': top_level or 0, 'levels': per_level}
+
+# ---------- CLI ----------
+def bench(path, runs, profiles=200, seed=0):
+    # fills `path` with synthetic runs, so it refuses a database that already holds real ones
+    rng = random.Random(seed)
+    store = Store(path)
+    if store.db.execute("SELECT EXISTS(SELECT 1 FROM runs)").fetchone()[0]:
+        store.close()
+        raise ValueError(f"{path} already has runs; bench needs a new or empty database")
+    ids = [store.profile(f"player{i}") for i in range(profiles)]
+    t0 = time.perf_counter(); now = time.time()
+    for i in range(runs):
+        level = rng.randint(1, 8); score = rng.randint(0, 400) * level * 10
+        levels = [(lv, score * lv // level, rng.uniform(30, 120), rng.randint(0, 2), rng.randint(0, 6), rng.randint(0, 3))
+                  for lv in range(1, level)]
+        store.record_run(rng.choice(ids), rng.choice(("Easy", "Moderate", "Hard")), now - 600, now, rng.uniform(60, 900),
+                         score, level, levels)
+    store.flush(timeout=600)
+    print(f"  inserted {runs} runs in {time.perf_counter() - t0:.2f}s")
+    for label, fn in (("leaderboard top 10", lambda: store.leaderboard(10)),
+                      ("leaderboard top 10 (Hard)", lambda: store.leaderboard(10, "Hard")),
+                      ("rank of a score", lambda: store.rank(5000)),
+                      ("profile stats", lambda: store.profile_stats(ids[0]))):
+        t = time.perf_counter()
+        for _ in range(20): fn()
+        print(f"  {label:<30} {(time.perf_counter() - t) / 20 * 1e3:8.2f} ms")
+    store.close()
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Pac-Man Remix profile and score store")
+    ap.add_argument("--db", default=None, help=f"database file (default {DB_FILE}; bench uses a temporary one)")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    lp = sub.add_parser("leaderboard"); lp.add_argument("--difficulty", default=None); lp.add_argument("--limit", type=int, default=10)
+    pp = sub.add_parser("profile"); pp.add_argument("name")
+    bp = sub.add_parser("bench"); bp.add_argument("--runs", type=int, default=200000)
+    args = ap.parse_args(argv)
+    if args.cmd == "bench":
+        try:
+            if args.db is not None: bench(args.db, args.runs)
+            else:
+                with tempfile.TemporaryDirectory() as tmp: bench(os.path.join(tmp, "bench.db"), args.runs)
+        except ValueError as e:
+            print(e, file=sys.stderr); return 1
+        return 0
+    store = Store(args.db or DB_FILE)
+    if args.cmd == "leaderboard":
+        for i,(name, score, level, diff, ended) in enumerate(store.leaderboard(args.limit, args.difficulty), 1):
+            print(f"{i:>3}. {name:<20} {score:>8}  level {level:<3} {diff:<9} {time.strftime('%Y-%m-%d', time.localtime(ended))}")
+    else:
+        st = store.profile_stats(store.profile(args.name))
+        print(f"{args.name}: {st['runs']} runs, best {st['best']}, average {st['average']:.0f}, "
+              f"top level {st['top_level']}, {st['time_played']/60:.0f} min played")
+        for lv, n, dur, lost, eaten, traps in st['levels']:
+            print(f"  level {lv:<3} played  {n:>6}x  avg {dur:6.1f}s  lives lost {lost:.2f}  ghosts {eaten}  traps {traps}")
+        for name, at in store.badge_history(store.profile(args.name)):
+            print(f"  badge {name:<10} {time.strftime('%Y-%m-%d %H:%M', time.localtime(at))}")
+    store.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,174 @@
+# pacman_stream.py
+# Delta-compressed game state stream for remote clients and spectators
+# StateEncoder turns a running Game into periodic keyframes plus small per-tick deltas;
+# StateDecoder folds them back into a plain state it can push into a Game for rendering.
+#
+#   enc = StateEncoder();  msg = enc.encode(game, tick)      # JSON-ready dict, every tick
+#   dec = StateDecoder();  dec.apply(msg) and dec.sync(view_game); view_game.render_frame()
+#
+# Tiles travel as flat indices (y*cols + x), entity positions in 1/16 tile, timers in tenths
+# of a second. A delta only carries what changed since the previous tick:
+#   'eat'    tiles whose pellet, energizer or power-up disappeared
+#   'ents'   [i, qx, qy, dir, state] for each entity that moved or changed (0 = player)
+#   'traps'  lifecycle: [idx, flags] for a new or changed trap, [idx, -1] when it's gone
+#   'shadow' the full shadow-ghost tile list, only when it changed
+# plus 'score' / 'lives' / 'timers' when they changed. A new level, a refilled maze or a different
+# ghost count forces a keyframe.
+
+import math
+import pacman_traps as pt
+
+KEYFRAME_INTERVAL = 120   # ticks between unsolicited keyframes (2 s at 60 FPS)
+POS_SHIFT = 4             # fixed-point positions are sent >> POS_SHIFT, i.e. in 1/16 tile
+GHOST_STATES = ["scatter", "chase", "frightened", "frozen", "eaten"]
+DIRS = [(0,0), (1,0), (-1,0), (0,1), (0,-1)]
+DIR_CODE = {d: i for i,d in enumerate(DIRS)}
+TRAP_VISIBLE, TRAP_TRIGGERED, TRAP_BLOCKING = 1, 2, 4
+
+def trap_flags(trap):
+    return ((TRAP_VISIBLE if trap.get('visible') else 0) | (TRAP_TRIGGERED if trap.get('triggered') else 0)
+            | (TRAP_BLOCKING if trap.get('blocked') else 0))
+
+def _timers(game):
+    p = game.player
+    return [int(p.speed_boost_timer * 10), int(p.invincible_timer * 10), int(p.slow_timer * 10),
+            int(max(0.0, game.freeze_until - game.game_time) * 10)]
+
+def _entities(game):
+    p = game.player
+    ents = [(p.fx >> POS_SHIFT, p.fy >> POS_SHIFT, DIR_CODE.get(p.direction, 0), 0)]
+    for g in game.ghosts:
+        ents.append((g.fx >> POS_SHIFT, g.fy >> POS_SHIFT, DIR_CODE.get(g.direction, 0),
+                     GHOST_STATES.index(g.state) if g.state in GHOST_STATES else 0))
+    return ents
+
+class StateEncoder:
+    """Keeps the last state it sent and emits the difference on every encode()."""
+    def __init__(self, keyframe_interval=KEYFRAME_INTERVAL):
+        self.keyframe_interval = keyframe_interval
+        self.last_tick = None; self._since_key = 0
+        self.keyframes = 0; self.deltas = 0
+
+    def keyframe(self, game, tick):
+        # full state; also becomes the baseline for the next delta
+        cols = pt.MAZE_COLS
+        self._pellets = {y*cols + x for x,y in game.pellets}
+        self._energizers = {y*cols + x for x,y in game.energizers}
+        self._powerups = {y*cols + x: kind for (x,y),kind in game.powerups_on_map.items()}
+        self._traps = {t['tile'][1]*cols + t['tile'][0]: trap_flags(t) for t in game.traps}
+        self._shadow = sorted(sg['tile'][1]*cols + sg['tile'][0] for sg in game.shadow_ghosts)
+        self._ents = _entities(game)
+        self._score = game.player.score; self._lives = game.player.lives; self._level = game.level
+        self._timers = _timers(game)
+        self.last_tick = tick; self._since_key = 0; self.keyframes += 1
+        return {
+            't': "key", 'tick': tick, 'level': game.level, 'score': self._score, 'lives': self._lives,
+            'rows': pt.MAZE_ROWS, 'cols': cols, 'map': ["".join(r) for r in game.map],
+            'pellets': sorted(self._pellets), 'energizers': sorted(self._energizers),
+            'powerups': sorted([i, k] for i,k in self._powerups.items()),
+            'traps': sorted([i, f] for i,f in self._traps.items()), 'shadow': self._shadow,
+            'ents': [list(e) for e in self._ents], 'timers': self._timers,
+        }
+
+    def encode(self, game, tick):
+        if (self.last_tick is None or self._since_key >= self.keyframe_interval or game.level != self._level
+                or len(game.ghosts) + 1 != len(self._ents) or len(game.pellets) > len(self._pellets)
+                or len(game.energizers) > len(self._energizers) or len(game.powerups_on_map) > len(self._powerups)):
+            # the maze was refilled or rebuilt; deltas only describe things disappearing
+            return self.keyframe(game, tick)
+        cols = pt.MAZE_COLS
+        msg = {'t': "d", 'tick': tick, 'base': self.last_tick}
+        # pellets and power-ups only ever disappear between keyframes
+        eat = []
+        if len(game.pellets) != len(self._pellets):
+            now = {y*cols + x for x,y in game.pellets}
+            eat.extend(self._pellets - now); self._pellets = now
+        if len(game.energizers) != len(self._energizers):
+            now = {y*cols + x for x,y in game.energizers}
+            eat.extend(self._energizers - now); self._energizers = now
+        if len(game.powerups_on_map) != len(self._powerups):
+            now = {y*cols + x for x,y in game.powerups_on_map}
+            gone = [i for i in self._powerups if i not in now]
+            for i in gone: del self._powerups[i]
+            eat.extend(gone)
+        if eat: msg['eat'] = sorted(eat)
+        ents = _entities(game); moved = []
+        for i,(e, old) in enumerate(zip(ents, self._ents)):
+            if e != old: moved.append([i, *e])
+        if moved: msg['ents'] = moved
+        self._ents = ents
+        if game.traps or self._traps:
+            traps = {t['tile'][1]*cols + t['tile'][0]: trap_flags(t) for t in game.traps}
+            if traps != self._traps:
+                changes = [[i, f] for i,f in traps.items() if self._traps.get(i) != f]
+                changes += [[i, -1] for i in self._traps if i not in traps]
+                msg['traps'] = sorted(changes); self._traps = traps
+        if game.shadow_ghosts or self._shadow:
+            shadow = sorted(sg['tile'][1]*cols + sg['tile'][0] for sg in game.shadow_ghosts)
+            if shadow != self._shadow: msg['shadow'] = self._shadow = shadow
+        p = game.player
+        if p.score != self._score: msg['score'] = self._score = p.score
+        if p.lives != self._lives: msg['lives'] = self._lives = p.lives
+        timers = _timers(game)
+        if timers != self._timers: msg['timers'] = self._timers = timers
+        self.last_tick = tick; self._since_key += 1; self.deltas += 1
+        return msg
+
+class StateDecoder:
+    """Rebuilds the stream into plain state. apply() returns False when a delta can't be used
+    (no keyframe yet, or a tick was missed); the caller should ask the sender for a keyframe."""
+    def __init__(self):
+        self.tick = None; self.need_key = True
+
+    def apply(self, msg):
+        kind = msg.get('t')
+        if kind == "key":
+            self.tick = msg['tick']; self.need_key = False
+            self.level = msg['level']; self.score = msg['score']; self.lives = msg['lives']
+            self.rows = msg['rows']; self.cols = msg['cols']; self.map = msg['map']
+            self.pellets = set(msg['pellets']); self.energizers = set(msg['energizers'])
+            self.powerups = {i: k for i,k in msg['powerups']}
+            self.traps = {i: f for i,f in msg['traps']}; self.shadow = list(msg['shadow'])
+            self.ents = [list(e) for e in msg['ents']]; self.timers = list(msg['timers'])
+            return True
+        if kind != "d": return False
+        if self.need_key or msg.get('base') != self.tick:
+            self.need_key = True
+            return False
+        self.tick = msg['tick']
+        for i in msg.get('eat', ()):
+            self.pellets.discard(i); self.energizers.discard(i); self.powerups.pop(i, None)
+        for i, *e in msg.get('ents', ()): self.ents[i] = e
+        for i,f in msg.get('traps', ()):
+            if f < 0: self.traps.pop(i, None)
+            else: self.traps[i] = f
+        if 'shadow' in msg: self.shadow = msg['shadow']
+        if 'score' in msg: self.score = msg['score']
+        if 'lives' in msg: self.lives = msg['lives']
+        if 'timers' in msg: self.timers = msg['timers']
+        return True
+
+    def sync(self, game):
+        # push the decoded state into a Game (same maze size) so its draw code can render it
+        cols = self.cols
+        def tile(i): return (i % cols, i // cols)
+        if game.level != self.level or ["".join(r) for r in game.map] != self.map:
+            tmpl = game.template = pt.level_template(self.map)
+            game.map = tmpl.grid; game.decisions = tmpl.decisions
+        game.level = self.level
+        game.pellets = {tile(i) for i in self.pellets}; game.energizers = {tile(i) for i in self.energizers}
+        game.powerups_on_map = {tile(i): k for i,k in self.powerups.items()}
+        game.traps = [{'tile': tile(i), 'expires': math.inf, 'visible': bool(f & TRAP_VISIBLE), 'triggered': bool(f & TRAP_TRIGGERED),
+                       'blocked': bool(f & TRAP_BLOCKING)} for i,f in self.traps.items()]
+        game.shadow_ghosts = [{'tile': tile(i), 'expires': math.inf} for i in self.shadow]
+        p = game.player
+        p.score = self.score; p.lives = self.lives
+        p.speed_boost_timer, p.invincible_timer, p.slow_timer, freeze = (t / 10 for t in self.timers)
+        game.freeze_until = game.game_time + freeze
+        while len(game.ghosts) < len(self.ents) - 1:
+            game.ghosts.append(pt.Ghost(p.tile, pt.GHOST_COLORS[len(game.ghosts) % len(pt.GHOST_COLORS)], game))
+        del game.ghosts[len(self.ents) - 1:]
+        for ent, (qx, qy, d, st) in zip([p] + game.ghosts, self.ents):
+            ent.fx = qx << POS_SHIFT; ent.fy = qy << POS_SHIFT; ent.direction = DIRS[d]
+            ent.tile = (ent.fx // pt.SUBTILE, ent.fy // pt.SUBTILE); ent.target_tile = ent.tile
+            if ent is not p: ent.state = GHOST_STATES[st]
@@ -4,8 +4,12 @@
 # Install: pip install pygame
 # Run: python pacman_remix_with_strategic_traps.py
 
-import pygame, sys, random, json, math, time
-from collections import deque
+import pygame, sys, os, random, json, math, time, threading, tempfile, atexit, struct, argparse, heapq
+import cProfile, tracemalloc, linecache, zlib
+from array import array
+from collections import deque, namedtuple
+from contextlib import contextmanager
+import pacman_store, pacman_replay
 
 # ---------- Config ----------
 MAZE_ROWS = 21
@@ -13,8 +17,14 @@ MAZE_COLS = 21
 SCREEN_W = 1200
 SCREEN_H = 800
 FPS = 60
+SUBTILE = 256           # fixed-point movement: entity positions are integers in 1/SUBTILE of a tile
+MENU_IDLE_FPS = 10      # menus drop to this rate once nothing has happened for MENU_IDLE_DELAY seconds
+MENU_IDLE_DELAY = 1.5
 
 BADGE_SAVE_FILE = "pacman_badges.json"
+BADGE_SAVE_COALESCE = 0.25  # seconds a burst of unlocks may settle before one write
+FONT_CACHE_FILE = "pacman_fontcache.json"
+PREFERRED_FONTS = ["Orbitron","Bahnschrift","Segoe UI","Fira Code","Consolas","Arial"]
 
 ACHIEVEMENTS = [("Rookie", 100), ("Diamond", 500), ("Master", 1000), ("Conqueror", 2000)]
 BADGE_DESCRIPTIONS = {
@@ -26,6 +36,43 @@ BADGE_DESCRIPTIONS = {
 
 BUFF_DURATIONS = {'speed': 6.0, 'freeze': 4.0, 'invincible': 5.0}
 
+DEFAULT_DIFFICULTY = "Hard"   # the rules a game plays by when no difficulty was chosen (scripts, tools)
+
+GHOST_MODE_CYCLE = 9.0   # seconds per scatter + chase cycle; chase takes the level's chase share of it
+
+AUTOPILOT_BUDGET = 0.006    # seconds of rollouts per decision, well inside one 60 FPS frame
+AUTOPILOT_HORIZON = 24      # ticks simulated per rollout (a few tiles of travel)
+
+RENDER_SCALES = (1.0, 0.75, 0.5)   # internal framebuffer sizes the auto mode steps through
+RENDER_TARGET = 0.8 / FPS          # frame work (update + draw + flip) the auto mode aims to stay under
+
+# effect tiers the quality governor steps down through when frames overrun (gameplay only;
+# menus are pre-rendered pages): sparks per badge unlock, medallion auras, animated pulses,
+# and the gradient + translucent maze backdrop
+QUALITY_TIERS = (
+    {'name': "high", 'particles': 8, 'aura': True, 'pulse': True, 'backdrop': True},
+    {'name': "medium", 'particles': 3, 'aura': False, 'pulse': True, 'backdrop': True},
+    {'name': "low", 'particles': 0, 'aura': False, 'pulse': False, 'backdrop': False},
+)
+
+CAPTURE_FPS = 30     # frame rate of --capture recordings
+CAPTURE_QUEUE = 6    # frames the capture writer may fall behind before new ones are dropped
+CAPTURE_PNG_LEVEL = 3   # zlib level for PNG frames: fast enough to keep up at CAPTURE_FPS
+
+PERF_FRAMES = 120        # frames one profiling capture (F9) covers
+PERF_TRACE_DEPTH = 8     # stack frames tracemalloc keeps per allocation during a capture
+PERF_TOP_SITES = 25      # allocation sites listed in a capture's report
+
+REPLAY_CHECKPOINT = 600   # ticks between state checkpoints in a recorded replay (10 s at 60 FPS)
+REPLAY_TRAP_BLAME = 3.0   # a life lost this many seconds after triggering a trap counts as lost to the trap
+
+# cosmetic randomness (trap sparks, badge particles) draws from its own generator so drawing a frame never
+# shifts the seeded gameplay sequence a replay depends on
+FX_RANDOM = random.Random()
+
+INPUT_BUFFER = 0.25          # seconds a tapped turn stays queued in low-latency input mode
+INPUT_GRACE = SUBTILE // 4   # a turn pressed this soon after leaving a tile centre still takes that centre
+
 # ---------- Colors ----------
 DEEP_BG_A = (10, 8, 28)
 DEEP_BG_B = (26, 6, 56)
@@ -86,6 +133,55 @@ def wrap_text(text, font, max_width):
     if cur: lines.append(cur)
     return lines
 
+# read once at import: os.umask can only be queried by setting it, which isn't safe once writer threads run
+_UMASK = os.umask(0); os.umask(_UMASK)
+
+def write_json_atomic(path, data):
+    # temp file in the target directory + rename, so readers never see a half-written file
+    folder = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(prefix=".pacman-", suffix=".tmp", dir=folder)
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f); f.flush(); os.fsync(f.fileno())
+        # mkstemp creates the file 0600; keep the existing file's mode, or follow the umask for a new one
+        try:
+            mode = os.stat(path).st_mode & 0o7777
+        except FileNotFoundError:
+            mode = 0o666 & ~_UMASK
+        os.chmod(tmp, mode)
+        os.replace(tmp, path)
+    except BaseException:
+        try: os.unlink(tmp)
+        except OSError: pass
+        raise
+
+def font_sizes(base):
+    return {'large': max(28, base//28), 'big': max(18, base//44), 'main': max(14, base//60), 'small': max(12, base//80)}
+
+def resolve_font(preferred, screen_w, cache_file=None):
+    # match_font can scan the whole fontconfig database, so remember the answer on disk;
+    # the entry is dropped when the font list/width changes or the cached font file is gone.
+    # A miss (no preferred font installed) is not cached, so a font installed later is found.
+    cache_file = cache_file or FONT_CACHE_FILE
+    key = {'fonts': list(preferred), 'screen_w': screen_w}
+    try:
+        with open(cache_file, 'r') as f:
+            cached = json.load(f)
+        path = cached['path']
+        if cached['key'] == key and path is not None and os.path.exists(path):
+            return path, cached['sizes']
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    chosen = None
+    for p in preferred:
+        f = pygame.font.match_font(p)
+        if f: chosen = f; break
+    sizes = font_sizes(screen_w)
+    if chosen is not None:
+        try: write_json_atomic(cache_file, {'key': key, 'path': chosen, 'sizes': sizes})
+        except OSError: pass
+    return chosen, sizes
+
 def bfs(start, targets, is_wall_fn, in_bounds_fn):
     q = deque([start]); dist = {start:0}
     while q:
@@ -101,7 +197,8 @@ def bfs(start, targets, is_wall_fn, in_bounds_fn):
                 q.append((nx,ny))
     return dist
 
-def choose_bfs_direction(cur_tile, target_tile, is_wall_fn, in_bounds_fn, forbidden_reverse=None):
+def choose_bfs_direction(cur_tile, target_tile, is_wall_fn, in_bounds_fn, forbidden_reverse=None, graph=None):
+    # with a JunctionGraph (static walls only) the distances come from the graph instead of a grid BFS
     x,y = cur_tile
     options=[]
     for dx,dy,dirname in [(1,0,"R"),(-1,0,"L"),(0,1,"D"),(0,-1,"U")]:
@@ -110,7 +207,15 @@ def choose_bfs_direction(cur_tile, target_tile, is_wall_fn, in_bounds_fn, forbid
         if is_wall_fn(nx,ny): continue
         options.append(((nx,ny),(dx,dy),dirname))
     if not options: return (0,0), None
-    dist_map = bfs(cur_tile, {target_tile}, is_wall_fn, in_bounds_fn)
+    # distances measured from the target, so each neighbour's value is its remaining path length
+    query = graph.query(target_tile) if graph is not None else None
+    if query is not None:
+        cols = graph.table.cols; dist_map = {}
+        for (nx,ny),_,_ in options:
+            d = query(ny*cols + nx)
+            if d >= 0: dist_map[(nx,ny)] = d
+    else:
+        dist_map = bfs(target_tile, set(), is_wall_fn, in_bounds_fn)
     best=None; best_d=None
     for (nx,ny),(dx,dy),dirname in options:
         if forbidden_reverse and dirname==forbidden_reverse: continue
@@ -126,6 +231,895 @@ def choose_bfs_direction(cur_tile, target_tile, is_wall_fn, in_bounds_fn, forbid
             return best, dirname
     return best, None
 
+# ---------- Ghost decision tables ----------
+# Directions in the order ghosts have always tried them; bit b of an exit mask is DIRS4[b].
+DIRS4 = [(1,0,"R"), (-1,0,"L"), (0,1,"D"), (0,-1,"U")]
+HEADING = {(1,0): 0, (-1,0): 1, (0,1): 2, (0,-1): 3}   # heading 4 = standing still
+REVERSE_BIT = [1<<1, 1<<0, 1<<3, 1<<2, 0]
+MASK_MOVES = [tuple(DIRS4[b] for b in range(4) if m >> b & 1) for m in range(16)]
+
+class DecisionTable:
+    """Static per-tile movement data for one maze layout.
+
+    exits[i] is the mask of open neighbours of flat tile i (= y*cols + x); turns[i*5 + h] is
+    the same mask with the reverse of heading h removed. distances() is a BFS over the masks;
+    graph is the junction graph of the same layout, for queries that don't need the full grid.
+    """
+    def __init__(self, grid):
+        self.rows = len(grid); self.cols = len(grid[0])
+        rows, cols = self.rows, self.cols
+        self.open = bytearray(1 if c != '#' else 0 for row in grid for c in row)
+        self.exits = bytearray(rows*cols)
+        self.turns = bytearray(rows*cols*5)
+        self.offsets = (1, -1, cols, -cols)
+        for y in range(rows):
+            for x in range(cols):
+                m = 0
+                for b,(dx,dy,_) in enumerate(DIRS4):
+                    nx,ny = x+dx, y+dy
+                    if 0 <= nx < cols and 0 <= ny < rows and grid[ny][nx] != '#': m |= 1 << b
+                i = y*cols + x
+                self.exits[i] = m
+                for h in range(5): self.turns[i*5 + h] = m & ~REVERSE_BIT[h]
+        self.graph = JunctionGraph(self)
+
+    def distances(self, target, blocked=()):
+        # path length from every tile to target (-1 = unreachable); blocked holds flat indices
+        exits = self.exits; offsets = self.offsets
+        dist = [-1] * (self.rows*self.cols)
+        t = target[1]*self.cols + target[0]
+        dist[t] = 0; q = [t]
+        for i in q:
+            m = exits[i]; d = dist[i] + 1
+            for b in range(4):
+                if m >> b & 1:
+                    j = i + offsets[b]
+                    if dist[j] < 0 and j not in blocked:
+                        dist[j] = d; q.append(j)
+        return dist
+
+class JunctionGraph:
+    """The walkable grid compressed to junctions joined by corridors.
+
+    Nodes are open tiles whose neighbour count isn't 2 (junctions, dead ends), edges carry
+    corridor lengths, and every corridor tile knows its corridor and its offset from the
+    corridor's first end. Distance queries run Dijkstra over the junctions and project
+    on-corridor tiles onto their two ends, so they scale with junctions, not tiles.
+    """
+    def __init__(self, table):
+        self.table = table
+        n = table.rows * table.cols
+        exits, offsets, is_open = table.exits, table.offsets, table.open
+        degree = [bin(m).count("1") for m in range(16)]
+        self.node_of = [-1] * n          # flat tile -> node id
+        self.nodes = []                  # node id -> flat tile
+        self.adj = []                    # node id -> [(node id, length)]
+        self.corridor_of = [-1] * n      # flat tile -> corridor id, for tiles inside a corridor
+        self.offset_of = [0] * n         # steps from the corridor's first end
+        self.corridors = []              # corridor id -> (node a, node b, length)
+        for i in range(n):
+            if is_open[i] and degree[exits[i]] != 2: self._add_node(i)
+        # a ring of corridor with no junction on it would never be walked: promote one tile of each
+        seen = bytearray(n)
+        for i in range(n):
+            if not is_open[i] or seen[i] or self.node_of[i] >= 0: continue
+            seen[i] = 1; q = [i]; touches = False
+            for j in q:
+                m = exits[j]
+                for b in range(4):
+                    if m >> b & 1:
+                        k = j + offsets[b]
+                        if self.node_of[k] >= 0: touches = True
+                        elif not seen[k]: seen[k] = 1; q.append(k)
+            if not touches: self._add_node(i)
+        walked = set()                   # (flat tile, direction bit) already followed
+        for u in list(self.nodes): self._walk_from(u, walked)
+
+    def _add_node(self, i):
+        self.node_of[i] = len(self.nodes); self.nodes.append(i); self.adj.append([])
+        return i
+
+    def _walk_from(self, u, walked):
+        exits, offsets = self.table.exits, self.table.offsets
+        for b in range(4):
+            if not exits[u] >> b & 1 or (u, b) in walked: continue
+            walked.add((u, b))
+            cid = len(self.corridors)
+            prev, cur, length, last_b = u, u + offsets[b], 1, b
+            while self.node_of[cur] < 0:
+                self.corridor_of[cur] = cid; self.offset_of[cur] = length
+                m = exits[cur]
+                for bb in range(4):
+                    if m >> bb & 1 and cur + offsets[bb] != prev:
+                        prev, cur, last_b = cur, cur + offsets[bb], bb
+                        break
+                length += 1
+            walked.add((cur, last_b ^ 1))   # bits pair up as R/L and D/U, so ^1 is the reverse
+            a, v = self.node_of[u], self.node_of[cur]
+            self.corridors.append((a, v, length))
+            self.adj[a].append((v, length)); self.adj[v].append((a, length))
+
+    def query(self, target):
+        """dist(flat tile) -> path length to target, -1 if unreachable; None if target isn't open."""
+        cols = self.table.cols
+        t = target[1]*cols + target[0]
+        if not (0 <= target[0] < cols and 0 <= target[1] < self.table.rows) or not self.table.open[t]: return None
+        inf = math.inf
+        dist = [inf] * len(self.nodes)
+        heap = []
+        t_corr = self.corridor_of[t]
+        if t_corr < 0:
+            dist[self.node_of[t]] = 0; heap.append((0, self.node_of[t]))
+        else:
+            a, b, length = self.corridors[t_corr]; k = self.offset_of[t]
+            dist[a] = min(dist[a], k); dist[b] = min(dist[b], length - k)
+            heap = [(dist[a], a), (dist[b], b)]
+            heapq.heapify(heap)
+        adj = self.adj
+        while heap:
+            d, u = heapq.heappop(heap)
+            if d > dist[u]: continue
+            for v, w in adj[u]:
+                nd = d + w
+                if nd < dist[v]:
+                    dist[v] = nd; heapq.heappush(heap, (nd, v))
+        node_of, corridor_of, offset_of, corridors = self.node_of, self.corridor_of, self.offset_of, self.corridors
+        t_off = self.offset_of[t]
+
+        def distance(i):
+            n = node_of[i]
+            if n >= 0:
+                d = dist[n]
+            else:
+                c = corridor_of[i]
+                if c < 0: return -1
+                a, b, length = corridors[c]; k = offset_of[i]
+                d = min(dist[a] + k, dist[b] + length - k)
+                if c == t_corr: d = min(d, abs(k - t_off))
+            return -1 if d == inf else d
+        return distance
+
+_decision_tables = {}
+
+def decision_table(grid):
+    key = tuple("".join(r) for r in grid)
+    table = _decision_tables.get(key)
+    if table is None:
+        table = _decision_tables[key] = DecisionTable(grid)
+    return table
+
+# ---------- Ghost modes ----------
+class GhostModes:
+    """Timed scatter/chase phases for one level.
+
+    Every ghost runs the same cycle (scatter first, then chase for the level's chase share of
+    it), shifted by an even fraction of the cycle per ghost slot so the pack never flips all at
+    once. Ghosts only ask for their mode at tile centres, the one place it changes a decision.
+    """
+    def __init__(self, level, difficulty, count, cycle=GHOST_MODE_CYCLE):
+        share = 0.5 + min(0.3, (level-1)*0.03) + (0.1 if difficulty == "Hard" else 0.0)
+        self.cycle = cycle; self.scatter = cycle * (1.0 - share)
+        self.offsets = [cycle * i / max(1, count) for i in range(max(1, count))]
+
+    def mode(self, slot, t):
+        # t: seconds since the schedule started (level start or the last life lost)
+        phase = (t + self.offsets[slot % len(self.offsets)]) % self.cycle
+        return "scatter" if phase < self.scatter else "chase"
+
+# ---------- Level templates ----------
+class LevelTemplate:
+    """Everything init_game derives from one maze layout, compiled once and shared read-only.
+
+    grid is the layout with the P/G spawn markers blanked (rows are never edited in place, so
+    every Game on this layout uses the same lists); wall, exits and the junction graph come from
+    the layout's DecisionTable. chokes lists the interior tiles with 2-3 open neighbours and their
+    trap weight, powerup_slots the interior pellets level 1 may turn into power-ups, both in
+    row-major order so random picks match a fresh scan. A Game only copies pellets and energizers.
+    """
+    def __init__(self, rows):
+        self.rows = len(rows); self.cols = len(rows[0])
+        self.grid = [list(r) for r in rows]
+        pellets = []; energizers = []; ghosts = []; player = None
+        for y,row in enumerate(self.grid):
+            for x,c in enumerate(row):
+                if c == '.': pellets.append((x,y))
+                elif c == 'o': energizers.append((x,y))
+                elif c == 'P':
+                    player = (x,y); row[x] = ' '
+                elif c == 'G':
+                    ghosts.append((x,y)); row[x] = ' '
+        self.player_spawn = player or (self.cols//2, self.rows-3)
+        self.ghost_spawns = tuple(ghosts)
+        self.pellets = frozenset(pellets); self.energizers = frozenset(energizers)
+        self.decisions = decision_table(self.grid)
+        self.wall = bytearray(1 - o for o in self.decisions.open)
+        self.exits = self.decisions.exits
+        inner = lambda x,y: 2 <= x < self.cols-2 and 2 <= y < self.rows-2
+        self.powerup_slots = tuple(t for t in pellets if inner(*t))
+        degree = [bin(m).count("1") for m in range(16)]
+        self.chokes = tuple(((x,y), max(0.1, 1.0 - (abs(x - self.cols//2) + abs(y - self.rows//2))/40.0))
+                            for y in range(2, self.rows-2) for x in range(2, self.cols-2)
+                            if not self.wall[y*self.cols + x] and 2 <= degree[self.exits[y*self.cols + x]] <= 3)
+
+_level_templates = {}
+
+def level_template(rows):
+    key = tuple("".join(r) for r in rows)
+    tmpl = _level_templates.get(key)
+    if tmpl is None:
+        tmpl = _level_templates[key] = LevelTemplate(key)
+    return tmpl
+
+# ---------- Events ----------
+# Discrete game events. Anything that only changes when one of these happens (badges, HUD,
+# telemetry) subscribes to the bus instead of re-checking game state every frame.
+PelletEaten = namedtuple('PelletEaten', 'tile kind points score')      # kind: "pellet" | "energizer"
+PowerupTaken = namedtuple('PowerupTaken', 'tile power points score')
+TrapSpawned = namedtuple('TrapSpawned', 'tile visible')
+TrapTriggered = namedtuple('TrapTriggered', 'tile blocked_for shadow')
+GhostEaten = namedtuple('GhostEaten', 'ghost points score')
+LifeLost = namedtuple('LifeLost', 'lives')
+LevelCleared = namedtuple('LevelCleared', 'level score')
+BadgeUnlocked = namedtuple('BadgeUnlocked', 'name first_time')
+GameOver = namedtuple('GameOver', 'score level')
+
+class EventBus:
+    def __init__(self):
+        self._subs = {}
+
+    def subscribe(self, event_type, fn):
+        self._subs.setdefault(event_type, []).append(fn)
+        return fn
+
+    def unsubscribe(self, event_type, fn):
+        subs = self._subs.get(event_type)
+        if subs and fn in subs: subs.remove(fn)
+
+    def emit(self, event):
+        for fn in self._subs.get(type(event), ()):
+            fn(event)
+
+# ---------- Timers ----------
+class Timers:
+    """Deadlines on the game clock, fired in order from a heap.
+
+    at(deadline, fn, *args) queues fn(*args) for the first update whose game_time reaches the
+    deadline. run() only pops what is due, so a frame costs nothing per pending timer. Entries
+    are never cancelled: handlers check that the deadline they were queued for is still the
+    current one and ignore stale ones.
+    """
+    def __init__(self):
+        self.heap = []; self._seq = 0
+
+    def at(self, deadline, fn, *args):
+        heapq.heappush(self.heap, (deadline, self._seq, fn, args)); self._seq += 1
+
+    def run(self, now):
+        heap = self.heap
+        while heap and heap[0][0] <= now:
+            _, _, fn, args = heapq.heappop(heap)
+            fn(*args)
+
+    def clear(self):
+        self.heap.clear()
+
+class Countdown:
+    """Seconds-left attribute (e.g. slow_timer) stored as a game-clock deadline (slow_until).
+
+    Reading it is one subtraction and nothing ticks it down each frame. Setting a positive
+    value queues the owner's `expired` method, if given, on the game's timers.
+    """
+    def __init__(self, expired=None):
+        self.expired = expired
+
+    def __set_name__(self, owner, name):
+        self.key = name[:-len("_timer")] + "_until"
+
+    def __get__(self, obj, owner=None):
+        if obj is None: return self
+        return max(0.0, obj.__dict__[self.key] - obj.game.game_time)
+
+    def __set__(self, obj, seconds):
+        game = obj.game
+        until = obj.__dict__[self.key] = game.game_time + max(0.0, seconds)
+        if seconds > 0 and self.expired: game.timers.at(until, self._fire, obj, until)
+
+    def _fire(self, obj, until):
+        if obj.__dict__.get(self.key) == until: getattr(obj, self.expired)()
+
+# ---------- Badge persistence ----------
+class BadgeWriter:
+    """Writes the badge list on a background thread.
+
+    submit() only swaps in the newest snapshot, so a burst of unlocks collapses into one
+    write and the game loop never touches the disk. Writes go to a temp file in the same
+    directory and are renamed over the save file, so a crash mid-write keeps the old file.
+    """
+    def __init__(self, path, coalesce=BADGE_SAVE_COALESCE):
+        self.path = path; self.coalesce = coalesce
+        self.last_error = None
+        self._cond = threading.Condition()
+        self._pending = None; self._writing = False; self._urgent = False; self._closed = False
+        self._thread = None
+
+    def submit(self, badges):
+        with self._cond:
+            self._pending = sorted(badges)
+            if not self._closed:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="badge-writer", daemon=True)
+                    self._thread.start()
+                    atexit.register(self.close)
+                self._cond.notify_all()
+                return
+        # closed writer: nobody will pick it up, write inline
+        self._write(self._take())
+
+    def _take(self):
+        with self._cond:
+            data = self._pending; self._pending = None
+            return data
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._pending is None and not self._closed:
+                    self._cond.wait()
+                if self._pending is None: return
+                deadline = time.monotonic() + self.coalesce
+                while not (self._closed or self._urgent):
+                    left = deadline - time.monotonic()
+                    if left <= 0: break
+                    self._cond.wait(left)
+                data = self._pending; self._pending = None; self._writing = True
+            try:
+                self._write(data)
+            finally:
+                with self._cond:
+                    self._writing = False
+                    if self._pending is None: self._urgent = False
+                    self._cond.notify_all()
+
+    def _write(self, data):
+        if data is None: return
+        try:
+            write_json_atomic(self.path, data)
+            self.last_error = None
+        except OSError as e:
+            self.last_error = e
+            sys.stderr.write(f"pacman: could not save badges to {self.path}: {e}\n")
+
+    def flush(self, timeout=5.0):
+        # block until every submitted snapshot is on disk (or timeout runs out)
+        end = time.monotonic() + timeout
+        with self._cond:
+            if self._thread is None: return self._pending is None
+            self._urgent = True; self._cond.notify_all()
+            while self._pending is not None or self._writing:
+                left = end - time.monotonic()
+                if left <= 0: return False
+                self._cond.wait(left)
+        return True
+
+    def close(self, timeout=5.0):
+        self.flush(timeout)
+        with self._cond:
+            self._closed = True; self._cond.notify_all()
+            t = self._thread
+        if t is not None and t is not threading.current_thread(): t.join(timeout)
+
+# ---------- Telemetry ----------
+# One fixed-size little-endian record per Game.update. The file starts with b"PMTL", a
+# version, the struct format and the field names, followed by packed records.
+TELEMETRY_MAGIC = b"PMTL"
+TELEMETRY_VERSION = 1
+TELEMETRY_FIELDS = [
+    ('tick','I'), ('time','f'), ('frame_dt','f'), ('score','i'), ('level','H'), ('lives','b'),
+    ('px','h'), ('py','h'), ('traps','B'), ('visible_traps','B'), ('shadow_ghosts','B'),
+    ('chase','B'), ('scatter','B'), ('frightened','B'), ('frozen','B'), ('eaten','B'),
+    ('speed_t','f'), ('invincible_t','f'), ('slow_t','f'), ('freeze_t','f'),
+    ('trap_spawns','B'), ('trap_triggers','B'), ('events','H'),
+]
+TELEMETRY_STRUCT = struct.Struct("<" + "".join(f for _,f in TELEMETRY_FIELDS))
+# bits of the 'events' field: what happened during the tick
+EV_PELLET, EV_ENERGIZER, EV_POWERUP, EV_TRAP_SPAWN, EV_TRAP_TRIGGER = 1, 2, 4, 8, 16
+EV_GHOST_EATEN, EV_LIFE_LOST, EV_LEVEL_CLEARED, EV_BADGE = 32, 64, 128, 256
+
+class TelemetryRecorder:
+    """Opt-in per-tick recorder.
+
+    record() packs one record into a preallocated ring buffer and never waits on anything;
+    a background thread drains the ring to disk in batches. If the writer falls that far
+    behind, new records are dropped (and counted) rather than stalling the game loop.
+    """
+    def __init__(self, path, capacity=8192, flush_interval=0.5):
+        self.path = path; self.capacity = capacity; self.flush_interval = flush_interval
+        self.size = TELEMETRY_STRUCT.size
+        self._buf = bytearray(self.size * capacity)
+        self._head = 0; self._tail = 0   # records produced / written; only the game thread moves _head
+        self.dropped = 0; self.tick = 0
+        self._events = 0; self._spawns = 0; self._triggers = 0
+        self._wake = threading.Event(); self._stop = False
+        self._file = open(path, 'wb')
+        names = ",".join(n for n,_ in TELEMETRY_FIELDS).encode()
+        fmt = TELEMETRY_STRUCT.format.encode()
+        self._file.write(TELEMETRY_MAGIC + struct.pack("<HHH", TELEMETRY_VERSION, len(fmt), len(names)) + fmt + names)
+        self._thread = threading.Thread(target=self._run, name="telemetry-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def attach(self, game):
+        bus = game.events
+        bus.subscribe(PelletEaten, lambda ev: self._flag(EV_PELLET if ev.kind == "pellet" else EV_ENERGIZER))
+        bus.subscribe(PowerupTaken, lambda ev: self._flag(EV_POWERUP))
+        bus.subscribe(GhostEaten, lambda ev: self._flag(EV_GHOST_EATEN))
+        bus.subscribe(LifeLost, lambda ev: self._flag(EV_LIFE_LOST))
+        bus.subscribe(LevelCleared, lambda ev: self._flag(EV_LEVEL_CLEARED))
+        bus.subscribe(BadgeUnlocked, lambda ev: self._flag(EV_BADGE))
+        bus.subscribe(TrapSpawned, self._on_trap_spawned)
+        bus.subscribe(TrapTriggered, self._on_trap_triggered)
+        return self
+
+    def _flag(self, bit):
+        self._events |= bit
+
+    def _on_trap_spawned(self, ev):
+        self._events |= EV_TRAP_SPAWN; self._spawns += 1
+
+    def _on_trap_triggered(self, ev):
+        self._events |= EV_TRAP_TRIGGER; self._triggers += 1
+
+    def record(self, game, dt):
+        head = self._head
+        self.tick += 1
+        if head - self._tail >= self.capacity:
+            self.dropped += 1
+        else:
+            p = game.player
+            chase = scatter = fright = frozen = eaten = 0
+            for g in game.ghosts:
+                st = g.state
+                if st == "chase": chase += 1
+                elif st == "scatter": scatter += 1
+                elif st == "frightened": fright += 1
+                elif st == "frozen": frozen += 1
+                else: eaten += 1
+            visible = 0
+            for t in game.traps:
+                if t['visible']: visible += 1
+            TELEMETRY_STRUCT.pack_into(self._buf, (head % self.capacity) * self.size,
+                self.tick, game.game_time, dt, p.score, game.level, max(-128, min(127, p.lives)),
+                p.tile[0], p.tile[1], min(255, len(game.traps)), min(255, visible), min(255, len(game.shadow_ghosts)),
+                chase, scatter, fright, frozen, eaten,
+                p.speed_boost_timer, p.invincible_timer, p.slow_timer, max(0.0, game.freeze_until - game.game_time),
+                min(255, self._spawns), min(255, self._triggers), self._events)
+            self._head = head + 1
+            if head + 1 - self._tail >= self.capacity // 2: self._wake.set()
+        self._events = 0; self._spawns = 0; self._triggers = 0
+
+    def _drain(self):
+        head = self._head; tail = self._tail
+        if head == tail: return
+        n = self.capacity; sz = self.size
+        a = tail % n; end = a + (head - tail)
+        if end <= n:
+            chunk = bytes(self._buf[a*sz:end*sz])
+        else:
+            chunk = bytes(self._buf[a*sz:]) + bytes(self._buf[:(end-n)*sz])
+        self._tail = head
+        self._file.write(chunk)
+
+    def _run(self):
+        while not self._stop:
+            self._wake.wait(self.flush_interval); self._wake.clear()
+            try:
+                self._drain(); self._file.flush()
+            except (OSError, ValueError) as e:
+                sys.stderr.write(f"pacman: telemetry write to {self.path} failed: {e}\n")
+                return
+
+    def close(self):
+        if self._stop: return
+        self._stop = True; self._wake.set()
+        self._thread.join(5.0)
+        try:
+            self._drain(); self._file.close()
+        except (OSError, ValueError):
+            pass
+
+def read_telemetry(path):
+    # yields one dict per record
+    with open(path, 'rb') as f:
+        if f.read(4) != TELEMETRY_MAGIC: raise ValueError(f"{path} is not a telemetry file")
+        version, flen, nlen = struct.unpack("<HHH", f.read(6))
+        rec = struct.Struct(f.read(flen).decode())
+        names = f.read(nlen).decode().split(",")
+        while True:
+            data = f.read(rec.size * 1024)
+            if not data: break
+            for vals in rec.iter_unpack(data[:len(data) - len(data) % rec.size]):
+                yield dict(zip(names, vals))
+
+# ---------- Frame capture ----------
+class FrameCapture:
+    """Records the displayed frames on a background thread.
+
+    grab() copies the window's pixels straight out of its buffer into one of `queue`
+    preallocated slots and returns. A writer thread turns slots into a Y4M stream (path ending
+    in .y4m, needs numpy) or a PNG sequence (any other path, used as a directory). When the
+    writer is a full queue behind, frames are dropped and counted rather than stalling the game.
+    Output frame k stands for time k/fps after the first grab: a period with no frame of its own,
+    dropped or never rendered, repeats the last written frame, so the recording keeps real time.
+    """
+    def __init__(self, path, surface, fps=CAPTURE_FPS, queue=CAPTURE_QUEUE):
+        self.path = path; self.fps = fps; self.capacity = queue
+        self.width, self.height = surface.get_size()
+        self.pitch = surface.get_pitch(); self.bytesize = surface.get_bytesize()
+        self.bitsize = surface.get_bitsize(); self.masks = surface.get_masks()
+        if self.bytesize != 4: raise ValueError("frame capture needs a 32-bit display surface")
+        self.frame_bytes = self.pitch * self.height
+        self._slots = [bytearray(self.frame_bytes) for _ in range(queue)]
+        self._gaps = [0] * queue   # output periods to fill with the previous frame before each slot
+        self._head = 0; self._tail = 0   # frames grabbed / written; only the game thread moves _head
+        self.dropped = 0; self.repeated = 0; self.written = 0; self.last_error = None
+        self._t0 = None; self._periods = 0; self._drop_mark = 0   # output periods claimed so far
+        self._last = None   # the last written frame, encoded, for repeats
+        self._wake = threading.Event(); self._stop = False
+        if path.lower().endswith(".y4m"):
+            try:
+                import numpy
+            except ImportError:
+                raise RuntimeError("Y4M capture needs numpy; give a directory to record PNG frames instead")
+            self._np = numpy
+            # 4:2:0 needs even dimensions; an odd last row/column is cropped
+            self.out_w = self.width & ~1; self.out_h = self.height & ~1
+            self._file = open(path, 'wb')
+            self._file.write(f"YUV4MPEG2 W{self.out_w} H{self.out_h} F{fps}:1 Ip A1:1 C420jpeg\n".encode())
+            self._write = self._write_y4m
+        else:
+            os.makedirs(path, exist_ok=True)
+            self._file = None
+            self._png = pygame.Surface((self.width, self.height), 0, self.bitsize, self.masks)
+            self._write = self._write_png
+        self._thread = threading.Thread(target=self._run, name="frame-capture", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def channel(self, i):
+        # byte offset of colour channel i (0=R, 1=G, 2=B) inside a pixel
+        shift = (self.masks[i] & -self.masks[i]).bit_length() - 1
+        return shift // 8 if sys.byteorder == "little" else self.bytesize - 1 - shift // 8
+
+    def grab(self, surface):
+        # call right after display.flip(); frames beyond `fps` per second are skipped
+        now = time.perf_counter()
+        if self._t0 is None: self._t0 = now
+        due = int((now - self._t0) * self.fps) + 1   # output periods up to and including this one
+        if due <= self._periods: return
+        head = self._head
+        if head - self._tail >= self.capacity:
+            # count each period whose frame was lost once, however many renders fall inside it
+            if due > self._drop_mark: self.dropped += 1; self._drop_mark = due
+            return
+        if self._drop_mark == due: self.dropped -= 1   # a later render in the same period got through
+        slot = head % self.capacity
+        memoryview(self._slots[slot])[:] = surface.get_buffer()
+        self._gaps[slot] = due - self._periods - 1; self._periods = due
+        self._head = head + 1
+        self._wake.set()
+
+    def _write_y4m(self, buf):
+        np = self._np; w, h = self.out_w, self.out_h
+        px = np.frombuffer(buf, np.uint8).reshape(self.height, self.pitch)[:h, :w*4].reshape(h, w, 4)
+        r, g, b = (px[..., self.channel(i)].astype(np.int32) for i in range(3))
+        y = (77*r + 150*g + 29*b) >> 8
+        # chroma from 2x2 averages (full-range BT.601)
+        r, g, b = ((c[0::2, 0::2] + c[1::2, 0::2] + c[0::2, 1::2] + c[1::2, 1::2]) >> 2 for c in (r, g, b))
+        u = ((-43*r - 85*g + 128*b) >> 8) + 128
+        v = ((128*r - 107*g - 21*b) >> 8) + 128
+        self._last = b"".join((b"FRAME\n", y.astype(np.uint8).tobytes(),
+                               np.clip(u, 0, 255).astype(np.uint8).tobytes(), np.clip(v, 0, 255).astype(np.uint8).tobytes()))
+        self._repeat()
+
+    def _repeat(self):
+        # write the last frame (again)
+        if self._file is not None: self._file.write(self._last); return
+        with open(os.path.join(self.path, f"frame_{self.written:06d}.png"), 'wb') as f: f.write(self._last)
+
+    def _write_png(self, buf):
+        # pygame.image.save compresses with the GIL held and starves the game thread; here only the
+        # channel reorder and the row join hold it, and zlib does the compression without it
+        self._png.get_buffer().write(bytes(buf))
+        rgb = pygame.image.tobytes(self._png, "RGB")
+        stride = self.width * 3
+        raw = b"".join(b"\0" + rgb[i:i + stride] for i in range(0, len(rgb), stride))   # filter byte 0 per row
+        data = zlib.compress(raw, CAPTURE_PNG_LEVEL)
+        png = [b"\x89PNG\r\n\x1a\n"]
+        for tag, body in ((b"IHDR", struct.pack(">IIBBBBB", self.width, self.height, 8, 2, 0, 0, 0)),
+                          (b"IDAT", data), (b"IEND", b"")):
+            png += (struct.pack(">I", len(body)) + tag, body, struct.pack(">I", zlib.crc32(body, zlib.crc32(tag))))
+        self._last = b"".join(png)
+        self._repeat()
+
+    def _drain(self):
+        while self._tail < self._head:
+            slot = self._tail % self.capacity
+            for _ in range(self._gaps[slot] if self._last is not None else 0):
+                self._repeat(); self.written += 1; self.repeated += 1
+            self._write(self._slots[slot])
+            self._tail += 1; self.written += 1
+
+    def _run(self):
+        while not self._stop:
+            self._wake.wait(0.5); self._wake.clear()
+            try:
+                self._drain()
+            except (OSError, ValueError, pygame.error) as e:
+                self.last_error = e
+                sys.stderr.write(f"pacman: frame capture to {self.path} failed: {e}\n")
+                self.capacity = 0   # every further frame counts as dropped
+                return
+
+    def close(self):
+        if self._stop: return
+        self._stop = True; self._wake.set()
+        self._thread.join(10.0)
+        try:
+            if self.last_error is None: self._drain()
+            if self._file is not None: self._file.close()
+        except (OSError, ValueError, pygame.error):
+            pass
+
+# ---------- Profiling ----------
+class PerfCapture:
+    """On-demand cProfile + tracemalloc capture of a few frames of Game.run.
+
+    arm() asks for the next `frames` frames. While capturing, the profiler runs only between
+    frame_start() and frame_end() (so the frame pacing wait isn't in it), and every frame ends
+    with an allocation snapshot compared against the previous one: the per-frame counter counts
+    the blocks each call site allocated during the frame that were still alive at its end.
+    Short-lived temporaries cancel out of that comparison, so each frame also records how far
+    traced memory peaked above its level at frame_start: the churn the counter can't see.
+    The .pstats call counts show which calls make those temporaries.
+    When the last frame is done a background thread writes <dir>/pacman-<time>.pstats, the
+    final tracemalloc snapshot (.tracemalloc) and a text report (-alloc.txt).
+    """
+    def __init__(self, out_dir=".", frames=PERF_FRAMES, depth=PERF_TRACE_DEPTH, top=PERF_TOP_SITES):
+        self.out_dir = out_dir; self.frame_count = frames; self.depth = depth; self.top = top
+        self.pending = 0; self.active = False
+        self.written = []; self.last_error = None; self._writer = None
+        atexit.register(self.close)
+
+    def arm(self, frames=None):
+        # ignored while a capture is already running
+        if not self.active: self.pending = max(1, frames or self.frame_count)
+
+    def _start(self):
+        self.frames_left = self.pending; self.pending = 0; self.active = True
+        self.started = time.localtime(); self.frames = []; self.sites = {}
+        self._was_tracing = tracemalloc.is_tracing()
+        if not self._was_tracing: tracemalloc.start(self.depth)
+        self._filters = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, "<frozen *>")]
+        # frame_start / frame_end themselves (timestamps, locals) aren't the game's allocations
+        self._own = range(PerfCapture.frame_start.__code__.co_firstlineno, PerfCapture._finish.__code__.co_firstlineno)
+        self._profile = cProfile.Profile()
+
+    def frame_start(self):
+        if self.pending and not self.active: self._start()
+        if self.active:
+            # the baseline is taken here, not reused from the last frame_end, so the counter's own
+            # bookkeeping between frames never shows up as the game's allocations
+            self._snap = tracemalloc.take_snapshot().filter_traces(self._filters)
+            tracemalloc.reset_peak(); self._mem0 = tracemalloc.get_traced_memory()[0]
+            self._t0 = time.perf_counter(); self._profile.enable()
+
+    def frame_end(self):
+        if not self.active: return
+        self._profile.disable()
+        work = time.perf_counter() - self._t0
+        peak = tracemalloc.get_traced_memory()[1] - self._mem0   # before the snapshot adds its own
+        snap = tracemalloc.take_snapshot().filter_traces(self._filters)
+        blocks = size = 0; top = None
+        for st in snap.compare_to(self._snap, 'lineno'):
+            if st.count_diff <= 0: continue
+            f = st.traceback[0]; key = (f.filename, f.lineno)
+            if f.lineno in self._own and f.filename == __file__: continue
+            n, b = self.sites.get(key, (0, 0)); self.sites[key] = (n + st.count_diff, b + max(0, st.size_diff))
+            blocks += st.count_diff; size += max(0, st.size_diff)
+            if top is None or st.count_diff > top[1]: top = (key, st.count_diff)
+        self.frames.append((work, blocks, size, peak, top))
+        self._snap = snap   # the final one is what gets dumped
+        self.frames_left -= 1
+        if self.frames_left <= 0: self._finish()
+
+    def _finish(self):
+        self.active = False
+        if not self._was_tracing: tracemalloc.stop()
+        base = os.path.join(self.out_dir, "pacman-" + time.strftime("%Y%m%d-%H%M%S", self.started))
+        args = (base, self._profile, self._snap, self.frames, self.sites)
+        self._profile = self._snap = None
+        self._writer = threading.Thread(target=self._write, args=args, name="perf-writer", daemon=True)
+        self._writer.start()
+
+    def _write(self, base, profile, snap, frames, sites):
+        try:
+            os.makedirs(self.out_dir, exist_ok=True)
+            profile.dump_stats(base + ".pstats")
+            snap.dump(base + ".tracemalloc")
+            with open(base + "-alloc.txt", 'w') as f:
+                n = len(frames)
+                f.write(f"{n} frames, {sum(w for w,*_ in frames) / n * 1e3:.2f} ms work per frame, "
+                        f"{sum(b for _,b,*_ in frames) / n:.0f} blocks allocated and kept per frame, "
+                        f"{sum(p for *_,p,_ in frames) / n / 1024:.1f} KiB average peak (max "
+                        f"{max(p for *_,p,_ in frames) / 1024:.1f})\n\n")
+                f.write("allocation sites (blocks per frame, KiB per frame)\n")
+                for (path, line), (count, size) in sorted(sites.items(), key=lambda kv: -kv[1][0])[:self.top]:
+                    src = linecache.getline(path, line).strip()
+                    f.write(f"  {count / n:9.1f} {size / n / 1024:9.1f}  {os.path.basename(path)}:{line}  {src}\n")
+                f.write("\nper frame (ms, blocks kept, KiB kept, KiB peak above frame start, busiest site)\n")
+                for i,(work, blocks, size, peak, top) in enumerate(frames):
+                    where = f"{os.path.basename(top[0][0])}:{top[0][1]} ({top[1]})" if top else "-"
+                    f.write(f"  {i:5} {work * 1e3:8.2f} {blocks:7} {size / 1024:9.1f} {peak / 1024:9.1f}  {where}\n")
+            self.written.append(base)
+            sys.stderr.write(f"pacman: profile of {len(frames)} frames written to {base}.pstats / .tracemalloc / -alloc.txt\n")
+        except OSError as e:
+            self.last_error = e
+            sys.stderr.write(f"pacman: could not write profile {base}: {e}\n")
+
+    def close(self):
+        if self.active: self._finish()
+        if self._writer is not None: self._writer.join(10.0)
+
+# ---------- Profiles / score store ----------
+class StoreRecorder:
+    """Feeds a pacman_store.Store from the event bus: badge unlocks as they happen, and one
+    run with its per-level stats when the game ends. The store only queues; nothing here
+    touches the disk."""
+    def __init__(self, store, profile_id):
+        self.store = store; self.profile_id = profile_id
+
+    def attach(self, game):
+        self.game = game
+        bus = game.events
+        bus.subscribe(BadgeUnlocked, self._on_badge)
+        bus.subscribe(LifeLost, lambda ev: self._count('lost'))
+        bus.subscribe(GhostEaten, lambda ev: self._count('eaten'))
+        bus.subscribe(TrapTriggered, lambda ev: self._count('traps'))
+        bus.subscribe(LevelCleared, self._on_level_cleared)
+        bus.subscribe(GameOver, self._on_game_over)
+        self._new_run()
+        return self
+
+    def _new_run(self):
+        self.run_start = self.level_start = self.game.game_time
+        self.levels = []; self.counts = {'lost': 0, 'eaten': 0, 'traps': 0}
+
+    def _count(self, key):
+        self.counts[key] += 1
+
+    def _on_badge(self, ev):
+        if ev.first_time: self.store.unlock_badge(self.profile_id, ev.name)
+
+    def _on_level_cleared(self, ev):
+        now = self.game.game_time; c = self.counts
+        self.levels.append((ev.level, ev.score, now - self.level_start, c['lost'], c['eaten'], c['traps']))
+        self.level_start = now; self.counts = {'lost': 0, 'eaten': 0, 'traps': 0}
+
+    def _on_game_over(self, ev):
+        now = self.game.game_time; c = self.counts
+        duration = now - self.run_start; ended = time.time()
+        # the level the run ended on gets its row too (its level equals the run's level)
+        levels = self.levels + [(ev.level, ev.score, now - self.level_start, c['lost'], c['eaten'], c['traps'])]
+        self.store.record_run(self.profile_id, self.game.played_difficulty(), ended - duration, ended,
+                              duration, ev.score, ev.level, levels)
+        self._new_run()
+
+# ---------- Replays ----------
+def replay_checkpoint(game, tick):
+    # compact state a replay is checked against; JSON-ready
+    p = game.player
+    return {'tick': tick, 'time': game.game_time, 'level': game.level, 'score': p.score, 'lives': p.lives,
+            'player': [p.fx, p.fy], 'ghosts': [[g.fx, g.fy, g.state] for g in game.ghosts],
+            'pellets': game.pellets_left, 'traps': len(game.traps)}
+
+class ReplayRecorder:
+    """Records every run into a pacman_replay.Corpus.
+
+    A run starts at a hard reset of init_game, which reseeds `random` with a fresh seed; from
+    then on record() logs each tick's frame time and input before update() runs, with a
+    checkpoint every `checkpoint` ticks. The session is appended when the game ends (just
+    before the game-over screen) or on exit, never during play.
+    """
+    def __init__(self, corpus, checkpoint=REPLAY_CHECKPOINT):
+        self.corpus = corpus; self.checkpoint = checkpoint
+        self.active = False; self.last_error = None
+
+    def attach(self, game):
+        self.game = game; game.replay = self
+        bus = game.events
+        bus.subscribe(LifeLost, self._on_life_lost)
+        bus.subscribe(TrapTriggered, self._on_trap)
+        bus.subscribe(GameOver, lambda ev: self.finish(game_over=True))
+        atexit.register(self.close)
+        return self
+
+    def start(self, game):
+        if self.active: self.finish()
+        self.seed = random.getrandbits(63); random.seed(self.seed)
+        self.started = time.time(); self.t0 = game.game_time; self.start_level = game.level
+        self.dts = array('d'); self.inputs = bytearray(); self.checkpoints = []
+        self.lives_lost = 0; self.traps = 0; self.trap_deaths = 0; self.trap_death = False
+        self.last_trap = -math.inf; self.low_latency = game.input_buffer is not None
+        self.active = True
+
+    def record(self, game, dt):
+        if not self.active: return
+        n = len(self.dts)
+        if n % self.checkpoint == 0: self.checkpoints.append(replay_checkpoint(game, n))
+        # the queued turn as move_step will see it: request() drops one that has expired by now
+        buf = game.input_buffer
+        self.dts.append(dt)
+        self.inputs.append(pacman_replay.input_code(game.player.desired_direction,
+                                                    buf.request(time.perf_counter()) if buf is not None else None))
+
+    def _on_life_lost(self, ev):
+        if not self.active: return
+        self.lives_lost += 1
+        if self.game.game_time - self.last_trap <= REPLAY_TRAP_BLAME:
+            self.trap_deaths += 1
+            if ev.lives <= 0: self.trap_death = True
+
+    def _on_trap(self, ev):
+        self.traps += 1; self.last_trap = self.game.game_time
+
+    def finish(self, game_over=False):
+        if not self.active: return
+        self.active = False
+        if not self.dts: return
+        g = self.game
+        try:
+            self.corpus.append(self.seed, g.difficulty, self.started, g.game_time - self.t0, g.level, g.player.score,
+                               lives_lost=self.lives_lost, traps=self.traps, trap_deaths=self.trap_deaths,
+                               badges=sorted(g.earned_current_run), game_over=game_over, trap_death=self.trap_death,
+                               low_latency=self.low_latency, start_level=self.start_level, tile=g.TILE, t0=self.t0,
+                               dts=self.dts, inputs=self.inputs, checkpoints=self.checkpoints)
+        except (OSError, ValueError) as e:
+            self.last_error = e
+            sys.stderr.write(f"pacman: could not save replay to {self.corpus.path}: {e}\n")
+
+    def close(self):
+        self.finish(); self.corpus.close()
+
+def replay_ticks(game, replay):
+    """Re-runs a recorded session on `game` (same maze and window size), yielding the tick number
+    before each update so the caller can draw or inspect the state in between. Runs inside
+    game.simulation(): nothing is recorded and game over doesn't block."""
+    if replay.tile and replay.tile != game.TILE:
+        raise ValueError(f"replay was recorded with {replay.tile}px tiles, this game uses {game.TILE}px")
+    with game.simulation():
+        random.seed(replay.session.seed)
+        game.difficulty = replay.session.difficulty; game.level = replay.start_level; game.game_time = replay.t0
+        game.init_game(hard_reset=True)
+        # low-latency sessions replay the queued turn as it stood at the start of each tick
+        buf = game.input_buffer = InputBuffer() if replay.session.low_latency else None
+        if buf is not None: buf.expires = math.inf
+        for tick, (dt, code) in enumerate(zip(replay.dts, replay.inputs)):
+            yield tick
+            want, pending = pacman_replay.decode_input(code)
+            game.player.desired_direction = want
+            if buf is not None: buf.pending = pending
+            game.update(dt)
+
+def verify_replay(game, replay):
+    # None when every checkpoint matches, else (tick, recorded, replayed) for the first that doesn't
+    marks = {cp['tick']: cp for cp in replay.checkpoints}
+    for tick in replay_ticks(game, replay):
+        want = marks.get(tick)
+        if want is not None:
+            got = json.loads(json.dumps(replay_checkpoint(game, tick)))
+            if got != want: return tick, want, got
+    return None
+
 # ---------- Game Core ----------
 class Game:
     def __init__(self, screen_w=SCREEN_W, screen_h=SCREEN_H):
@@ -146,50 +1140,103 @@ class Game:
         self.MAZE_H = self.TILE * MAZE_ROWS
         self.MAZE_X = (self.screen_w - self.MAZE_W)//2
         self.MAZE_Y = self.TOP_BAR
+        self._centres = {}
+        self.centre_x, self.centre_y = self.centre_tables(self.MAZE_X, self.MAZE_Y, self.TILE)
 
-        # fonts
-        preferred = ["Orbitron","Bahnschrift","Segoe UI","Fira Code","Consolas","Arial"]
-        chosen = None
-        for p in preferred:
-            f = pygame.font.match_font(p)
-            if f: chosen = f; break
-        base = self.screen_w
-        self.font_large = pygame.font.Font(chosen, max(28, base//28)) if chosen else pygame.font.SysFont("Arial", max(28, base//28))
-        self.font_big = pygame.font.Font(chosen, max(18, base//44)) if chosen else pygame.font.SysFont("Arial", max(18, base//44))
-        self.font_main = pygame.font.Font(chosen, max(14, base//60)) if chosen else pygame.font.SysFont("Arial", max(14, base//60))
-        self.font_small = pygame.font.Font(chosen, max(12, base//80)) if chosen else pygame.font.SysFont("Arial", max(12, base//80))
+        # fonts (resolved path cached on disk; None falls back to pygame's default font)
+        chosen, sizes = resolve_font(PREFERRED_FONTS, self.screen_w)
+        self.font_path = chosen; self.font_px = sizes
+        self.font_large = pygame.font.Font(chosen, sizes['large'])
+        self.font_big = pygame.font.Font(chosen, sizes['big'])
+        self.font_main = pygame.font.Font(chosen, sizes['main'])
+        self.font_small = pygame.font.Font(chosen, sizes['small'])
 
         # state
-        self.map = [list(r) for r in ORIGINAL_MAP]
+        self.template = level_template(ORIGINAL_MAP); self.map = self.template.grid
         self.pellets = set(); self.energizers = set(); self.powerups_on_map = {}
         self.player = None; self.ghosts = []
         self.level = 1; self.difficulty = None; self.total_pellets = 0
+        self.pellets_left = 0; self.game_time = 0.0; self.freeze_until = 0.0
+        self.timers = Timers()   # expiry of traps, hints, shadow ghosts and ghost timers
+        self.events = EventBus()
+        self.telemetry = None; self.autopilot = None
+        self.store = None; self.profile_id = None
+        self.input_buffer = None; self.capture = None; self.replay = None; self.perf = None
+        self.decisions = None; self._dist_key = None; self._dist_field = None
+        self.modes = None; self.mode_epoch = 0.0
 
         # achievements
         self.achievements_unlocked = set()
         self.achievement_msg = None; self.achievement_timer = 0.0; self.achievement_popup_total=3.0; self.achievement_popup_elapsed=0.0
         self.badge_pulse = {}
         self.badge_particles = []
+        self._next_badge = 0  # index into ACHIEVEMENTS of the next threshold to watch for
+        for ev_type in (PelletEaten, PowerupTaken, GhostEaten):
+            self.events.subscribe(ev_type, self.on_score_event)
+        self.events.subscribe(PowerupTaken, self.on_powerup_taken)
 
         # traps system (strategic)
-        # traps: list of dicts {'tile': (x,y), 'timer': float, 'visible': bool, 'triggered': bool, 'blocked_timer': float}
+        # traps: list of dicts {'tile': (x,y), 'expires': game time, 'visible': bool, 'triggered': bool, 'blocked': bool}
         self.traps = []
         self.trap_spawn_cooldown = 0.0
-        self.shadow_ghosts = []  # list of dicts {'tile':(x,y), 'timer':float}
+        self.shadow_ghosts = []  # list of dicts {'tile':(x,y), 'expires': game time}
         self.trap_hints = []     # visual hint particles
 
         # menu visuals
         self.title_phase = 0.0
         self.glints = [{'x': random.random(), 'y': random.random(), 'speed': random.uniform(0.06,0.16), 'phase': random.random()*2*math.pi} for _ in range(6)]
-
-        # load badges
+        self._gradient = {}
+        self._button_cache = {}
+        self._orbit_dots = {}
+        self._fx_frames = {}
+
+        # render scale: gameplay can be drawn into a smaller framebuffer and upscaled once per frame
+        self.render_scale = 1.0; self.scaler = None; self.hud_native = True
+        self.quality = QUALITY_TIERS[0]; self.governor = None
+        self._framebuffer = None; self._view = None; self._scaled_fonts = {}
+
+        # load badges; saves go through a background writer so unlocks never hit the disk mid-frame
+        self.badge_writer = BadgeWriter(BADGE_SAVE_FILE)
         self.load_badges()
         self.init_game(hard_reset=True)
 
+    def centre_tables(self, maze_x, maze_y, tile):
+        # pixel centre of every column and row for one layout, built once per layout
+        key = (maze_x, maze_y, tile, MAZE_COLS, MAZE_ROWS)
+        tables = self._centres.get(key)
+        if tables is None:
+            half = tile//2
+            tables = self._centres[key] = ([maze_x + x*tile + half for x in range(MAZE_COLS)],
+                                           [maze_y + y*tile + half for y in range(MAZE_ROWS)])
+        return tables
+
     def tile_to_pixel_center(self, tx, ty):
-        px = self.MAZE_X + tx*self.TILE + self.TILE//2
-        py = self.MAZE_Y + ty*self.TILE + self.TILE//2
-        return px, py
+        return self.centre_x[tx], self.centre_y[ty]
+
+    def sub_to_pixel(self, fx, fy):
+        # fixed-point entity position (tile * SUBTILE at a tile centre) -> pixel position
+        T = self.TILE
+        return self.centre_x[0] + fx*T//SUBTILE, self.centre_y[0] + fy*T//SUBTILE
+
+    def speed_units(self, px):
+        # per-frame speed in pixels -> fixed-point units per frame
+        return max(1, round(px * SUBTILE / self.TILE))
+
+    def blocked_tiles(self):
+        # tiles a triggered trap is currently blocking (treated as walls)
+        return {t['tile'] for t in self.traps if t.get('blocked')}
+
+    def distance_to(self, target):
+        # dist(flat tile) -> path length to target (-1 = unreachable), shared by every ghost heading
+        # for the same tile. Runs on the junction graph; while a trap blocks a tile (or the target
+        # is inside a wall) it falls back to a grid BFS that respects the block.
+        blocked = frozenset(y*MAZE_COLS + x for x,y in self.blocked_tiles())
+        key = (target, blocked, self.decisions)
+        if self._dist_key != key:
+            dist = None if blocked else self.decisions.graph.query(target)
+            if dist is None: dist = self.decisions.distances(target, blocked).__getitem__
+            self._dist_key = key; self._dist_field = dist
+        return self._dist_field
 
     def in_bounds(self, tx, ty):
         return 0 <= tx < MAZE_COLS and 0 <= ty < MAZE_ROWS
@@ -198,93 +1245,116 @@ class Game:
         # a trap may temporarily block a tile; treat it as wall while blocked
         if not self.in_bounds(tx,ty): return True
         for trap in self.traps:
-            if trap.get('triggered') and trap.get('blocked_timer', 0) > 0 and trap['tile'] == (tx,ty):
+            if trap.get('blocked') and trap['tile'] == (tx,ty):
                 return True
         return self.map[ty][tx] == '#'
 
     # persistence for badges
     def load_badges(self):
         try:
-            import os
-            if os.path.exists(BADGE_SAVE_FILE):
-                with open(BADGE_SAVE_FILE, 'r') as f:
+            if os.path.exists(self.badge_writer.path):
+                with open(self.badge_writer.path, 'r') as f:
                     data = json.load(f)
                 if isinstance(data, list): self.achievements_unlocked = set(data)
-        except:
+        except (OSError, ValueError):
             self.achievements_unlocked = set()
 
     def save_badges(self):
-        try:
-            with open(BADGE_SAVE_FILE, 'w') as f:
-                json.dump(list(self.achievements_unlocked), f)
-        except: pass
+        # with a profile store the unlock is recorded from the BadgeUnlocked event instead
+        if self.store is None: self.badge_writer.submit(self.achievements_unlocked)
+
+    def played_difficulty(self):
+        # the difficulty whose rules init_game applies; what stores and leaderboards should record
+        return self.difficulty or DEFAULT_DIFFICULTY
 
     def init_game(self, hard_reset=False):
-        self.map = [list(r) for r in ORIGINAL_MAP]
+        # a hard reset starts a new run; with replays on, that is where the seed is chosen
+        if hard_reset and self.replay is not None: self.replay.start(self)
+        # layout data comes from the shared template; only the pellet layers are copied
+        tmpl = self.template = level_template(ORIGINAL_MAP)
+        self.map = tmpl.grid; self.decisions = tmpl.decisions
         self.pellets.clear(); self.energizers.clear(); self.powerups_on_map.clear()
-        self.traps.clear(); self.shadow_ghosts.clear(); self.trap_hints.clear()
-        player_tile = None; ghost_pos=[]
-        for y in range(MAZE_ROWS):
-            for x in range(MAZE_COLS):
-                c = self.map[y][x]
-                if c == '.': self.pellets.add((x,y))
-                elif c == 'o': self.energizers.add((x,y))
-                elif c == 'P':
-                    player_tile = (x,y); self.map[y][x] = ' '
-                elif c == 'G':
-                    ghost_pos.append((x,y)); self.map[y][x] = ' '
-        if not player_tile: player_tile = (MAZE_COLS//2, MAZE_ROWS-3)
+        self.traps.clear(); self.shadow_ghosts.clear(); self.trap_hints.clear(); self.timers.clear()
+        self.pellets.update(tmpl.pellets); self.energizers.update(tmpl.energizers)
+        player_tile = tmpl.player_spawn; ghost_pos = tmpl.ghost_spawns
         if hard_reset or (self.player is None):
             self.player = Player(player_tile, self)
         else:
-            self.player.tile = player_tile; self.player.target_tile = player_tile
-            self.player.pos = pygame.math.Vector2(self.tile_to_pixel_center(*player_tile))
+            self.player.place(player_tile)
             self.player.direction = (1,0); self.player.desired_direction = (0,0)
 
         self.ghosts.clear()
-        base_count = 2 if self.difficulty == "Easy" else 3 if self.difficulty == "Moderate" else 4
+        difficulty = self.played_difficulty()
+        base_count = 2 if difficulty == "Easy" else 3 if difficulty == "Moderate" else 4
         ghost_count = min(4, base_count + (self.level-1)//2)
         for i in range(ghost_count):
             pos = ghost_pos[i] if i < len(ghost_pos) else (MAZE_COLS//2, MAZE_ROWS//2)
             g = Ghost(pos, GHOST_COLORS[i % len(GHOST_COLORS)], self)
-            if self.difficulty == "Easy": g.base_speed = max(1.4, self.TILE * 0.05)
-            elif self.difficulty == "Moderate": g.base_speed = max(1.8, self.TILE * 0.065)
-            else: g.base_speed = max(2.2, self.TILE * 0.078)
+            if difficulty == "Easy": g.base_speed = self.speed_units(max(1.4, self.TILE * 0.05))
+            elif difficulty == "Moderate": g.base_speed = self.speed_units(max(1.8, self.TILE * 0.065))
+            else: g.base_speed = self.speed_units(max(2.2, self.TILE * 0.078))
             g.speed = g.base_speed
             self.ghosts.append(g)
+        self.modes = GhostModes(self.level, difficulty, ghost_count); self.mode_epoch = self.game_time
 
         self.total_pellets = len(self.pellets) + len(self.energizers)
         if self.level == 1:
-            special=[]
-            for y in range(2, MAZE_ROWS-2):
-                for x in range(2, MAZE_COLS-2):
-                    if (x,y) in self.pellets and random.random() < 0.02: special.append((x,y))
+            special = [t for t in tmpl.powerup_slots if random.random() < 0.02]
             types=['speed','freeze','invincible']
             for i,pos in enumerate(special):
                 if pos in self.pellets: self.pellets.remove(pos)
                 self.powerups_on_map[pos] = types[i % len(types)]
 
+        self.pellets_left = len(self.pellets) + len(self.energizers)
+        self.freeze_until = self.game_time
+
         self.achievement_msg = None; self.achievement_timer = 0.0; self.achievement_popup_elapsed = 0.0
-        self.earned_current_run = set()
+        self.earned_current_run = set(); self._next_badge = 0
         self.trap_spawn_cooldown = 6.0  # start cooldown before first trap
 
     # ---------- UI drawing ----------
+    def gradient_surface(self):
+        # the background never changes, so draw its scanlines once and blit the result
+        size = (self.screen_w, self.screen_h)
+        grad = self._gradient.get(size)
+        if grad is None:
+            grad = pygame.Surface(size)
+            for i in range(self.screen_h):
+                t = i / self.screen_h
+                r = int(DEEP_BG_A[0]*(1-t) + DEEP_BG_B[0]*t)
+                g = int(DEEP_BG_A[1]*(1-t) + DEEP_BG_B[1]*t)
+                b = int(DEEP_BG_A[2]*(1-t) + DEEP_BG_B[2]*t)
+                pygame.draw.line(grad, (r,g,b), (0,i), (self.screen_w,i))
+            grad = self._gradient[size] = grad.convert()
+        return grad
+
     def draw_gradient_bg(self, surf):
-        for i in range(self.screen_h):
-            t = i / self.screen_h
-            r = int(DEEP_BG_A[0]*(1-t) + DEEP_BG_B[0]*t)
-            g = int(DEEP_BG_A[1]*(1-t) + DEEP_BG_B[1]*t)
-            b = int(DEEP_BG_A[2]*(1-t) + DEEP_BG_B[2]*t)
-            pygame.draw.line(surf, (r,g,b), (0,i), (self.screen_w,i))
+        surf.blit(self.gradient_surface(), (0,0))
+
+    def button_surface(self, size, text, active=False):
+        key = (size, text, active)
+        btn = self._button_cache.get(key)
+        if btn is None:
+            w,h = size
+            btn = pygame.Surface((w,h), pygame.SRCALPHA)
+            rect = pygame.Rect(0, 0, w, h)
+            base = (18,18,26)
+            pygame.draw.rect(btn, base, rect, border_radius=max(6, h//6))
+            accent_col = ACCENT if active else MUTED_DARK
+            border_w = 3 if active else 1
+            pygame.draw.rect(btn, accent_col, rect, border_w, border_radius=max(6, h//6))
+            txt = self.font_big.render(text, True, WHITE if active else MUTED)
+            btn.blit(txt, ((w - txt.get_width())//2, (h - txt.get_height())//2))
+            self._button_cache[key] = btn
+        return btn
 
     def draw_button(self, surf, rect, text, active=False):
-        base = (18,18,26)
-        pygame.draw.rect(surf, base, rect, border_radius=max(6, rect.height//6))
-        accent_col = ACCENT if active else MUTED_DARK
-        border_w = 3 if active else 1
-        pygame.draw.rect(surf, accent_col, rect, border_w, border_radius=max(6, rect.height//6))
-        txt = self.font_big.render(text, True, WHITE if active else MUTED)
-        surf.blit(txt, (rect.x + (rect.width - txt.get_width())//2, rect.y + (rect.height - txt.get_height())//2))
+        surf.blit(self.button_surface(rect.size, text, active), rect.topleft)
+
+    def menu_clock(self, last_input):
+        # full rate right after input, then fall back to MENU_IDLE_FPS so an idle menu costs next to nothing
+        idle = time.monotonic() - last_input > MENU_IDLE_DELAY
+        return self.clock.tick(MENU_IDLE_FPS if idle else FPS) / 1000.0
 
     def show_start_menu(self):
         options = ["Start Game", "Difficulty", "Story & Controls", "Quit"]
@@ -294,11 +1364,16 @@ class Game:
         btn_w = int(self.screen_w * 0.46); btn_h = max(44, int(self.screen_h * 0.08))
         btn_x = (self.screen_w - btn_w)//2
         btn_start_y = card_y + card_h + int(self.screen_h * 0.04)
-        emblem_center_rel = (64, int(card_h*0.18))
+        rects = [pygame.Rect(btn_x, btn_start_y + i*(btn_h + int(self.screen_h*0.02)), btn_w, btn_h) for i in range(len(options))]
+        emblem_center_rel = (64, int(card_h*0.18)); emblem_size = int(card_h * 0.22)
+        emblem_center = (card_x + emblem_center_rel[0], card_y + emblem_center_rel[1])
+        footer_y = btn_start_y + len(options)*(btn_h + int(self.screen_h*0.02)) + 8
+        page = self.render_start_page((card_x, card_y, card_w, card_h), emblem_center_rel, emblem_size, footer_y)
         self.title_phase = 0.0
+        last_input = time.monotonic()
 
         while True:
-            dt = self.clock.tick(FPS) / 1000.0
+            dt = self.menu_clock(last_input)
             self.title_phase += dt * 1.8
             for g in self.glints:
                 g['x'] += dt * g['speed']; g['phase'] += dt * 2.2
@@ -306,6 +1381,7 @@ class Game:
 
             for ev in pygame.event.get():
                 if ev.type == pygame.QUIT: pygame.quit(); sys.exit()
+                if ev.type in (pygame.KEYDOWN, pygame.MOUSEMOTION, pygame.MOUSEBUTTONDOWN): last_input = time.monotonic()
                 if ev.type == pygame.KEYDOWN:
                     if ev.key == pygame.K_DOWN: sel = (sel + 1) % len(options)
                     if ev.key == pygame.K_UP: sel = (sel - 1) % len(options)
@@ -318,8 +1394,7 @@ class Game:
                         if choice == "Quit": pygame.quit(); sys.exit()
                 if ev.type == pygame.MOUSEBUTTONDOWN and ev.button == 1:
                     mp = ev.pos
-                    for i,opt in enumerate(options):
-                        r = pygame.Rect(btn_x, btn_start_y + i*(btn_h + int(self.screen_h*0.02)), btn_w, btn_h)
+                    for i,r in enumerate(rects):
                         if r.collidepoint(mp):
                             choice = options[i]
                             if choice == "Start Game": return True
@@ -328,47 +1403,73 @@ class Game:
                             if choice == "Story & Controls": self.show_story_controls()
                             if choice == "Quit": pygame.quit(); sys.exit()
 
-            # render
-            self.draw_gradient_bg(self.screen)
-            shadow = pygame.Surface((card_w+16, card_h+16), pygame.SRCALPHA)
-            pygame.draw.rect(shadow, (0,0,0,140), (0,0,card_w+16,card_h+16), border_radius=20)
-            self.screen.blit(shadow, (card_x-8, card_y-8))
-            panel = pygame.Surface((card_w,card_h), pygame.SRCALPHA)
-            pygame.draw.rect(panel, (12,12,20,240), (0,0,card_w,card_h), border_radius=16)
-            pygame.draw.rect(panel, ACCENT, (20,18,8,card_h-36), border_radius=6)
-
-            title_x = emblem_center_rel[0] + 68
-            title = self.font_large.render("PAC-MAN: REMIX", True, ACCENT)
-            panel.blit(title, (title_x, 18))
-            suby = 18 + title.get_height() + 8
-            subtitle = self.font_main.render("A futuristic remix — neon, power-ups & badges", True, MUTED)
-            panel.blit(subtitle, (title_x, suby))
-            feat = self.font_small.render("Power-ups: Speed • Freeze • Invincibility    Badges: Earn & Keep", True, (200,200,210))
-            panel.blit(feat, (title_x, suby + subtitle.get_height() + 8))
-
-            emblem_center = (emblem_center_rel[0], emblem_center_rel[1])
-            self.draw_polished_emblem(panel, emblem_center, int(card_h * 0.22))
-
-            px = card_w - 320; py = 18 + 6
-            icon_size = max(28, int(card_h * 0.14))
-            spacing_y = icon_size + 16
-            self.draw_powerup_row(panel, (px, py), icon_size, "Speed", "Burst of movement — temporary speed boost. Use it to quickly escape tight spots and cross long corridors.")
-            self.draw_powerup_row(panel, (px, py + spacing_y), icon_size, "Freeze", "Freeze ghosts briefly to reposition. Great for strategic regrouping when surrounded.")
-            self.draw_powerup_row(panel, (px, py + 2*spacing_y), icon_size, "Invincible", "Become briefly immune to ghosts — collect pellets aggressively while safe.")
-
-            self.screen.blit(panel, (card_x, card_y))
-
+            # render: pre-rendered page, then only the orbiting emblem dot and the buttons
+            self.screen.blit(page, (0,0))
+            self.draw_emblem_orbit(self.screen, emblem_center, emblem_size)
+            mp = pygame.mouse.get_pos()
             for i,opt in enumerate(options):
-                r = pygame.Rect(btn_x, btn_start_y + i*(btn_h + int(self.screen_h*0.02)), btn_w, btn_h)
-                hover = r.collidepoint(pygame.mouse.get_pos()); active = (i==sel or hover)
-                self.draw_button(self.screen, r, opt, active=active)
-
-            footer = self.font_small.render("Use arrow keys or mouse. Press ENTER / Click to select", True, MUTED)
-            self.screen.blit(footer, ((self.screen_w - footer.get_width())//2, btn_start_y + len(options)*(btn_h + int(self.screen_h*0.02)) + 8))
+                active = (i==sel or rects[i].collidepoint(mp))
+                self.draw_button(self.screen, rects[i], opt, active=active)
 
             pygame.display.flip()
 
-    def draw_polished_emblem(self, surf, center, size):
+    def render_start_page(self, card, emblem_center, emblem_size, footer_y):
+        # everything on the start menu that does not move: background, card, emblem body, power-up rows, footer
+        card_x, card_y, card_w, card_h = card
+        page = pygame.Surface((self.screen_w, self.screen_h)).convert()
+        self.draw_gradient_bg(page)
+        shadow = pygame.Surface((card_w+16, card_h+16), pygame.SRCALPHA)
+        pygame.draw.rect(shadow, (0,0,0,140), (0,0,card_w+16,card_h+16), border_radius=20)
+        page.blit(shadow, (card_x-8, card_y-8))
+        panel = pygame.Surface((card_w,card_h), pygame.SRCALPHA)
+        pygame.draw.rect(panel, (12,12,20,240), (0,0,card_w,card_h), border_radius=16)
+        pygame.draw.rect(panel, ACCENT, (20,18,8,card_h-36), border_radius=6)
+
+        title_x = emblem_center[0] + 68
+        title = self.font_large.render("PAC-MAN: REMIX", True, ACCENT)
+        panel.blit(title, (title_x, 18))
+        suby = 18 + title.get_height() + 8
+        subtitle = self.font_main.render("A futuristic remix — neon, power-ups & badges", True, MUTED)
+        panel.blit(subtitle, (title_x, suby))
+        feat = self.font_small.render("Power-ups: Speed • Freeze • Invincibility    Badges: Earn & Keep", True, (200,200,210))
+        panel.blit(feat, (title_x, suby + subtitle.get_height() + 8))
+
+        self.draw_polished_emblem(panel, emblem_center, emblem_size, orbit=False)
+
+        px = card_w - 320; py = 18 + 6
+        icon_size = max(28, int(card_h * 0.14))
+        spacing_y = icon_size + 16
+        self.draw_powerup_row(panel, (px, py), icon_size, "Speed", "Burst of movement — temporary speed boost. Use it to quickly escape tight spots and cross long corridors.")
+        self.draw_powerup_row(panel, (px, py + spacing_y), icon_size, "Freeze", "Freeze ghosts briefly to reposition. Great for strategic regrouping when surrounded.")
+        self.draw_powerup_row(panel, (px, py + 2*spacing_y), icon_size, "Invincible", "Become briefly immune to ghosts — collect pellets aggressively while safe.")
+
+        page.blit(panel, (card_x, card_y))
+
+        footer = self.font_small.render("Use arrow keys or mouse. Press ENTER / Click to select", True, MUTED)
+        page.blit(footer, ((self.screen_w - footer.get_width())//2, footer_y))
+        return page
+
+    def emblem_orbit(self, center, size):
+        cx,cy = center
+        r = max(20, size//2)
+        t = time.time()
+        angle = (t * 60) % 360
+        a1 = math.radians(angle)
+        rx = cx + int(math.cos(a1) * (r + 10))
+        ry = cy + int(math.sin(a1) * (r + 10))
+        return (rx, ry), max(3, r//5)
+
+    def draw_emblem_orbit(self, surf, center, size):
+        # the emblem's only moving part, blitted on top of a pre-rendered emblem
+        (rx, ry), dot_r = self.emblem_orbit(center, size)
+        dot = self._orbit_dots.get(dot_r)
+        if dot is None:
+            dot = pygame.Surface((dot_r*2+2, dot_r*2+2), pygame.SRCALPHA)
+            pygame.draw.circle(dot, (ACCENT[0],ACCENT[1],ACCENT[2],120), (dot_r+1, dot_r+1), dot_r)
+            self._orbit_dots[dot_r] = dot
+        surf.blit(dot, (rx - dot_r - 1, ry - dot_r - 1))
+
+    def draw_polished_emblem(self, surf, center, size, orbit=True):
         cx,cy = center
         r = max(20, size//2)
         pygame.draw.circle(surf, (8,8,12), (cx+6, cy+6), r+10)
@@ -379,12 +1480,9 @@ class Game:
         surf.blit(halo, (cx - r*3 + 2, cy - r*3 + 2))
         pygame.draw.circle(surf, NEON_YELLOW, (cx, cy), r)
         pygame.draw.circle(surf, (255,255,255,80), (cx - r//3, cy - r//3), max(4, r//4))
-        t = time.time()
-        angle = (t * 60) % 360
-        a1 = math.radians(angle)
-        rx = cx + int(math.cos(a1) * (r + 10))
-        ry = cy + int(math.sin(a1) * (r + 10))
-        pygame.draw.circle(surf, (ACCENT[0],ACCENT[1],ACCENT[2],120), (rx, ry), max(3, r//5))
+        if orbit:
+            (rx, ry), dot_r = self.emblem_orbit(center, size)
+            pygame.draw.circle(surf, (ACCENT[0],ACCENT[1],ACCENT[2],120), (rx, ry), dot_r)
         notch = pygame.Surface((r*2, r*2), pygame.SRCALPHA)
         pts = [(r, r), (r + int(r*0.85), r - int(r*0.65)), (r + int(r*0.85), r + int(r*0.65))]
         pygame.draw.polygon(notch, (12,12,20), pts)
@@ -436,18 +1534,36 @@ class Game:
         card_w = int(self.screen_w * 0.64); card_h = int(self.screen_h * 0.26)
         cx = (self.screen_w - card_w)//2; cy = max(36, int(self.screen_h*0.06))
         btn_w = int(self.screen_w * 0.14); btn_h = int(self.screen_h * 0.08); gap = int(self.screen_w * 0.03)
+        total_w = btn_w*3 + gap*2; start_x = (self.screen_w - total_w)//2
+        y = cy + card_h + int(self.screen_h*0.03)
+        rects = []
+        for i,opt in enumerate(options):
+            if opt == "Back":
+                rects.append(pygame.Rect((self.screen_w - btn_w)//2, y + (btn_h + int(self.screen_h*0.02))*3, btn_w, btn_h))
+            else:
+                rects.append(pygame.Rect(start_x + i*(btn_w + gap), y, btn_w, btn_h))
+        page = pygame.Surface((self.screen_w, self.screen_h)).convert()
+        self.draw_gradient_bg(page)
+        panel = pygame.Surface((card_w,card_h), pygame.SRCALPHA)
+        pygame.draw.rect(panel, (8,8,18,230), (0,0,card_w,card_h), border_radius=12)
+        title = self.font_large.render("Select Difficulty", True, ACCENT)
+        subtitle = self.font_main.render("Choose how aggressive the ghosts will be.", True, MUTED)
+        panel.blit(title, (28, 20)); panel.blit(subtitle, (28, 20 + title.get_height() + 8))
+        page.blit(panel, (cx,cy))
+        dirty = True; last_input = time.monotonic()
         while True:
-            self.draw_gradient_bg(self.screen)
-            panel = pygame.Surface((card_w,card_h), pygame.SRCALPHA)
-            pygame.draw.rect(panel, (8,8,18,230), (0,0,card_w,card_h), border_radius=12)
-            title = self.font_large.render("Select Difficulty", True, ACCENT)
-            subtitle = self.font_main.render("Choose how aggressive the ghosts will be.", True, MUTED)
-            panel.blit(title, (28, 20)); panel.blit(subtitle, (28, 20 + title.get_height() + 8))
-            self.screen.blit(panel, (cx,cy))
-            total_w = btn_w*3 + gap*2; start_x = (self.screen_w - total_w)//2
-            y = cy + card_h + int(self.screen_h*0.03)
+            # nothing animates here, so only redraw after input
+            if dirty:
+                self.screen.blit(page, (0,0))
+                mp = pygame.mouse.get_pos()
+                for i,opt in enumerate(options):
+                    active = (i==sel or rects[i].collidepoint(mp))
+                    self.draw_button(self.screen, rects[i], opt, active=active)
+                pygame.display.flip(); dirty = False
             for ev in pygame.event.get():
                 if ev.type == pygame.QUIT: pygame.quit(); sys.exit()
+                if ev.type in (pygame.KEYDOWN, pygame.MOUSEMOTION, pygame.MOUSEBUTTONDOWN, pygame.WINDOWEXPOSED):
+                    dirty = True; last_input = time.monotonic()
                 if ev.type == pygame.KEYDOWN:
                     if ev.key == pygame.K_RIGHT: sel = (sel+1)%len(options)
                     if ev.key == pygame.K_LEFT: sel = (sel-1)%len(options)
@@ -456,23 +1572,11 @@ class Game:
                         if choice == "Back": return False
                         self.difficulty = choice; return True
                 if ev.type == pygame.MOUSEBUTTONDOWN and ev.button == 1:
-                    mp = ev.pos
                     for i,opt in enumerate(options):
-                        if opt == "Back":
-                            r = pygame.Rect((self.screen_w - btn_w)//2, y + (btn_h + int(self.screen_h*0.02))*3, btn_w, btn_h)
-                        else:
-                            r = pygame.Rect(start_x + i*(btn_w + gap), y, btn_w, btn_h)
-                        if r.collidepoint(mp):
+                        if rects[i].collidepoint(ev.pos):
                             if opt == "Back": return False
                             self.difficulty = opt; return True
-            for i,opt in enumerate(options):
-                if opt == "Back":
-                    r = pygame.Rect((self.screen_w - btn_w)//2, y + (btn_h + int(self.screen_h*0.02))*3, btn_w, btn_h)
-                else:
-                    r = pygame.Rect(start_x + i*(btn_w + gap), y, btn_w, btn_h)
-                hover = r.collidepoint(pygame.mouse.get_pos()); active = (i==sel or hover)
-                self.draw_button(self.screen, r, opt, active=active)
-            pygame.display.flip(); self.clock.tick(FPS)
+            self.menu_clock(last_input)
 
     def show_story_controls(self):
         # EXTENDED EPIC SCI-FI ADVENTURE story — multiple pages (extended)
@@ -511,8 +1615,10 @@ class Game:
         idx = 0
         card_w = int(self.screen_w * 0.86); card_h = int(self.screen_h * 0.72)
         cx = (self.screen_w - card_w)//2; cy = max(30, int(self.screen_h * 0.05))
-        while True:
-            self.draw_gradient_bg(self.screen)
+
+        def render_page(idx):
+            page = pygame.Surface((self.screen_w, self.screen_h)).convert()
+            self.draw_gradient_bg(page)
             panel = pygame.Surface((card_w,card_h), pygame.SRCALPHA)
             pygame.draw.rect(panel, (6,6,14,240), (0,0,card_w,card_h), border_radius=14)
             title_s = self.font_large.render(pages[idx][0], True, ACCENT)
@@ -523,13 +1629,23 @@ class Game:
                 panel.blit(txt, (34, y_pos)); y_pos += self.font_main.get_height() + 10
             footer = self.font_small.render("Press ← / → to navigate pages, ENTER to continue to game", True, MUTED)
             panel.blit(footer, (34, card_h - 40))
-            self.screen.blit(panel, (cx,cy))
+            page.blit(panel, (cx,cy))
             for i in range(len(pages)):
                 dot_color = ACCENT if i==idx else (70,70,90)
-                pygame.draw.circle(self.screen, dot_color, (self.screen_w//2 - 40 + i*24, cy + card_h + 24), 6)
-            pygame.display.flip()
+                pygame.draw.circle(page, dot_color, (self.screen_w//2 - 40 + i*24, cy + card_h + 24), 6)
+            return page
+
+        rendered = {}; shown = None; last_input = time.monotonic()
+        while True:
+            # pages are static: render each once, and only flip when the page changes
+            if shown != idx:
+                if idx not in rendered: rendered[idx] = render_page(idx)
+                self.screen.blit(rendered[idx], (0,0))
+                pygame.display.flip(); shown = idx
             for ev in pygame.event.get():
                 if ev.type == pygame.QUIT: pygame.quit(); sys.exit()
+                if ev.type in (pygame.KEYDOWN, pygame.MOUSEBUTTONDOWN): last_input = time.monotonic()
+                if ev.type == pygame.WINDOWEXPOSED: shown = None
                 if ev.type == pygame.KEYDOWN:
                     if ev.key == pygame.K_RIGHT: idx = (idx+1)%len(pages)
                     if ev.key == pygame.K_LEFT: idx = (idx-1)%len(pages)
@@ -539,12 +1655,28 @@ class Game:
                         return
                 if ev.type == pygame.MOUSEBUTTONDOWN and ev.button == 1:
                     idx = (idx+1)%len(pages)
-            self.clock.tick(FPS)
+            self.menu_clock(last_input)
 
     # ---------- traps system ----------
     def spawn_shadow_ghost(self, tile):
         # Spawn a short-lived "shadow ghost" at given tile that will try to chase the player
-        self.shadow_ghosts.append({'tile': tuple(tile), 'timer': random.uniform(5.0, 9.0)})
+        self.add_timed(self.shadow_ghosts, {'tile': tuple(tile)}, random.uniform(5.0, 9.0))
+
+    def add_timed(self, items, obj, seconds):
+        # traps, hints and shadow ghosts carry their expiry time and leave their list when it comes
+        obj['expires'] = deadline = self.game_time + seconds
+        items.append(obj)
+        self.timers.at(deadline, self.expire, items, obj, deadline)
+        return obj
+
+    def expire(self, items, obj, deadline):
+        if obj.get('expires') != deadline: return   # re-armed since (a triggered trap)
+        for i,o in enumerate(items):
+            if o is obj:
+                del items[i]; return
+
+    def unblock(self, trap):
+        trap['blocked'] = False
 
     def handle_traps(self, dt):
         """
@@ -566,30 +1698,11 @@ class Game:
         max_traps = min(6, 1 + (self.player.score - rookie_threshold)//250)
 
         if self.trap_spawn_cooldown <= 0 and len(self.traps) < max_traps:
-            # gather candidate tiles that are not pellets/energizers/walls and form choke points
-            candidates = []
-            for y in range(2, MAZE_ROWS-2):
-                for x in range(2, MAZE_COLS-2):
-                    t = (x,y)
-                    if t in self.pellets or t in self.energizers or t in self.powerups_on_map:
-                        continue
-                    if self.map[y][x] == '#': continue
-                    # prefer tiles close to corridors: count accessible neighbors
-                    open_neighbors = 0
-                    for dx,dy in [(1,0),(-1,0),(0,1),(0,-1)]:
-                        nx,ny = x+dx,y+dy
-                        if not self.in_bounds(nx,ny): continue
-                        if self.map[ny][nx] == '#': continue
-                        open_neighbors += 1
-                    # chokepoint or corridor intersection (2 or 3 open neighbors) is strategic
-                    if 2 <= open_neighbors <= 3:
-                        # avoid spawning right on player's tile or ghost tiles
-                        if (x,y) == self.player.tile: continue
-                        if any(g.tile == (x,y) for g in self.ghosts): continue
-                        # proximity weighting: prefer tiles nearer center-ish so players traverse them
-                        center_dist = abs(x - MAZE_COLS//2) + abs(y - MAZE_ROWS//2)
-                        score_weight = max(0.1, 1.0 - center_dist/40.0)
-                        candidates.append(((x,y), score_weight))
+            # choke points (2-3 open neighbours) are precompiled; skip the ones that are occupied
+            taken = {g.tile for g in self.ghosts}; taken.add(self.player.tile)
+            pellets, energizers, powerups = self.pellets, self.energizers, self.powerups_on_map
+            candidates = [c for c in self.template.chokes
+                          if c[0] not in pellets and c[0] not in energizers and c[0] not in powerups and c[0] not in taken]
             if candidates:
                 # pick candidate with weighted randomness
                 tiles, weights = zip(*candidates)
@@ -597,43 +1710,21 @@ class Game:
                 tx,ty = chosen
                 # avoid duplicates
                 if not any(t['tile']==(tx,ty) for t in self.traps):
-                    trap = {
+                    lifetime = random.uniform(14.0, 26.0)
+                    trap = self.add_timed(self.traps, {
                         'tile': (tx,ty),
-                        'timer': random.uniform(14.0, 26.0),
                         'visible': random.random() < 0.28,  # some traps show subtle hint
                         'triggered': False,
-                        'blocked_timer': 0.0
-                    }
-                    self.traps.append(trap)
+                        'blocked': False
+                    }, lifetime)
+                    self.events.emit(TrapSpawned((tx,ty), trap['visible']))
                     # hint particle for subtle cue (visual)
-                    self.trap_hints.append({'tile':(tx,ty), 'phase': random.random(), 'life': random.uniform(6.0, 18.0)})
+                    phase = random.random()
+                    self.add_timed(self.trap_hints, {'tile':(tx,ty), 'phase': phase}, random.uniform(6.0, 18.0))
                 # set next cooldown smaller as score grows
                 self.trap_spawn_cooldown = max(6.0, 12.0 - (self.player.score - rookie_threshold)/250.0)
 
-        # update trap timers and remove expired ones
-        for trap in list(self.traps):
-            if trap.get('triggered'):
-                # when triggered, maintain blocked_timer
-                if trap.get('blocked_timer', 0) > 0:
-                    trap['blocked_timer'] -= dt
-                else:
-                    # after blocking finished, remove trap
-                    trap['timer'] -= dt
-                    if trap['timer'] <= 0:
-                        try: self.traps.remove(trap)
-                        except: pass
-            else:
-                trap['timer'] -= dt
-                if trap['timer'] <= 0:
-                    try: self.traps.remove(trap)
-                    except: pass
-
-        # update hints life
-        for h in list(self.trap_hints):
-            h['life'] -= dt
-            if h['life'] <= 0:
-                try: self.trap_hints.remove(h)
-                except: pass
+        # expired traps, hints and shadow ghosts are removed by their timers (see add_timed)
 
         # check player stepping on traps
         for trap in self.traps:
@@ -644,22 +1735,22 @@ class Game:
                 # slow down player moderately
                 self.player.slow_timer = max(self.player.slow_timer, 2.6)
                 # block the tile briefly (makes path temporarily impassable)
-                trap['blocked_timer'] = random.uniform(2.4, 4.2)
+                blocked = random.uniform(2.4, 4.2)
+                trap['blocked'] = True
+                self.timers.at(self.game_time + blocked, self.unblock, trap)
                 # small chance spawn a shadow ghost
-                if random.random() < 0.55:
+                shadow = random.random() < 0.55
+                if shadow:
                     self.spawn_shadow_ghost(trap['tile'])
                     # sometimes spawn additional small particle hint
-                    self.trap_hints.append({'tile':trap['tile'], 'phase':0.0, 'life':2.0})
-                # reduce trap timer so it will be cleaned later
-                trap['timer'] = 6.0
+                    self.add_timed(self.trap_hints, {'tile':trap['tile'], 'phase':0.0}, 2.0)
+                self.events.emit(TrapTriggered(trap['tile'], blocked, shadow))
+                # the trap is cleaned up 6 s after it stops blocking
+                trap['expires'] = deadline = self.game_time + blocked + 6.0
+                self.timers.at(deadline, self.expire, self.traps, trap, deadline)
 
         # update shadow ghosts: simple tile-based pursuit of player for a short time
         for sg in list(self.shadow_ghosts):
-            sg['timer'] -= dt
-            if sg['timer'] <= 0:
-                try: self.shadow_ghosts.remove(sg)
-                except: pass
-                continue
             # chase one tile per second roughly, but move more discretely using timer
             # compute simple path: step toward player tile if not wall
             sx,sy = sg['tile']
@@ -682,32 +1773,31 @@ class Game:
 
     # ---------- UI Top + Badge drawing & updates ----------
     def draw_ui_top(self):
+        u = self.view_len  # fixed pixel offsets shrink with the framebuffer when the HUD is drawn scaled
         pygame.draw.rect(self.screen, (12,12,18), (0,0, self.screen_w, self.TOP_BAR))
         score_s = self.font_main.render(f"Score: {self.player.score}", True, WHITE)
-        self.screen.blit(score_s, (12, 8))
+        self.screen.blit(score_s, (u(12), u(8)))
         level_s = self.font_main.render(f"Level: {self.level}", True, MUTED)
-        self.screen.blit(level_s, (12, 8 + score_s.get_height()))
+        self.screen.blit(level_s, (u(12), u(8) + score_s.get_height()))
         # Lives — nicer hearts spaced properly
-        life_label_x = self.screen_w - 420
-        self.screen.blit(self.font_main.render("Lives:", True, MUTED), (life_label_x-74, 12))
+        life_label_x = self.screen_w - u(420)
+        self.screen.blit(self.font_main.render("Lives:", True, MUTED), (life_label_x-u(74), u(12)))
         heart_gap = int(self.TILE * 0.36)
         heart_size = int(self.TILE * 0.22)
-        base_x = life_label_x + 4
+        base_x = life_label_x + u(4)
         for i in range(self.player.lives):
-            cx = base_x + i*(heart_size + heart_gap) + 12
-            cy = 26
+            cx = base_x + i*(heart_size + heart_gap) + u(12)
+            cy = u(26)
             self.draw_heart(self.screen, (cx+2, cy+2), heart_size, fill=(12,12,12), shadow=True)
             self.draw_heart(self.screen, (cx, cy), heart_size, fill=(255,80,100))
         # Buff timers (circular small)
-        timer_x = self.screen_w - 240
+        timer_x = self.screen_w - u(240)
         timers = []
         if self.player.speed_boost_timer > 0:
             timers.append(('Speed', self.player.speed_boost_timer, BUFF_DURATIONS['speed'], ACCENT))
         if self.player.invincible_timer > 0:
             timers.append(('Inv', self.player.invincible_timer, BUFF_DURATIONS['invincible'], ACCENT2))
-        max_freeze = 0.0
-        for g in self.ghosts:
-            if g.frozen_timer > max_freeze: max_freeze = g.frozen_timer
+        max_freeze = self.freeze_until - self.game_time
         if max_freeze > 0:
             timers.append(('Frz', max_freeze, BUFF_DURATIONS['freeze'], NEON_BLUE))
         tx = timer_x
@@ -716,12 +1806,12 @@ class Game:
             size = int(self.TOP_BAR * 0.6)
             cx = tx + size//2
             cy = int(self.TOP_BAR * 0.5)
-            pygame.draw.circle(self.screen, (24,24,30), (cx,cy), size//2 + 4)
+            pygame.draw.circle(self.screen, (24,24,30), (cx,cy), size//2 + u(4))
             pygame.draw.circle(self.screen, (18,18,24), (cx,cy), size//2)
             start_ang = -math.pi/2
             end_ang = start_ang + (2 * math.pi * pct)
             rect = pygame.Rect(cx - size//2, cy - size//2, size, size)
-            thickness = max(4, size//8)
+            thickness = max(u(4), size//8)
             try:
                 pygame.draw.arc(self.screen, col, rect, start_ang, end_ang, thickness)
             except Exception:
@@ -731,17 +1821,17 @@ class Game:
             self.screen.blit(small, (cx - small.get_width()//2, cy - small.get_height()//2))
             lbl = self.font_small.render(name, True, MUTED)
             self.screen.blit(lbl, (cx - lbl.get_width()//2, cy + size//2 - lbl.get_height()))
-            tx += size + 12
+            tx += size + u(12)
         # BADGE DISPLAY (only badges earned this run) - compact and smaller than before
         earned_current = [name for name,_ in ACHIEVEMENTS if name in self.earned_current_run]
         if earned_current:
-            med_w = int(max(20, min(36, self.screen_w * 0.025)))  # tiny top medallions
-            padding = 24
-            total_w = len(earned_current)*med_w + (len(earned_current)-1)*12
+            med_w = int(max(u(20), min(u(36), self.screen_w * 0.025)))  # tiny top medallions
+            padding = u(24); gap = u(12)
+            total_w = len(earned_current)*med_w + (len(earned_current)-1)*gap
             bx = self.screen_w - padding - total_w
-            by = self.TOP_BAR + 8
+            by = self.TOP_BAR + u(8)
             for i,name in enumerate(earned_current):
-                rx = bx + i*(med_w + 12) + med_w//2
+                rx = bx + i*(med_w + gap) + med_w//2
                 ry = by + med_w//2
                 pulse_t = 0.0
                 if name in self.badge_pulse:
@@ -749,23 +1839,26 @@ class Game:
                     pulse_t = st['t']
                     st['t'] += 1.0 / FPS
                     if st.get('spark_emit', False):
-                        for _ in range(8):
-                            ang = random.random() * math.pi*2
-                            dist = random.uniform(med_w*0.4, med_w*0.9)
-                            vx = math.cos(ang) * random.uniform(8,40)
-                            vy = math.sin(ang) * random.uniform(8,40)
+                        for _ in range(self.quality['particles']):
+                            ang = FX_RANDOM.random() * math.pi*2
+                            dist = FX_RANDOM.uniform(med_w*0.4, med_w*0.9)
+                            vx = math.cos(ang) * FX_RANDOM.uniform(8,40)
+                            vy = math.sin(ang) * FX_RANDOM.uniform(8,40)
                             self.badge_particles.append({
                                 'x': rx + math.cos(ang)*dist*0.3,
                                 'y': ry + math.sin(ang)*dist*0.3,
                                 'vx': vx, 'vy': vy,
-                                'life': random.uniform(0.6,1.2),
+                                'life': FX_RANDOM.uniform(0.6,1.2),
                                 'age': 0.0,
                                 'col': (255, 240, 200) if name=="Conqueror" else (160,240,255) if name=="Diamond" else (200,255,190)
                             })
                         st['spark_emit'] = False
                     if st['t'] > 2.6:
                         del self.badge_pulse[name]
-                self.draw_gem_medallion(self.screen, (rx, ry), med_w, name, pulse_t=pulse_t)
+                if not self.quality['pulse']: pulse_t = None
+                radius = None if self._view is None else u(self.gem_radius(med_w / self._view, pulse_t))
+                self.draw_gem_medallion(self.screen, (rx, ry), med_w, name, pulse_t=pulse_t, radius=radius,
+                                        aura=self.quality['aura'])
         # particles
         for p in list(self.badge_particles):
             p['age'] += 1.0 / FPS
@@ -781,8 +1874,8 @@ class Game:
         if self.achievement_msg and self.achievement_timer > 0:
             elapsed = self.achievement_popup_elapsed; total = self.achievement_popup_total
             progress = min(1.0, elapsed/total) if total>0 else 1.0
-            w = int(min(self.screen_w * 0.78, 640)); h = max(36, int(self.screen_h * 0.06))
-            center_x = (self.screen_w - w)//2; target_y = 8
+            w = int(min(self.screen_w * 0.78, u(640))); h = max(u(36), int(self.screen_h * 0.06))
+            center_x = (self.screen_w - w)//2; target_y = u(8)
             slide_in_pct = 0.12; fade_out_pct = 0.28
             if progress < slide_in_pct:
                 interp = progress / (slide_in_pct + 1e-9); y = int(-h + (target_y + h) * interp)
@@ -813,10 +1906,16 @@ class Game:
         pygame.draw.circle(surf, (255,255,255,70), (cx - r//3, cy - r//3), max(2, r//3))
 
     # ---------- Gem medallion rendering ----------
-    def draw_gem_medallion(self, surf, center, diameter, name, pulse_t=0.0):
-        cx,cy = center
+    def gem_radius(self, diameter, pulse_t=0.0):
         D = max(48, int(diameter * 0.75))
         r = D // 2
+        pulse = 1.0 + 0.02 * math.sin((pulse_t+time.time()*0.7) * 2.0) if pulse_t is not None else 1.0
+        return int(r * pulse)
+
+    def draw_gem_medallion(self, surf, center, diameter, name, pulse_t=0.0, radius=None, aura=True):
+        # radius pins the pulsed size (see gem_radius) so callers can cache the result
+        cx,cy = center
+        eff_r = radius if radius is not None else self.gem_radius(diameter, pulse_t)
         if name == "Rookie":
             base_col = (140, 255, 200); accent_col = (70, 200, 120)
         elif name == "Diamond":
@@ -825,13 +1924,12 @@ class Game:
             base_col = (240, 190, 255); accent_col = (200, 140, 220)
         else:
             base_col = (255, 210, 120); accent_col = (230, 180, 60)
-        pulse = 1.0 + 0.02 * math.sin((pulse_t+time.time()*0.7) * 2.0) if pulse_t is not None else 1.0
-        eff_r = int(r * pulse)
-        aura = pygame.Surface((eff_r*6, eff_r*6), pygame.SRCALPHA)
-        for i in range(3):
-            alpha = int(70 * (1 - i*0.35))
-            pygame.draw.circle(aura, (accent_col[0],accent_col[1],accent_col[2],alpha), (eff_r*3, eff_r*3), eff_r + 8 + i*6)
-        surf.blit(aura, (cx - eff_r*3, cy - eff_r*3), special_flags=pygame.BLEND_PREMULTIPLIED)
+        if aura:
+            aura = pygame.Surface((eff_r*6, eff_r*6), pygame.SRCALPHA)
+            for i in range(3):
+                alpha = int(70 * (1 - i*0.35))
+                pygame.draw.circle(aura, (accent_col[0],accent_col[1],accent_col[2],alpha), (eff_r*3, eff_r*3), eff_r + 8 + i*6)
+            surf.blit(aura, (cx - eff_r*3, cy - eff_r*3), special_flags=pygame.BLEND_PREMULTIPLIED)
         gem = pygame.Surface((eff_r*2+8, eff_r*2+8), pygame.SRCALPHA)
         center_offset = (eff_r+4, eff_r+4)
         pts = [
@@ -867,7 +1965,7 @@ class Game:
         pygame.draw.circle(surf, (255,255,255,30), (cx, cy + int(eff_r*0.18)), core_r)
         pygame.draw.circle(surf, (255,255,255,24), (cx, cy), eff_r, 2)
 
-    # ---------- Maze drawing (include trap visuals + shadow ghosts) ----------
+    # ---------- Maze drawing (trap visuals + shadow ghosts go through the effects layer) ----------
     def draw_maze(self):
         maze_bg = pygame.Rect(self.MAZE_X-6, self.MAZE_Y-6, self.MAZE_W+12, self.MAZE_H+12)
         pygame.draw.rect(self.screen, (12,12,20, ), maze_bg, border_radius=8)
@@ -893,44 +1991,59 @@ class Game:
                     typ = self.powerups_on_map[(x,y)]
                     col = (100,255,100) if typ=='speed' else (180,180,255) if typ=='invincible' else (255,200,180)
                     pygame.draw.rect(self.screen, col, (cx-6, cy-6, 12, 12))
-                # --- trap visuals (subtle) ---
-                for trap in self.traps:
-                    tx,ty = trap['tile']
-                    if (x,y) == (tx,ty):
-                        cx,cy = self.tile_to_pixel_center(x,y)
-                        if trap.get('triggered'):
-                            # show a brief spike ring if triggered
-                            bt = trap.get('blocked_timer', 0)
-                            if bt > 0:
-                                # red ring while blocked
-                                pygame.draw.circle(self.screen, (255,80,80), (cx,cy), max(6, self.TILE//3), 2)
-                        else:
-                            # subtle hint pulse if visible
-                            if trap.get('visible'):
-                                pulse = 40 + int(20 * math.sin(time.time()*4 + (tx+ty)))
-                                surf = pygame.Surface((self.TILE, self.TILE), pygame.SRCALPHA)
-                                pygame.draw.circle(surf, (255, 90, 90, pulse), (self.TILE//2, self.TILE//2), max(3, self.TILE//4))
-                                self.screen.blit(surf, (cx - self.TILE//2, cy - self.TILE//2), special_flags=pygame.BLEND_PREMULTIPLIED)
-                            else:
-                                # sometimes a very faint spark (rare) to give an observant player a tiny clue
-                                if random.random() < 0.007:
-                                    cx,cy = self.tile_to_pixel_center(x,y)
-                                    surf = pygame.Surface((6,6), pygame.SRCALPHA)
-                                    pygame.draw.circle(surf, (255, 170, 170, 30), (3,3), 3)
-                                    self.screen.blit(surf, (cx-3,cy-3), special_flags=pygame.BLEND_PREMULTIPLIED)
-
-                # shadow ghost visuals
-                for sg in self.shadow_ghosts:
-                    if (x,y) == tuple(sg['tile']):
-                        cx,cy = self.tile_to_pixel_center(x,y)
-                        pulse = 90 + int(40 * math.sin(time.time() * 7 + (x+y)))
-                        surf = pygame.Surface((self.TILE, self.TILE), pygame.SRCALPHA)
-                        pygame.draw.circle(surf, (140,160,255,pulse), (self.TILE//2, self.TILE//2), self.TILE//3, 2)
-                        self.screen.blit(surf, (cx - self.TILE//2, cy - self.TILE//2), special_flags=pygame.BLEND_ADD)
+        self.draw_effects(self.screen)
+
+    # ---------- Effects layer (traps + shadow ghosts) ----------
+    def fx_frame(self, kind, alpha=0):
+        # pre-rendered effect sprites, one per (kind, pulse alpha, tile size), built on first use
+        key = (kind, alpha, self.TILE)
+        frame = self._fx_frames.get(key)
+        if frame is None:
+            T = self.TILE
+            if kind == 'spark':
+                frame = pygame.Surface((6,6), pygame.SRCALPHA)
+                pygame.draw.circle(frame, (255, 170, 170, 30), (3,3), 3)
+            else:
+                frame = pygame.Surface((T, T), pygame.SRCALPHA)
+                if kind == 'trap':
+                    pygame.draw.circle(frame, (255, 90, 90, alpha), (T//2, T//2), max(3, T//4))
+                elif kind == 'ring':
+                    pygame.draw.circle(frame, (255,80,80), (T//2, T//2), max(6, T//3), 2)
+                else:  # shadow ghost
+                    pygame.draw.circle(frame, (140,160,255,alpha), (T//2, T//2), T//3, 2)
+            self._fx_frames[key] = frame
+        return frame
+
+    def draw_effects(self, surf):
+        # one pass over traps and shadow ghosts, one batched blits() call
+        now = time.time(); half = self.TILE//2
+        animate = self.quality['pulse']   # frozen pulses reuse a single cached frame each
+        batch = []
+        for trap in self.traps:
+            tx,ty = trap['tile']
+            cx,cy = self.tile_to_pixel_center(tx,ty)
+            if trap.get('triggered'):
+                # red ring while blocked
+                if trap.get('blocked'):
+                    batch.append((self.fx_frame('ring'), (cx - half, cy - half), None, 0))
+            elif trap.get('visible'):
+                # subtle hint pulse
+                pulse = 40 + int(20 * math.sin(now*4 + (tx+ty))) if animate else 50
+                batch.append((self.fx_frame('trap', pulse), (cx - half, cy - half), None, pygame.BLEND_PREMULTIPLIED))
+            elif FX_RANDOM.random() < 0.007:
+                # sometimes a very faint spark (rare) to give an observant player a tiny clue
+                batch.append((self.fx_frame('spark'), (cx-3, cy-3), None, pygame.BLEND_PREMULTIPLIED))
+        for sg in self.shadow_ghosts:
+            x,y = sg['tile']
+            cx,cy = self.tile_to_pixel_center(x,y)
+            pulse = 90 + int(40 * math.sin(now * 7 + (x+y))) if animate else 110
+            batch.append((self.fx_frame('shadow', pulse), (cx - half, cy - half), None, pygame.BLEND_ADD))
+        if batch: surf.blits(batch, doreturn=False)
 
     # ---------- Core interactions ----------
     def unlock_achievement(self, name):
-        if name not in self.achievements_unlocked:
+        first_time = name not in self.achievements_unlocked
+        if first_time:
             self.achievements_unlocked.add(name)
             self.save_badges()
         if name not in self.earned_current_run:
@@ -939,28 +2052,34 @@ class Game:
             self.achievement_msg = f"Achievement Unlocked: {name}"
             self.achievement_timer = self.achievement_popup_total
             self.achievement_popup_elapsed = 0.0
+            self.events.emit(BadgeUnlocked(name, first_time))
+
+    def on_score_event(self, ev):
+        # ACHIEVEMENTS is ordered by threshold, so only the next one can have been crossed
+        while self._next_badge < len(ACHIEVEMENTS) and ev.score >= ACHIEVEMENTS[self._next_badge][1]:
+            name = ACHIEVEMENTS[self._next_badge][0]; self._next_badge += 1
+            if name not in self.earned_current_run:
+                self.unlock_achievement(name)
+
+    def on_powerup_taken(self, ev):
+        if ev.power == 'freeze':
+            self.freeze_until = self.game_time + BUFF_DURATIONS['freeze']
 
     def consume_pellet_at(self, tile):
         if tile in self.pellets:
-            self.pellets.remove(tile); self.player.score += 10
-            for name,thr in ACHIEVEMENTS:
-                if self.player.score >= thr and name not in self.earned_current_run:
-                    self.unlock_achievement(name)
+            self.pellets.remove(tile); self.player.score += 10; self.pellets_left -= 1
+            self.events.emit(PelletEaten(tile, "pellet", 10, self.player.score))
             return "pellet"
         if tile in self.energizers:
-            self.energizers.remove(tile); self.player.score += 50
+            self.energizers.remove(tile); self.player.score += 50; self.pellets_left -= 1
             for g in self.ghosts:
                 g.state = "frightened"; g.frightened_timer = BUFF_DURATIONS['speed']
-            for name,thr in ACHIEVEMENTS:
-                if self.player.score >= thr and name not in self.earned_current_run:
-                    self.unlock_achievement(name)
+            self.events.emit(PelletEaten(tile, "energizer", 50, self.player.score))
             return "energizer"
         if tile in self.powerups_on_map:
             typ = self.powerups_on_map.pop(tile); self.spawn_powerup_effect(typ)
             self.player.score += 100
-            for name,thr in ACHIEVEMENTS:
-                if self.player.score >= thr and name not in self.earned_current_run:
-                    self.unlock_achievement(name)
+            self.events.emit(PowerupTaken(tile, typ, 100, self.player.score))
             return "powerup"
         return None
 
@@ -973,26 +2092,31 @@ class Game:
             self.player.invincible_timer = BUFF_DURATIONS['invincible']
 
     def check_collisions(self):
+        p = self.player; T = self.TILE
         for g in self.ghosts:
             if g.respawn_timer > 0 or g.state == "eaten" or g.state == "frozen": continue
-            dist = (g.pos - self.player.pos).length()
-            if dist < self.player.radius + g.radius - 6:
+            dx = g.fx - p.fx; dy = g.fy - p.fy
+            reach = (p.radius + g.radius - 6) * SUBTILE // T
+            if dx*dx + dy*dy < reach*reach:
                 if self.player.invincible_timer > 0: continue
                 if g.state == "frightened":
                     g.state = "eaten"; g.respawn_timer = 4.0; g.frightened_timer = 0
-                    g.tile = g.start_tile; g.target_tile = g.start_tile; g.pos = pygame.math.Vector2(self.tile_to_pixel_center(*g.start_tile))
+                    g.place(g.start_tile)
                     self.player.score += 200
+                    self.events.emit(GhostEaten(g, 200, self.player.score))
                 else:
                     if self.player.invincible_timer <= 0:
                         self.player.lives -= 1
-                        self.player.tile = (MAZE_COLS//2, MAZE_ROWS-3)
-                        self.player.target_tile = self.player.tile
-                        self.player.pos = pygame.math.Vector2(self.tile_to_pixel_center(*self.player.tile))
+                        self.player.place(self.template.player_spawn)
                         self.player.direction = (1,0); self.player.desired_direction = (0,0)
                         for g2 in self.ghosts:
-                            g2.tile = g2.start_tile; g2.target_tile = g2.start_tile; g2.pos = pygame.math.Vector2(self.tile_to_pixel_center(*g2.start_tile))
+                            g2.place(g2.start_tile)
                             g2.state = "scatter"; g2.frightened_timer = 0.0; g2.respawn_timer = 0.0
-                        if self.player.lives <= 0: self.game_over_screen()
+                        self.mode_epoch = self.game_time
+                        self.events.emit(LifeLost(self.player.lives))
+                        if self.player.lives <= 0:
+                            self.events.emit(GameOver(self.player.score, self.level))
+                            self.game_over_screen()
         # check shadow ghosts hits
         for sg in list(self.shadow_ghosts):
             if tuple(self.player.tile) == tuple(sg['tile']):
@@ -1002,37 +2126,54 @@ class Game:
 
         if self.player.at_center():
             self.consume_pellet_at(self.player.tile)
-            if len(self.pellets) + len(self.energizers) == 0:
+            if self.pellets_left <= 0:
+                self.events.emit(LevelCleared(self.level, self.player.score))
                 self.level += 1; self.init_game(hard_reset=False)
 
     # ---------- Game over screen (kept compact) ----------
     def game_over_screen(self):
-        while True:
-            self.draw_gradient_bg(self.screen)
-            card_w = int(self.screen_w * 0.94)
-            card_h = int(self.screen_h * 0.78)
-            cx = (self.screen_w - card_w)//2
-            cy = max(24, int(self.screen_h * 0.04))
+        card_w = int(self.screen_w * 0.94)
+        card_h = int(self.screen_h * 0.78)
+        cx = (self.screen_w - card_w)//2
+        cy = max(24, int(self.screen_h * 0.04))
+        btn_w = int(card_w * 0.22); btn_h = max(40, int(self.screen_h * 0.08))
+        play_btn = pygame.Rect(cx + card_w - btn_w - 36, cy + card_h - btn_h - 36, btn_w, btn_h)
+        quit_btn = pygame.Rect(cx + card_w - 2*btn_w - 72, cy + card_h - btn_h - 36, btn_w, btn_h)
+        earned = list(self.earned_current_run)
+        count = len(earned)
+        if earned:
+            max_med_w = 80
+            available_w = card_w - 160
+            med_w = min(max_med_w, max(72, (available_w - (count-1)*28) // count))
+        else:
+            med_w = 0
+        standing = None
+        if self.store is not None and self.store.flush(timeout=1.0):
+            rank, total = self.store.rank(self.player.score, self.played_difficulty())
+            best = self.store.best_score(self.profile_id)
+            standing = f"Rank #{rank} of {total} ({self.played_difficulty()})   •   Personal best: {best}"
+
+        def render_page(gem_r):
+            page = pygame.Surface((self.screen_w, self.screen_h)).convert()
+            self.draw_gradient_bg(page)
             panel = pygame.Surface((card_w,card_h), pygame.SRCALPHA)
             shadow = pygame.Surface((card_w+12, card_h+12), pygame.SRCALPHA)
             pygame.draw.rect(shadow, (0,0,0,140), (0,0,card_w+12,card_h+12), border_radius=18)
-            self.screen.blit(shadow, (cx-6, cy-6))
+            page.blit(shadow, (cx-6, cy-6))
             pygame.draw.rect(panel, (6,6,14,250), (0,0,card_w,card_h), border_radius=16)
             title = self.font_large.render("GAME OVER", True, (240,90,90))
             panel.blit(title, (40, 36))
             score_t = self.font_big.render(f"Final Score: {self.player.score}", True, WHITE)
             panel.blit(score_t, (40, 36 + title.get_height() + 8))
+            if standing:
+                st = self.font_main.render(standing, True, GOLD)
+                panel.blit(st, (card_w - st.get_width() - 40, 36 + title.get_height() + 8))
             panel.blit(self.font_main.render("Badges Earned:", True, MUTED), (40, 36 + title.get_height() + 48))
-            earned = list(self.earned_current_run)
 
             if not earned:
                 note = self.font_main.render("No badges yet — keep playing to earn achievements!", True, MUTED)
                 panel.blit(note, (40, 36 + title.get_height() + 88))
             else:
-                count = len(earned)
-                max_med_w = 80
-                available_w = card_w - 160
-                med_w = min(max_med_w, max(72, (available_w - (count-1)*28) // count))
                 med_h = int(med_w * 0.78)
                 cols = min(3, count)
                 rows = (count + cols - 1) // cols
@@ -1044,7 +2185,7 @@ class Game:
                     rect_x = start_x + c * (med_w + 28)
                     rect_y = y_top + r * (med_h + 110)
                     md_center = (rect_x + med_w//2, rect_y + med_h//2)
-                    self.draw_gem_medallion(panel, md_center, med_w, name)
+                    self.draw_gem_medallion(panel, md_center, med_w, name, radius=gem_r)
                     ribbon_h = 24
                     ribbon_w = int(med_w * 0.74)
                     rx = rect_x + (med_w - ribbon_w)//2
@@ -1059,17 +2200,24 @@ class Game:
                         dt = self.font_main.render(ln, True, (235,235,235))
                         panel.blit(dt, (rect_x + (med_w - dt.get_width())//2, y_off))
                         y_off += dt.get_height() + 4
+            page.blit(panel, (cx, cy))
+            return page
 
-            btn_w = int(card_w * 0.22); btn_h = max(40, int(self.screen_h * 0.08))
-            play_btn = pygame.Rect(cx + card_w - btn_w - 36, cy + card_h - btn_h - 36, btn_w, btn_h)
-            quit_btn = pygame.Rect(cx + card_w - 2*btn_w - 72, cy + card_h - btn_h - 36, btn_w, btn_h)
-            self.screen.blit(panel, (cx, cy))
-            mp = pygame.mouse.get_pos()
-            self.draw_button(self.screen, quit_btn, "Play Again", active=quit_btn.collidepoint(mp))
-            self.draw_button(self.screen, play_btn, "Quit", active=play_btn.collidepoint(mp))
-            pygame.display.flip()
+        # the medallion pulse only ever lands on a couple of whole-pixel radii: one page per radius
+        rendered = {}; shown = None; dirty = True; last_input = time.monotonic()
+        while True:
+            gem_r = self.gem_radius(med_w) if earned else None
+            if dirty or gem_r != shown:
+                if gem_r not in rendered: rendered[gem_r] = render_page(gem_r)
+                self.screen.blit(rendered[gem_r], (0,0))
+                mp = pygame.mouse.get_pos()
+                self.draw_button(self.screen, quit_btn, "Play Again", active=quit_btn.collidepoint(mp))
+                self.draw_button(self.screen, play_btn, "Quit", active=play_btn.collidepoint(mp))
+                pygame.display.flip(); shown = gem_r; dirty = False
             for ev in pygame.event.get():
                 if ev.type == pygame.QUIT: pygame.quit(); sys.exit()
+                if ev.type in (pygame.KEYDOWN, pygame.MOUSEMOTION, pygame.MOUSEBUTTONDOWN, pygame.WINDOWEXPOSED):
+                    dirty = True; last_input = time.monotonic()
                 if ev.type == pygame.MOUSEBUTTONDOWN and ev.button == 1:
                     if quit_btn.collidepoint(ev.pos):
                         self.level = 1
@@ -1083,20 +2231,47 @@ class Game:
                         self.init_game(hard_reset=True); return
                     if ev.key == pygame.K_q or ev.key == pygame.K_ESCAPE:
                         pygame.quit(); sys.exit()
-            self.clock.tick(FPS)
+            self.menu_clock(last_input)
 
     # ---------- Input & Update ----------
     def handle_input(self):
+        buf = self.input_buffer
         for ev in pygame.event.get():
             if ev.type == pygame.QUIT: pygame.quit(); sys.exit()
             if ev.type == pygame.KEYDOWN:
-                if ev.key in (pygame.K_LEFT, pygame.K_a): self.player.set_desired_direction(-1,0)
-                if ev.key in (pygame.K_RIGHT, pygame.K_d): self.player.set_desired_direction(1,0)
-                if ev.key in (pygame.K_UP, pygame.K_w): self.player.set_desired_direction(0,-1)
-                if ev.key in (pygame.K_DOWN, pygame.K_s): self.player.set_desired_direction(0,1)
+                d = TURN_KEYS.get(ev.key)
+                if d is not None:
+                    if buf is None: self.player.set_desired_direction(*d)
+                    else: buf.press(d)
+                if ev.key == pygame.K_F9: self.profile_frames()
                 if ev.key == pygame.K_ESCAPE: pygame.quit(); sys.exit()
+        if buf is not None and buf.pending is not None:
+            # a held key keeps its turn queued past the window
+            keys = pygame.key.get_pressed()
+            if any(keys[k] for k,d in TURN_KEYS.items() if d == buf.pending): buf.hold()
+
+    def enable_low_latency_input(self, window=INPUT_BUFFER, grace=INPUT_GRACE):
+        self.input_buffer = InputBuffer(window, grace)
+        return self.input_buffer
+
+    def wait_frame(self):
+        # frame pacing; in low-latency mode the wait polls input so key presses are stamped
+        # within about a millisecond of arriving instead of at the start of the next frame
+        if self.input_buffer is None:
+            self.clock.tick(FPS); return
+        end = self._frame_start + 1.0 / FPS
+        while True:
+            self.handle_input()
+            left = end - time.perf_counter()
+            if left <= 0: break
+            time.sleep(min(left, 0.001))
+        self._frame_start = max(end, time.perf_counter() - 1.0 / FPS)
+        self.clock.tick()
 
     def update(self, dt):
+        if self.replay is not None: self.replay.record(self, dt)
+        self.game_time += dt
+        self.timers.run(self.game_time)
         # achievement popup timing
         if self.achievement_timer > 0:
             self.achievement_timer -= dt
@@ -1104,20 +2279,14 @@ class Game:
             if self.achievement_timer <= 0:
                 self.achievement_msg = None; self.achievement_timer = 0.0; self.achievement_popup_elapsed = 0.0
 
-        # update player timers and movement
-        self.player.update(dt)
+        # player and ghost timers run on self.timers; only movement is per frame
         self.player.move_step()
 
         # update ghosts
         for g in self.ghosts:
-            g.update(dt)
             g.speed = g.base_speed
-            if g.state == "frightened": g.speed = g.base_speed * 0.85
+            if g.state == "frightened": g.speed = g.base_speed * 85 // 100
             if g.frozen_timer > 0: g.speed = 0
-            chase_chance = 0.5 + min(0.3, (self.level-1)*0.03)
-            if self.difficulty == "Hard": chase_chance += 0.1
-            if g.state not in ("frightened","frozen","eaten") and g.respawn_timer <= 0:
-                g.state = "chase" if random.random() < chase_chance else "scatter"
             g.move_step(self.player.tile, self.player.direction, self.level)
 
         # update traps (strategic)
@@ -1126,64 +2295,279 @@ class Game:
         # collisions and pellet capture
         self.check_collisions()
 
+        if self.telemetry is not None: self.telemetry.record(self, dt)
+
+    def enable_telemetry(self, path, **kw):
+        self.telemetry = TelemetryRecorder(path, **kw).attach(self)
+        return self.telemetry
+
+    def profile_frames(self, frames=None, out_dir=None):
+        # profile the next `frames` frames of run(); the F9 hotkey calls this
+        if self.perf is None: self.perf = PerfCapture(out_dir or ".")
+        elif out_dir is not None: self.perf.out_dir = out_dir
+        self.perf.arm(frames)
+        return self.perf
+
+    def enable_replays(self, path, **kw):
+        corpus = pacman_replay.Corpus(path, badges=[name for name,_ in ACHIEVEMENTS])
+        return ReplayRecorder(corpus, **kw).attach(self)
+
+    def enable_capture(self, path, **kw):
+        self.capture = FrameCapture(path, self.screen, **kw)
+        return self.capture
+
+    def enable_store(self, path, profile):
+        # profiles, runs and badge history in SQLite; the profile's badges replace the JSON list
+        self.store = pacman_store.Store(path)
+        self.profile_id = self.store.profile(profile)
+        self.achievements_unlocked = self.store.badges(self.profile_id)
+        StoreRecorder(self.store, self.profile_id).attach(self)
+        return self.store
+
+    # ---------- State snapshots (for lookahead) ----------
+    def snapshot(self):
+        # copies only the mutable simulation state; map rows are never edited in place, so they're shared.
+        # The level's template, decision table and mode schedule are shared too: a rollout that clears the
+        # level runs init_game, which replaces them rather than changing them
+        p = self.player
+        return {
+            'scalars': (self.level, self.total_pellets, self.pellets_left, self.game_time, self.freeze_until,
+                        self.mode_epoch, self.trap_spawn_cooldown, self.achievement_msg, self.achievement_timer,
+                        self.achievement_popup_elapsed, self._next_badge),
+            'map': self.map, 'template': self.template, 'decisions': self.decisions, 'modes': self.modes,
+            'earned': set(self.earned_current_run),
+            'pellets': set(self.pellets), 'energizers': set(self.energizers), 'powerups': dict(self.powerups_on_map),
+            # timed objects keep their identity (pending timers refer to them), only their fields are copied
+            'traps': [(t, dict(t)) for t in self.traps], 'shadow_ghosts': [(sg, dict(sg)) for sg in self.shadow_ghosts],
+            'trap_hints': [(h, dict(h)) for h in self.trap_hints], 'timers': list(self.timers.heap),
+            'player': (p, dict(p.__dict__)),
+            'ghosts': [(g, dict(g.__dict__)) for g in self.ghosts],
+        }
+
+    def restore(self, snap):
+        (self.level, self.total_pellets, self.pellets_left, self.game_time, self.freeze_until,
+         self.mode_epoch, self.trap_spawn_cooldown, self.achievement_msg, self.achievement_timer,
+         self.achievement_popup_elapsed, self._next_badge) = snap['scalars']
+        self.map = snap['map']; self.template = snap['template']; self.decisions = snap['decisions']
+        self.modes = snap['modes']; self.earned_current_run = set(snap['earned'])
+        self.pellets.clear(); self.pellets.update(snap['pellets'])
+        self.energizers.clear(); self.energizers.update(snap['energizers'])
+        self.powerups_on_map.clear(); self.powerups_on_map.update(snap['powerups'])
+        for items, saved in ((self.traps, snap['traps']), (self.shadow_ghosts, snap['shadow_ghosts']),
+                             (self.trap_hints, snap['trap_hints'])):
+            for obj, fields in saved:
+                obj.clear(); obj.update(fields)
+            items[:] = [obj for obj,_ in saved]
+        self.timers.heap[:] = snap['timers']
+        p, fields = snap['player']
+        p.__dict__.update(fields); self.player = p
+        self.ghosts[:] = [g for g,_ in snap['ghosts']]
+        for g, fields in snap['ghosts']:
+            g.__dict__.update(fields)
+
+    @contextmanager
+    def simulation(self):
+        # run update() for lookahead: no listeners, no telemetry or replay recording, no blocking game-over menu
+        saved = (self.events, self.telemetry, self.replay, self.input_buffer, self.__dict__.get('game_over_screen'))
+        self.events = EventBus(); self.telemetry = None; self.replay = None; self.input_buffer = None
+        self.game_over_screen = lambda: None
+        try:
+            yield self
+        finally:
+            self.events, self.telemetry, self.replay, self.input_buffer, over = saved
+            if over is None: del self.game_over_screen
+            else: self.game_over_screen = over
+
+    # ---------- Render scale ----------
+    def view_len(self, n):
+        # fixed pixel sizes -> sizes on the surface being drawn (framebuffer when scaled)
+        return n if self._view is None else max(1, int(n * self._view))
+
+    def set_render_scale(self, scale, hud_native=True):
+        # scale: a fraction of native resolution, or "auto" to follow the frame time
+        self.hud_native = hud_native
+        if scale == "auto":
+            self.scaler = RenderScaler(); self.render_scale = self.scaler.scale
+        else:
+            self.scaler = None; self.render_scale = min(1.0, max(0.25, float(scale)))
+
+    def set_quality(self, quality):
+        # quality: a QUALITY_TIERS name, or "auto" to follow the frame time
+        if quality == "auto":
+            self.governor = QualityGovernor(); self.quality = self.governor.tier
+        else:
+            self.governor = None; self.quality = next(t for t in QUALITY_TIERS if t['name'] == quality)
+
+    def frame_done(self, work):
+        # feed the measured frame work to the auto modes: effects go first, resolution after
+        # that, and they come back in the opposite order
+        gov, scaler = self.governor, self.scaler
+        if gov is not None and (scaler is None or scaler.index == 0):
+            gov.frame(work); self.quality = gov.tier
+        if scaler is not None and (gov is None or gov.index == len(gov.steps) - 1):
+            scaler.frame(work)
+
+    def scaled_fonts(self, k):
+        fonts = self._scaled_fonts.get(k)
+        if fonts is None:
+            fonts = self._scaled_fonts[k] = {name: pygame.font.Font(self.font_path, max(8, int(px * k)))
+                                            for name,px in self.font_px.items()}
+        return fonts
+
+    @contextmanager
+    def scaled_view(self, scale):
+        # temporarily lays the game out on a framebuffer `scale` times the window size; the tile
+        # size is rounded to whole pixels and everything else derives from it, so maze cells stay crisp
+        names = ('screen', 'screen_w', 'screen_h', 'TILE', 'TOP_BAR', 'MAZE_W', 'MAZE_H', 'MAZE_X', 'MAZE_Y',
+                 'centre_x', 'centre_y', '_view')
+        saved = [getattr(self, n) for n in names]
+        tile = max(4, round(self.TILE * scale)); k = tile / self.TILE
+        size = (round(self.screen_w * k), round(self.screen_h * k))
+        if self._framebuffer is None or self._framebuffer.get_size() != size:
+            self._framebuffer = pygame.Surface(size).convert()
+        self._view = k
+        self.screen = self._framebuffer; self.screen_w, self.screen_h = size
+        self.TILE = tile; self.TOP_BAR = round(self.TOP_BAR * k)
+        self.MAZE_W = tile * MAZE_COLS; self.MAZE_H = tile * MAZE_ROWS
+        self.MAZE_X, self.MAZE_Y = round(self.MAZE_X * k), round(self.MAZE_Y * k)
+        self.centre_x, self.centre_y = self.centre_tables(self.MAZE_X, self.MAZE_Y, tile)
+        fonts = None
+        if not self.hud_native:
+            fonts = (self.font_large, self.font_big, self.font_main, self.font_small)
+            f = self.scaled_fonts(k)
+            self.font_large, self.font_big, self.font_main, self.font_small = f['large'], f['big'], f['main'], f['small']
+        try:
+            yield self._framebuffer
+        finally:
+            for n,v in zip(names, saved): setattr(self, n, v)
+            if fonts: self.font_large, self.font_big, self.font_main, self.font_small = fonts
+
     # ---------- Main run loop ----------
+    def draw_scene(self):
+        panel = (self.MAZE_X-4, self.MAZE_Y-4, self.MAZE_W+8, self.MAZE_H+8)
+        if self.quality['backdrop']:
+            self.draw_gradient_bg(self.screen)
+            maze_panel = pygame.Surface((self.MAZE_W + 8, self.MAZE_H + 8), pygame.SRCALPHA)
+            pygame.draw.rect(maze_panel, (10,10,16,160), (0,0,self.MAZE_W+8,self.MAZE_H+8), border_radius=8)
+            self.screen.blit(maze_panel, panel[:2])
+        else:
+            self.screen.fill(DEEP_BG_A)
+            pygame.draw.rect(self.screen, (10,9,20), panel, border_radius=8)
+        self.draw_maze()
+        for g in self.ghosts: g.draw(self.screen)
+        self.player.draw(self.screen)
+
+    def render_frame(self):
+        scale = self.render_scale if self.scaler is None else self.scaler.scale
+        if scale >= 1.0:
+            self.draw_scene(); self.draw_ui_top()
+            return
+        with self.scaled_view(scale) as fb:
+            self.draw_scene()
+            if not self.hud_native: self.draw_ui_top()
+        pygame.transform.scale(fb, (self.screen_w, self.screen_h), self.screen)
+        if self.hud_native: self.draw_ui_top()
+
     def run(self):
         if not self.show_start_menu(): return
         self.show_story_controls()
         self.init_game(hard_reset=True)
-        last = time.time()
+        last = time.time(); self._frame_start = time.perf_counter()
         while True:
             now = time.time(); dt = now - last; last = now
+            if self.perf is not None: self.perf.frame_start()
             self.handle_input()
+            if self.autopilot is not None: self.autopilot.control()
             self.update(dt)
-            self.draw_gradient_bg(self.screen)
-            maze_panel = pygame.Surface((self.MAZE_W + 8, self.MAZE_H + 8), pygame.SRCALPHA)
-            pygame.draw.rect(maze_panel, (10,10,16,160), (0,0,self.MAZE_W+8,self.MAZE_H+8), border_radius=8)
-            self.screen.blit(maze_panel, (self.MAZE_X-4, self.MAZE_Y-4))
-            self.draw_maze()
-            for g in self.ghosts: g.draw(self.screen)
-            self.player.draw(self.screen)
-            self.draw_ui_top()
+            self.render_frame()
             pygame.display.flip()
-            self.clock.tick(FPS)
+            if self.capture is not None: self.capture.grab(self.screen)
+            self.frame_done(time.time() - now)
+            if self.perf is not None: self.perf.frame_end()
+            self.wait_frame()
+
+# ---------- Low-latency input ----------
+TURN_KEYS = {pygame.K_LEFT: (-1,0), pygame.K_a: (-1,0), pygame.K_RIGHT: (1,0), pygame.K_d: (1,0),
+             pygame.K_UP: (0,-1), pygame.K_w: (0,-1), pygame.K_DOWN: (0,1), pygame.K_s: (0,1)}
+
+class InputBuffer:
+    """Timestamped turn requests for the low-latency input mode.
+
+    press() queues a turn stamped with its arrival time; the player takes it at the first tile
+    centre where it's legal, turns back at once, or takes the centre it has just left when the
+    press came less than `grace` units after it. A request nobody could use within `window`
+    seconds is dropped. Every applied turn records its press-to-movement latency; a press for the
+    direction already being travelled changes nothing, so it is only counted.
+    """
+    def __init__(self, window=INPUT_BUFFER, grace=INPUT_GRACE, samples=2048):
+        self.window = window; self.grace = grace
+        self.pending = None; self.pressed_at = 0.0; self.expires = 0.0
+        self.latency = deque(maxlen=samples)   # seconds from key press to the turn being applied
+        self.dropped = 0; self.redundant = 0
+
+    def press(self, direction, now=None):
+        now = time.perf_counter() if now is None else now
+        if direction != self.pending: self.pressed_at = now
+        self.pending = direction; self.expires = now + self.window
+
+    def hold(self, now=None):
+        self.expires = (time.perf_counter() if now is None else now) + self.window
+
+    def request(self, now):
+        # the queued turn, or None once it has expired
+        if self.pending is not None and now > self.expires:
+            self.pending = None; self.dropped += 1
+        return self.pending
+
+    def applied(self, now):
+        self.latency.append(now - self.pressed_at); self.pending = None
+
+    def discard(self):
+        # the request was for the current direction: clear it without a latency sample
+        self.pending = None; self.redundant += 1
+
+    def stats(self):
+        lat = sorted(self.latency)
+        if not lat: return {'turns': 0, 'dropped': self.dropped, 'redundant': self.redundant}
+        pick = lambda q: lat[min(len(lat)-1, int(q * len(lat)))] * 1e3
+        return {'turns': len(lat), 'dropped': self.dropped, 'redundant': self.redundant, 'p50_ms': pick(0.5), 'p95_ms': pick(0.95),
+                'max_ms': lat[-1] * 1e3}
 
 # ---------- Entities ----------
+def step_toward(ent, step):
+    # move ent.fx/fy at most `step` units towards the centre of ent.target_tile along one axis;
+    # integer-only, and an entity always comes to rest exactly on the centre
+    gx = ent.target_tile[0] * SUBTILE; gy = ent.target_tile[1] * SUBTILE
+    d = gx - ent.fx
+    if d: ent.fx += step if d > step else -step if d < -step else d
+    else:
+        d = gy - ent.fy
+        if d: ent.fy += step if d > step else -step if d < -step else d
+    if ent.fx == gx and ent.fy == gy: ent.tile = ent.target_tile
+
 class Player:
     def __init__(self, start_tile, game: Game):
-        self.tile = start_tile; self.target_tile = start_tile
         self.game = game
-        self.pos = pygame.math.Vector2(self.game.tile_to_pixel_center(*start_tile))
-        self.base_speed = max(2.2, self.game.TILE * 0.12)
-        self.speed = self.base_speed
+        self.place(start_tile)
+        self.base_speed = game.speed_units(max(2.2, self.game.TILE * 0.12))
         self.lives = 3; self.score = 0
         self.direction = (1,0); self.desired_direction = (0,0)
         self.radius = max(8, self.game.TILE//2 - 2)
         self.invincible_timer = 0.0; self.speed_boost_timer = 0.0
         self.slow_timer = 0.0
 
-    def update(self, dt):
-        # invincible timer
-        if self.invincible_timer > 0:
-            self.invincible_timer -= dt
-            if self.invincible_timer < 0: self.invincible_timer = 0.0
-        # speed boost timer
-        if self.speed_boost_timer > 0:
-            self.speed_boost_timer -= dt
-            if self.speed_boost_timer < 0: self.speed_boost_timer = 0.0
-        # slow timer
-        if self.slow_timer > 0:
-            self.slow_timer -= dt
-            if self.slow_timer < 0: self.slow_timer = 0.0
-        # decide effective speed: slow > boost > base
-        if self.slow_timer > 0:
-            self.speed = self.base_speed * 0.55
-        elif self.speed_boost_timer > 0:
-            self.speed = self.base_speed * 1.75
-        else:
-            self.speed = self.base_speed
+    invincible_timer = Countdown(); speed_boost_timer = Countdown(); slow_timer = Countdown()
+
+    @property
+    def speed(self):
+        # effective speed: slow > boost > base
+        now = self.game.game_time
+        if self.slow_until > now: return self.base_speed * 55 // 100
+        if self.speed_boost_until > now: return self.base_speed * 175 // 100
+        return self.base_speed
 
     def draw(self, surf):
-        x,y = int(self.pos.x), int(self.pos.y); r = self.radius
+        x,y = self.pos; r = self.game.view_len(self.radius)
         pygame.draw.circle(surf, NEON_YELLOW, (x,y), r+3, 2)
         pygame.draw.circle(surf, GOLD, (x,y), r)
         pygame.draw.circle(surf, NEON_YELLOW, (x,y), r-1, 2)
@@ -1202,10 +2586,16 @@ class Player:
         if self.invincible_timer > 0:
             pygame.draw.circle(surf, NEON_GREEN, (x,y), r+6, 2)
 
+    @property
+    def pos(self):
+        return self.game.sub_to_pixel(self.fx, self.fy)
+
+    def place(self, tile):
+        self.tile = tile; self.target_tile = tile
+        self.fx = tile[0] * SUBTILE; self.fy = tile[1] * SUBTILE
+
     def at_center(self):
-        tx,ty = self.tile
-        cx,cy = self.game.tile_to_pixel_center(tx,ty)
-        return abs(self.pos.x - cx) < 1 and abs(self.pos.y - cy) < 1
+        return self.fx == self.tile[0] * SUBTILE and self.fy == self.tile[1] * SUBTILE
 
     def set_desired_direction(self, dx, dy):
         self.desired_direction = (dx,dy)
@@ -1218,9 +2608,35 @@ class Player:
         if self.game.is_wall_tile(nx,ny): return False
         self.direction = (dx,dy); self.target_tile = (nx,ny); return True
 
+    def buffered_turn(self, buf):
+        # low-latency mode: take the queued turn now if the player can, else leave it queued
+        now = time.perf_counter()
+        d = buf.request(now)
+        if d is None: return
+        dx,dy = d; tx,ty = self.tile
+        if d == self.direction:
+            buf.discard(); return
+        if self.at_center():
+            if not self.game.is_wall_tile(tx+dx, ty+dy):
+                self.take_turn(d, buf, now)
+            return
+        if d == (-self.direction[0], -self.direction[1]):
+            # reverse mid-tile, back towards the centre just left
+            self.direction = d; self.target_tile = self.tile; buf.applied(now); return
+        if abs(self.fx - tx*SUBTILE) + abs(self.fy - ty*SUBTILE) <= buf.grace and not self.game.is_wall_tile(tx+dx, ty+dy):
+            # pressed just after passing the centre: corner from it instead of waiting a tile
+            self.fx = tx*SUBTILE; self.fy = ty*SUBTILE
+            self.take_turn(d, buf, now)
+
+    def take_turn(self, d, buf, now):
+        # desired_direction is cleared again so an old request can't fire at a later junction
+        self.desired_direction = d; self.try_turn(); self.desired_direction = (0,0)
+        buf.applied(now)
+
     def move_step(self):
+        buf = self.game.input_buffer
+        if buf is not None and buf.pending is not None: self.buffered_turn(buf)
         if self.at_center():
-            self.pos.x, self.pos.y = self.game.tile_to_pixel_center(*self.tile)
             if self.try_turn(): pass
             else:
                 dx,dy = self.direction
@@ -1230,44 +2646,33 @@ class Player:
                     self.direction = (0,0); return
                 else:
                     self.target_tile = (nx,ny)
-        tx,ty = self.target_tile; cx,cy = self.game.tile_to_pixel_center(tx,ty)
-        dir_vec = pygame.math.Vector2(cx - self.pos.x, cy - self.pos.y)
-        distance = dir_vec.length()
-        if distance == 0:
-            self.tile = self.target_tile; return
-        step = min(self.speed, distance)
-        if distance != 0:
-            dir_vec.normalize_ip()
-            self.pos += dir_vec * step
-        if abs(self.pos.x - cx) < 1 and abs(self.pos.y - cy) < 1:
-            self.pos.x, self.pos.y = cx, cy; self.tile = self.target_tile
+        step_toward(self, self.speed)
 
 class Ghost:
     def __init__(self, start_tile, color, game: Game):
-        self.start_tile = start_tile; self.tile = start_tile; self.target_tile = start_tile
+        self.start_tile = start_tile
         self.game = game
-        self.pos = pygame.math.Vector2(self.game.tile_to_pixel_center(*start_tile))
+        self.place(start_tile)
         self.radius = max(8, self.game.TILE//2 - 2)
         self.color = color; self.direction = (0,0)
-        self.state = "scatter"; self.base_speed = max(1.6, self.game.TILE * 0.08); self.speed = self.base_speed
+        self.state = "scatter"; self.base_speed = game.speed_units(max(1.6, self.game.TILE * 0.08)); self.speed = self.base_speed
+        self.mode_slot = len(game.ghosts)   # which staggered phase of the mode schedule this ghost follows
         self.frightened_timer = 0.0; self.frozen_timer = 0.0; self.respawn_timer = 0.0
 
-    def update(self, dt):
-        if self.frozen_timer > 0:
-            self.frozen_timer -= dt
-            if self.frozen_timer <= 0: self.frozen_timer = 0; self.state = "scatter"
-        if self.frightened_timer > 0:
-            self.frightened_timer -= dt
-            if self.frightened_timer <= 0: self.frightened_timer = 0; self.state = "chase"
-        if self.respawn_timer > 0:
-            self.respawn_timer -= dt
-            if self.respawn_timer <= 0:
-                self.respawn_timer = 0; self.state = "scatter"
-                self.tile = self.start_tile; self.target_tile = self.start_tile
-                self.pos = pygame.math.Vector2(self.game.tile_to_pixel_center(*self.tile)); self.direction = (0,0)
+    def thaw(self):
+        self.state = "scatter"
+
+    def calm(self):
+        self.state = "chase"
+
+    def respawn(self):
+        self.state = "scatter"
+        self.place(self.start_tile); self.direction = (0,0)
+
+    frozen_timer = Countdown("thaw"); frightened_timer = Countdown("calm"); respawn_timer = Countdown("respawn")
 
     def draw(self, surf):
-        x,y = int(self.pos.x), int(self.pos.y); r = self.radius
+        x,y = self.pos; r = self.game.view_len(self.radius)
         color = self.color if self.state != "frightened" else (60,120,255)
         outline_color = tuple(min(255, c+80) for c in color)
         pygame.draw.circle(surf, outline_color, (x, y - r//6), r+3, 2)
@@ -1293,85 +2698,228 @@ class Ghost:
         pygame.draw.line(surf, NEON_PINK, (ant_x, ant_y1), (ant_x, ant_y2), 2)
         pygame.draw.circle(surf, NEON_PINK, (ant_x, ant_y2-4), 3)
 
+    @property
+    def pos(self):
+        return self.game.sub_to_pixel(self.fx, self.fy)
+
+    def place(self, tile):
+        self.tile = tile; self.target_tile = tile
+        self.fx = tile[0] * SUBTILE; self.fy = tile[1] * SUBTILE
+
     def at_center(self):
-        tx,ty = self.tile; cx,cy = self.game.tile_to_pixel_center(tx,ty)
-        return abs(self.pos.x - cx) < 1 and abs(self.pos.y - cy) < 1
+        return self.fx == self.tile[0] * SUBTILE and self.fy == self.tile[1] * SUBTILE
+
+    def pick_exit(self, choices, viable, target, flee=False):
+        # one distance lookup per exit against a field shared by every ghost chasing the same tile;
+        # ties keep the R, L, D, U order, unreachable exits count as infinitely far
+        if not viable: return random.choice(choices)[:2]
+        dist = self.game.distance_to(target)
+        tx, ty = self.tile; cols = MAZE_COLS
+        best = None; best_d = None
+        for dx, dy, _ in viable:
+            d = dist((ty+dy)*cols + tx+dx)
+            if d < 0: d = math.inf
+            if best is None or (d > best_d if flee else d < best_d):
+                best = (dx, dy); best_d = d
+        return best
 
     def move_step(self, player_tile, player_dir, level):
         if self.state == "frozen" or self.respawn_timer > 0 or self.state == "eaten":
             return
         if self.at_center():
-            self.pos.x, self.pos.y = self.game.tile_to_pixel_center(*self.tile)
             tx, ty = self.tile
-            choices = []
-            for dx, dy, dname in [(1,0,"R"), (-1,0,"L"), (0,1,"D"), (0,-1,"U")]:
-                nx, ny = tx + dx, ty + dy
-                if not self.game.in_bounds(nx, ny):
-                    continue
-                if self.game.is_wall_tile(nx, ny):
-                    continue
-                choices.append(((dx,dy), dname))
+            if self.state == "scatter" or self.state == "chase":
+                game = self.game
+                self.state = game.modes.mode(self.mode_slot, game.game_time - game.mode_epoch)
+            # legal exits and exits-without-reverse come straight from the precomputed table
+            table = self.game.decisions
+            idx = ty*MAZE_COLS + tx
+            choices = MASK_MOVES[table.exits[idx]]
+            viable = MASK_MOVES[table.turns[idx*5 + HEADING.get(self.direction, 4)]]
+            blocked = self.game.blocked_tiles()
+            if blocked:
+                choices = [c for c in choices if (tx+c[0], ty+c[1]) not in blocked]
+                viable = [c for c in viable if (tx+c[0], ty+c[1]) not in blocked]
             if not choices:
                 self.direction = (0,0)
                 self.target_tile = self.tile
                 return
-            reverse = None
-            if self.direction == (1,0): reverse = "L"
-            if self.direction == (-1,0): reverse = "R"
-            if self.direction == (0,1): reverse = "U"
-            if self.direction == (0,-1): reverse = "D"
             if self.state == "frightened":
-                dist_map = bfs(self.tile, {player_tile}, self.game.is_wall_tile, self.game.in_bounds)
-                maxd = -1
-                choice = random.choice(choices)
-                for (dx,dy), dname in choices:
-                    nx, ny = tx + dx, ty + dy
-                    d = dist_map.get((nx,ny), None)
-                    dval = float('inf') if d is None else d
-                    if dval > maxd and dname != reverse:
-                        maxd = dval
-                        choice = ((dx,dy), dname)
-                self.direction = choice[0]
-                self.target_tile = (tx + self.direction[0], ty + self.direction[1])
+                self.direction = self.pick_exit(choices, viable, player_tile, flee=True)
             elif self.state == "scatter":
-                viable = [c for c in choices if c[1] != reverse]
                 if viable and random.random() < 0.7:
-                    choice = random.choice(viable)
-                    self.direction = choice[0]
+                    self.direction = random.choice(viable)[:2]
                 else:
-                    d,dname = choose_bfs_direction(self.tile, player_tile, self.game.is_wall_tile, self.game.in_bounds, forbidden_reverse=reverse)
-                    if d == (0,0):
-                        choice = random.choice(choices)
-                        self.direction = choice[0]
-                    else:
-                        self.direction = d
-                self.target_tile = (tx + self.direction[0], ty + self.direction[1])
+                    self.direction = self.pick_exit(choices, viable, player_tile)
             elif self.state == "chase":
-                d,dname = choose_bfs_direction(self.tile, player_tile, self.game.is_wall_tile, self.game.in_bounds, forbidden_reverse=reverse)
-                if d == (0,0):
-                    viable = [c for c in choices if c[1] != reverse]
-                    if viable:
-                        choice = random.choice(viable)
-                        self.direction = choice[0]
-                    else:
-                        self.direction = random.choice(choices)[0]
+                self.direction = self.pick_exit(choices, viable, player_tile)
+            self.target_tile = (tx + self.direction[0], ty + self.direction[1])
+        step_toward(self, self.speed)
+
+# ---------- Render scale ----------
+class RenderScaler:
+    """Picks the render scale from the measured frame time: steps down a notch when frames run
+    over budget, back up once there is plenty of headroom."""
+    def __init__(self, target=RENDER_TARGET, window=60, steps=RENDER_SCALES, headroom=0.55):
+        self.target = target; self.window = window; self.steps = steps; self.headroom = headroom
+        self.index = 0; self._sum = 0.0; self._n = 0
+
+    @property
+    def scale(self):
+        return self.steps[self.index]
+
+    def frame(self, work):
+        # work: seconds spent on this frame before the clock sleep
+        self._sum += work; self._n += 1
+        if self._n < self.window: return
+        avg = self._sum / self._n; self._sum = 0.0; self._n = 0
+        if avg > self.target and self.index < len(self.steps) - 1: self.index += 1
+        elif avg < self.target * self.headroom and self.index > 0: self.index -= 1
+
+class QualityGovernor(RenderScaler):
+    """The same rolling frame-time stepping, over QUALITY_TIERS instead of render scales."""
+    def __init__(self, target=RENDER_TARGET, window=60, steps=QUALITY_TIERS, headroom=0.55):
+        super().__init__(target, window, steps, headroom)
+
+    @property
+    def tier(self):
+        return self.steps[self.index]
+
+# ---------- Autopilot ----------
+class Autopilot:
+    """Steers Pac at tile centres by Monte Carlo lookahead.
+
+    Each legal direction is tried in short rollouts of the real update() (ghosts, traps,
+    shadow ghosts and all) on a snapshot of the game, picked with UCB1 until the time budget
+    runs out. The global RNG is restored afterwards, so planning doesn't change the game.
+    """
+    DIRS = [(1,0),(-1,0),(0,1),(0,-1)]
+
+    def __init__(self, game, budget=AUTOPILOT_BUDGET, horizon=AUTOPILOT_HORIZON, seed=None):
+        self.game = game; self.budget = budget; self.horizon = horizon
+        self.rng = random.Random(seed)
+        self.death_penalty = 1000.0; self.slow_penalty = 40.0; self.pellet_pull = 3.0
+        self.explore = 60.0
+        self._decided = None
+        self.rollouts = 0   # rollouts in the last decision
+
+    def legal_moves(self):
+        p = self.game.player; tx,ty = p.tile
+        return [(dx,dy) for dx,dy in self.DIRS if not self.game.is_wall_tile(tx+dx, ty+dy)]
+
+    def control(self):
+        p = self.game.player
+        if not p.at_center(): return
+        key = (p.tile, p.direction)
+        if key == self._decided: return
+        self._decided = key
+        move = self.plan()
+        if move: p.set_desired_direction(*move)
+
+    def plan(self):
+        g = self.game
+        moves = self.legal_moves()
+        if len(moves) <= 1: return moves[0] if moves else None
+        snap = g.snapshot(); rng_state = random.getstate()
+        stats = {m: [0, 0.0] for m in moves}
+        deadline = time.perf_counter() + self.budget
+        total = 0
+        with g.simulation():
+            while total < len(moves) or time.perf_counter() < deadline:
+                if total < len(moves):
+                    m = moves[total]
                 else:
-                    self.direction = d
-                self.target_tile = (tx + self.direction[0], ty + self.direction[1])
-        tx, ty = self.target_tile
-        cx, cy = self.game.tile_to_pixel_center(tx, ty)
-        dir_vec = pygame.math.Vector2(cx - self.pos.x, cy - self.pos.y)
-        if dir_vec.length() == 0:
-            self.pos.x, self.pos.y = cx, cy
-            self.tile = self.target_tile
-            return
-        step = self.speed
-        dir_vec.normalize_ip()
-        self.pos += dir_vec * step
-        if abs(self.pos.x - cx) < 1 and abs(self.pos.y - cy) < 1:
-            self.pos.x, self.pos.y = cx, cy
-            self.tile = self.target_tile
+                    ln = math.log(total)
+                    m = max(moves, key=lambda mv: stats[mv][1]/stats[mv][0] + self.explore*math.sqrt(ln/stats[mv][0]))
+                v = self.rollout(m)
+                g.restore(snap)
+                st = stats[m]; st[0] += 1; st[1] += v; total += 1
+        random.setstate(rng_state)
+        self.rollouts = total
+        return max(moves, key=lambda mv: stats[mv][1]/stats[mv][0])
+
+    def rollout(self, move):
+        g = self.game; p = g.player
+        score0 = p.score; lives0 = p.lives; dt = 1.0 / FPS
+        p.set_desired_direction(*move)
+        slowed = False
+        for i in range(self.horizon):
+            if i and p.at_center():
+                # rollout policy: keep going, occasionally take a random side turn
+                opts = [d for d in self.legal_moves() if d != (-p.direction[0], -p.direction[1])]
+                if opts and (p.direction not in opts or self.rng.random() < 0.35):
+                    p.set_desired_direction(*self.rng.choice(opts))
+            slow_before = p.slow_timer
+            g.update(dt)
+            if p.slow_timer > slow_before: slowed = True
+            if p.lives < lives0: break
+        value = p.score - score0
+        value -= self.death_penalty * (lives0 - p.lives)
+        if slowed: value -= self.slow_penalty
+        if g.pellets or g.energizers:
+            px,py = p.tile
+            near = min(abs(x-px) + abs(y-py) for x,y in (g.pellets or g.energizers))
+            value -= self.pellet_pull * near
+        return value
 
 # ---------- Run ----------
+def positive_int_arg(value):
+    try:
+        n = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected a whole number, got {value!r}")
+    if n <= 0: raise argparse.ArgumentTypeError(f"must be at least 1, got {value!r}")
+    return n
+
+def render_scale_arg(value):
+    # --render-scale: "auto" or a number; set_render_scale clamps it to 0.25..1.0
+    if value == "auto": return value
+    try:
+        scale = float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected a number such as 0.75, or 'auto', got {value!r}")
+    if not math.isfinite(scale) or scale <= 0: raise argparse.ArgumentTypeError(f"scale must be positive, got {value!r}")
+    return scale
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Pac-Man Remix — Strategic Traps")
+    ap.add_argument("--telemetry", metavar="PATH", help="record per-tick telemetry to PATH")
+    ap.add_argument("--autopilot", action="store_true", help="let the lookahead autopilot play (attract mode / soak tests)")
+    ap.add_argument("--render-scale", default=1.0, type=render_scale_arg, metavar="SCALE",
+                    help="draw gameplay at this fraction of the window size and upscale, or 'auto' to follow the frame time")
+    ap.add_argument("--scaled-hud", action="store_true", help="draw the HUD into the low-resolution framebuffer too")
+    ap.add_argument("--quality", default="auto", choices=["auto"] + [t['name'] for t in QUALITY_TIERS],
+                    help="effect quality tier, or 'auto' to drop effects while frames overrun (default)")
+    ap.add_argument("--profile", metavar="NAME", help="record runs, level stats and badges for this player profile")
+    ap.add_argument("--db", default=pacman_store.DB_FILE, help="profile database used with --profile")
+    ap.add_argument("--perf-dir", metavar="DIR", help="where F9 profiling captures are written (default: current directory)")
+    ap.add_argument("--perf-frames", type=int, default=PERF_FRAMES, help="frames one F9 profiling capture covers")
+    ap.add_argument("--replays", metavar="CORPUS",
+                    help="append every run to the replay corpus CORPUS.dat / CORPUS.idx (see pacman_replay.py)")
+    ap.add_argument("--capture", metavar="PATH",
+                    help="record gameplay to PATH: a .y4m video (needs numpy) or a directory of PNG frames")
+    ap.add_argument("--capture-fps", type=positive_int_arg, default=CAPTURE_FPS, help="frame rate of --capture")
+    ap.add_argument("--low-latency", action="store_true",
+                    help="poll input while waiting for the next frame, buffer turns and report input latency on exit")
+    ap.add_argument("--input-buffer", type=float, default=INPUT_BUFFER * 1000, metavar="MS",
+                    help="how long a tapped turn stays queued with --low-latency")
+    args = ap.parse_args(argv)
+    game = Game(SCREEN_W, SCREEN_H)
+    game.set_render_scale(args.render_scale, hud_native=not args.scaled_hud)
+    game.set_quality(args.quality)
+    if args.telemetry: game.enable_telemetry(args.telemetry)
+    if args.profile: game.enable_store(args.db, args.profile)
+    if args.autopilot: game.autopilot = Autopilot(game)
+    if args.replays: game.enable_replays(args.replays)
+    game.perf = PerfCapture(args.perf_dir or ".", frames=args.perf_frames)
+    if args.capture:
+        cap = game.enable_capture(args.capture, fps=args.capture_fps)
+        atexit.register(lambda: (cap.close(), print(f"capture: {cap.written} frames written to {cap.path}, {cap.dropped} dropped, {cap.repeated} repeated to keep time")))
+    if args.low_latency:
+        buf = game.enable_low_latency_input(window=args.input_buffer / 1000)
+        atexit.register(lambda: print("input latency:", ", ".join(f"{k} {v:.1f}" if isinstance(v, float) else f"{k} {v}"
+                                                                  for k,v in buf.stats().items())))
+    game.run()
+
 if __name__ == "__main__":
-    Game(SCREEN_W, SCREEN_H).run()
+    main()